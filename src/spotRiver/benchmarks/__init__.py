@@ -0,0 +1,23 @@
+"""Benchmarks.
+
+Reproducible, offline benchmarks of the objective functions, data loaders and feature functions.
+Run them from the command line and compare two runs::
+
+    python -m spotRiver.benchmarks run --output baseline.json
+    python -m spotRiver.benchmarks run --output current.json
+    python -m spotRiver.benchmarks compare baseline.json current.json --threshold 0.1
+
+`compare` exits with status 1 if a benchmark regressed by more than the threshold.
+
+"""
+from .core import BENCHMARKS, benchmark, compare_results, load_results, measure, run_benchmarks, save_results
+
+__all__ = [
+    "BENCHMARKS",
+    "benchmark",
+    "compare_results",
+    "load_results",
+    "measure",
+    "run_benchmarks",
+    "save_results",
+]
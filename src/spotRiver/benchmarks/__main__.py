@@ -0,0 +1,56 @@
+import argparse
+import sys
+
+from spotRiver.benchmarks.core import (
+    BENCHMARKS,
+    compare_results,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m spotRiver.benchmarks", description="spotRiver benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks and write the results to a JSON file")
+    run.add_argument("--output", "-o", help="JSON file for the results")
+    run.add_argument("--benchmark", "-b", action="append", dest="names", help="benchmark to run (repeatable)")
+    run.add_argument("--scale", type=float, default=1.0, help="scale of the benchmark data, default 1.0")
+    run.add_argument("--repeat", type=int, default=3, help="number of timed runs, default 3")
+    run.add_argument("--no-memory", action="store_true", help="do not measure the peak memory")
+
+    commands.add_parser("list", help="list the benchmarks")
+
+    compare = commands.add_parser("compare", help="compare two result files and flag regressions")
+    compare.add_argument("baseline", help="JSON file of the baseline run")
+    compare.add_argument("current", help="JSON file of the current run")
+    compare.add_argument("--threshold", type=float, default=0.1, help="tolerated relative slowdown, default 0.1")
+    compare.add_argument("--memory-threshold", type=float, help="tolerated relative memory growth")
+
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        from spotRiver.benchmarks import suite  # noqa: F401
+
+        print("\n".join(BENCHMARKS))
+        return 0
+    if args.command == "run":
+        results = run_benchmarks(
+            names=args.names, scale=args.scale, repeat=args.repeat, measure_memory=not args.no_memory, verbose=True
+        )
+        if args.output:
+            save_results(results, args.output)
+        return 0
+    rows = compare_results(
+        load_results(args.baseline), load_results(args.current), args.threshold, args.memory_threshold
+    )
+    for row in rows:
+        memory = "-" if row["memory_ratio"] is None else f"{row['memory_ratio']:.2f}x"
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['name']:<40} {row['time_ratio']:>7.2f}x {memory:>8} {flag}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
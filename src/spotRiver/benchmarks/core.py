@@ -0,0 +1,166 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import river
+
+import spotRiver
+
+# Registered benchmarks: name -> setup function. A setup function takes the scale (1.0 is the
+# full size) and a temporary directory and returns the function to be measured.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register the decorated setup function as benchmark `name`."""
+
+    def register(setup):
+        if name in BENCHMARKS:
+            raise ValueError(f"Benchmark {name!r} is already registered.")
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def measure(run, repeat=3, measure_memory=True):
+    """Measure the run time and the peak memory of `run()`.
+
+    The run time is measured `repeat` times without tracing. The peak memory of the Python
+    allocations is measured in one additional traced run, because tracing slows down the run.
+
+    Args:
+        run (callable): function to measure.
+        repeat (int): number of timed runs.
+        measure_memory (bool): whether to measure the peak memory.
+
+    Returns:
+        (dict): the median, minimum and all run times in seconds and the peak memory in bytes
+            (`None` if not measured).
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"time": statistics.median(times), "min_time": min(times), "times": times, "peak_memory": peak_memory}
+
+
+def environment():
+    """Return the versions and the machine the benchmarks are run on."""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "spotRiver": spotRiver.__version__,
+        "river": river.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def run_benchmarks(names=None, scale=1.0, repeat=3, measure_memory=True, tmp_dir=None, verbose=False):
+    """Run the registered benchmarks.
+
+    All benchmarks use synthetic or bundled data, so they run offline.
+
+    Args:
+        names (list): names of the benchmarks to run. Defaults to all registered benchmarks.
+        scale (float): scale of the benchmark data, e.g., 0.01 for a quick smoke run.
+        repeat (int): number of timed runs per benchmark.
+        measure_memory (bool): whether to measure the peak memory.
+        tmp_dir (str or Path): directory for the generated data files. Defaults to a temporary directory.
+        verbose (bool): whether to print the results while running.
+
+    Returns:
+        (dict): `{"environment": ..., "settings": ..., "benchmarks": {name: measurement}}`,
+            see `environment` and `measure`.
+    """
+    # Import the suite to register the benchmarks.
+    from spotRiver.benchmarks import suite  # noqa: F401
+
+    names = list(BENCHMARKS) if names is None else names
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {unknown}. Available benchmarks: {list(BENCHMARKS)}")
+    results = {
+        "environment": environment(),
+        "settings": {"scale": scale, "repeat": repeat, "measure_memory": measure_memory},
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        for name in names:
+            bench_dir = Path(tmp) / name
+            bench_dir.mkdir()
+            run = BENCHMARKS[name](scale, bench_dir)
+            results["benchmarks"][name] = measure(run, repeat=repeat, measure_memory=measure_memory)
+            if verbose:
+                print(format_measurement(name, results["benchmarks"][name]))
+    return results
+
+
+def format_measurement(name, measurement):
+    """Format one measurement as a line of text."""
+    memory = measurement["peak_memory"]
+    memory = "-" if memory is None else f"{memory * 2**-20:.1f} MB"
+    return f"{name:<40} {measurement['time']:>10.4f} s {memory:>12}"
+
+
+def save_results(results, path):
+    """Write benchmark results to a JSON file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    """Read benchmark results from a JSON file."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, threshold=0.1, memory_threshold=None):
+    """Compare two benchmark runs.
+
+    A benchmark is flagged as a regression if its median time grew by more than `threshold`
+    (relative), or if its peak memory grew by more than `memory_threshold`.
+
+    Args:
+        baseline (dict): results of the baseline run, see `run_benchmarks`.
+        current (dict): results of the current run.
+        threshold (float): tolerated relative increase of the run time, e.g., 0.1 for 10%.
+        memory_threshold (float): tolerated relative increase of the peak memory. Defaults to `threshold`.
+
+    Returns:
+        (list): one dictionary per benchmark that is in both runs with the entries `name`,
+            `time_ratio`, `memory_ratio` (`None` if not measured in both runs) and `regression`.
+    """
+    if memory_threshold is None:
+        memory_threshold = threshold
+    rows = []
+    for name, new in current["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            continue
+        time_ratio = new["time"] / old["time"] if old["time"] > 0 else float("inf")
+        memory_ratio = None
+        if old.get("peak_memory") and new.get("peak_memory") is not None:
+            memory_ratio = new["peak_memory"] / old["peak_memory"]
+        regression = time_ratio > 1 + threshold or (memory_ratio is not None and memory_ratio > 1 + memory_threshold)
+        rows.append({"name": name, "time_ratio": time_ratio, "memory_ratio": memory_ratio, "regression": regression})
+    return rows
@@ -0,0 +1,235 @@
+"""Benchmarks of the objective functions, data loaders and feature functions.
+
+Every benchmark is registered with `benchmark` and consists of a setup function, which prepares
+the data (not measured), and the returned run function (measured).
+
+"""
+import datetime
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from spotRiver import data
+from spotRiver.benchmarks.core import benchmark
+from spotRiver.data.generic import GenericData
+from spotRiver.data.materialize import DATASET_CACHE
+from spotRiver.data.opm import OPM_FILENAME, fetch_opm
+from spotRiver.data.preprocessed import PREPROCESSED_CACHE
+from spotRiver.data.synth import SEA
+from spotRiver.fun.hyperriver import HyperRiver
+from spotRiver.utils import features
+
+HW_X = np.array([[0.3, 0.1, 0.6, 12, 0], [0.5, 0.1, 0.6, 12, 1], [0.2, 0.2, 0.2, 12, 0]])
+SNARIMAX_X = np.array([[2, 0, 1, 12, 1, 0, 1, 0.01, 0.001, 0, 0, 1], [1, 1, 0, 12, 0, 1, 0, 0.01, 0.001, 0, 1, 1]])
+HTR_X = np.array([[200, 20, 1e-7, 0.05, 0, 0, 0.95, 0, 5, 0, 500], [50, 10, 1e-5, 0.05, 1, 0, 0.95, 0, 5, 1, 500]])
+
+
+def _n(n, scale, minimum=1):
+    return max(minimum, int(n * scale))
+
+
+def write_opm_csv(path, n, seed=1):
+    """Write a synthetic CSV file with the layout of the OPM dataset.
+
+    Args:
+        path (str or Path): file to write.
+        n (int): number of rows.
+        seed (int): seed of the random values.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2001-06-01") + pd.to_timedelta(rng.integers(0, 7000, n), unit="D")
+    lon = rng.uniform(-73.9, -71.5, n)
+    lat = rng.uniform(40.9, 42.2, n)
+    df = pd.DataFrame(
+        {
+            "Serial Number": np.arange(n),
+            "List Year": dates.year,
+            "Date Recorded": dates.strftime("%m/%d/%Y"),
+            "Town": rng.choice(["Andover", "Bethel", "Canton", "Darien", "Easton"], n),
+            "Address": [f"{i} MAIN ST" for i in range(n)],
+            "Assessed Value": rng.uniform(1000, 1e6, n).round(),
+            "Sale Amount": rng.uniform(1000, 2e6, n).round(),
+            "Sales Ratio": rng.uniform(0, 1, n),
+            "Property Type": rng.choice(["Residential", "Commercial", None], n),
+            "Residential Type": rng.choice(["Single Family", "Condo", None], n),
+            "Non Use Code": None,
+            "Assessor Remarks": None,
+            "OPM remarks": None,
+            "Location": [f"POINT ({a:.6f} {b:.6f})" if i % 7 else None for i, (a, b) in enumerate(zip(lon, lat))],
+        }
+    )
+    df.to_csv(path, index=False)
+
+
+def _opm_generic_data(tmp_dir, n, **kwargs):
+    write_opm_csv(tmp_dir / OPM_FILENAME, n)
+    return GenericData(
+        filename=OPM_FILENAME,
+        directory=tmp_dir,
+        target="Sale Amount",
+        n_features=13,
+        n_samples=n,
+        converters={"Assessed Value": float, "Sale Amount": float, "Sales Ratio": float, "List Year": int},
+        parse_dates={"Date Recorded": "%m/%d/%Y"},
+        **kwargs,
+    )
+
+
+# `fun_HTR_iter_progressive` reports every 10000 samples, so smaller datasets have no checkpoint.
+HTR_MIN_SAMPLES = 10_500
+
+
+def _sea_data(n):
+    return [(x, float(y)) for x, y in itertools.islice(SEA(seed=1), n)]
+
+
+@benchmark("fun_hw.airline_passengers")
+def setup_fun_hw(scale, tmp_dir):
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 12}
+    X = np.repeat(HW_X, _n(4, scale), axis=0)
+    return lambda: HyperRiver().fun_hw(X, fun_control)
+
+
+@benchmark("fun_hw.airline_passengers_numpy")
+def setup_fun_hw_numpy(scale, tmp_dir):
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 12, "engine": "numpy"}
+    X = np.repeat(HW_X, _n(4, scale), axis=0)
+    return lambda: HyperRiver().fun_hw(X, fun_control)
+
+
+@benchmark("fun_snarimax.airline_passengers_backtest")
+def setup_fun_snarimax_backtest(scale, tmp_dir):
+    fun_control = {
+        "data": data.AirlinePassengers(),
+        "horizon": 12,
+        "backtest_origins": 4,
+        "backtest_window": 24,
+    }
+    X = np.repeat(SNARIMAX_X, _n(2, scale), axis=0)
+    return lambda: HyperRiver().fun_snarimax(X, fun_control)
+
+
+@benchmark("fun_snarimax.airline_passengers")
+def setup_fun_snarimax(scale, tmp_dir):
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 12}
+    X = np.repeat(SNARIMAX_X, _n(2, scale), axis=0)
+    return lambda: HyperRiver().fun_snarimax(X, fun_control)
+
+
+@benchmark("fun_HTR_iter_progressive.sea")
+def setup_fun_htr_sea(scale, tmp_dir):
+    dataset = _sea_data(_n(20_000, scale, HTR_MIN_SAMPLES))
+    fun_control = {"data": dataset, "n_samples": len(dataset)}
+    return lambda: HyperRiver().fun_HTR_iter_progressive(HTR_X, fun_control)
+
+
+@benchmark("fun_HTR_iter_progressive.sea_shared_preprocessing")
+def setup_fun_htr_sea_shared(scale, tmp_dir):
+    dataset = _sea_data(_n(20_000, scale, HTR_MIN_SAMPLES))
+    fun_control = {"data": dataset, "n_samples": len(dataset), "shared_preprocessing": "sparse"}
+
+    def run():
+        # Measure the preprocessing, too.
+        PREPROCESSED_CACHE.clear()
+        return HyperRiver().fun_HTR_iter_progressive(HTR_X, fun_control)
+
+    return run
+
+
+@benchmark("fun_HTR_iter_progressive.opm_csv")
+def setup_fun_htr_opm(scale, tmp_dir):
+    dataset = _opm_generic_data(tmp_dir, _n(20_000, scale, HTR_MIN_SAMPLES))
+
+    def run():
+        # Measure the parsing of the file, too.
+        DATASET_CACHE.clear()
+        return HyperRiver().fun_HTR_iter_progressive(HTR_X, {"data": dataset, "n_samples": dataset.n_samples})
+
+    return run
+
+
+@benchmark("fetch_opm.cold")
+def setup_fetch_opm_cold(scale, tmp_dir):
+    write_opm_csv(tmp_dir / OPM_FILENAME, _n(100_000, scale, 100))
+    return lambda: fetch_opm(data_home=tmp_dir, download_if_missing=False, include_categorical=True, use_cache=False)
+
+
+@benchmark("fetch_opm.cached")
+def setup_fetch_opm_cached(scale, tmp_dir):
+    write_opm_csv(tmp_dir / OPM_FILENAME, _n(100_000, scale, 100))
+    kwargs = dict(data_home=tmp_dir, download_if_missing=False, include_categorical=True)
+    fetch_opm(**kwargs)
+    return lambda: fetch_opm(**kwargs)
+
+
+@benchmark("generic_data.iter")
+def setup_generic_data_iter(scale, tmp_dir):
+    dataset = _opm_generic_data(tmp_dir, _n(50_000, scale, 100))
+    return lambda: sum(1 for _ in dataset)
+
+
+@benchmark("generic_data.iter_columnar")
+def setup_generic_data_iter_columnar(scale, tmp_dir):
+    dataset = _opm_generic_data(tmp_dir, _n(50_000, scale, 100), columnar=True)
+    # Parse the file before the measurement, later passes are replayed from the columns.
+    sum(1 for _ in dataset)
+    return lambda: sum(len(x) for x, _ in dataset)
+
+
+@benchmark("generic_data.sample_bernoulli")
+def setup_generic_data_sample_bernoulli(scale, tmp_dir):
+    dataset = _opm_generic_data(tmp_dir, _n(200_000, scale, 100), fraction=0.01)
+    return lambda: sum(1 for _ in dataset)
+
+
+@benchmark("generic_data.sample_skip")
+def setup_generic_data_sample_skip(scale, tmp_dir):
+    dataset = _opm_generic_data(tmp_dir, _n(200_000, scale, 100), fraction=0.01, sampling="skip", data_home=tmp_dir)
+    return lambda: sum(1 for _ in dataset)
+
+
+@benchmark("sea.iter")
+def setup_sea_iter(scale, tmp_dir):
+    n = _n(100_000, scale)
+    return lambda: sum(1 for _ in itertools.islice(SEA(seed=1), n))
+
+
+def _dates(n):
+    start = datetime.datetime(2000, 1, 1)
+    return [start + datetime.timedelta(hours=7 * i) for i in range(n)]
+
+
+@benchmark("features.per_sample")
+def setup_features_per_sample(scale, tmp_dir):
+    xs = [{"date": d} for d in _dates(_n(50_000, scale))]
+    functions = (
+        features.get_month_distances,
+        features.get_weekday_distances,
+        features.get_hour_distances,
+        features.get_ordinal_date,
+    )
+
+    def run():
+        for f in functions:
+            for x in xs:
+                f(x)
+
+    return run
+
+
+@benchmark("features.batch")
+def setup_features_batch(scale, tmp_dir):
+    dates = _dates(_n(50_000, scale))
+    functions = (
+        features.get_month_distances_batch,
+        features.get_weekday_distances_batch,
+        features.get_hour_distances_batch,
+        features.get_ordinal_date_batch,
+    )
+
+    def run():
+        for f in functions:
+            f(dates)
+
+    return run
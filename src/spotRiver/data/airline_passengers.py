@@ -1,32 +1,43 @@
 from river import stream
 
 from . import base
+from .columnar import ColumnarFileMixin
 
 
-class AirlinePassengers(base.FileDataset):
+class AirlinePassengers(ColumnarFileMixin, base.FileDataset):
     """Monthly number of international airline passengers.
 
     The stream contains 144 items and only one single feature, which is the month. The goal is to
     predict the number of passengers each month by capturing the trend and the seasonality of the
     data.
 
+    Parameters
+    ----------
+    columnar
+        Whether to parse the file once and replay later passes from typed columns, see
+        `ColumnarDataset`. The rows are read-only views.
+
     References
     ----------
     [^1]: [International airline passengers: monthly totals in thousands. Jan 49 – Dec 60](https://datamarket.com/data/set/22u3/international-airline-passengers-monthly-totals-in-thousands-jan-49-dec-60#!ds=22u3&display=line)
 
     """
 
-    def __init__(self):
+    def __init__(self, columnar=False):
         super().__init__(
             filename="airline-passengers.csv",
             task=base.REG,
             n_features=1,
             n_samples=144,
         )
+        self.columnar = columnar
+
+    def _iter_rows(self):
+        return self._iter_csv(self.path)
 
-    def __iter__(self):
+    def _iter_csv(self, buffer):
         return stream.iter_csv(
-            self.path,
+            buffer,
             target="passengers",
             converters={"passengers": int},
             parse_dates={"month": "%Y-%m"},
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from . import base
+
+__all__ = ["ArrayDataset"]
+
+
+class ArrayDataset(base.Dataset):
+    """A numeric dataset that is held in contiguous NumPy arrays.
+
+    Iterating over the dataset yields one feature dictionary per row, as for every other dataset.
+    Evaluation functions that support mini-batches, e.g., `eval_oml_iter_progressive` with
+    `batch_size`, use `batch` or `iter_batches` instead and pass the data to the models with
+    `learn_many` and `predict_many`.
+
+    Parameters
+    ----------
+    X
+        Array of shape `(n_samples, n_features)`.
+    y
+        Array of shape `(n_samples,)`.
+    feature_names
+        Names of the features. Defaults to `0, 1, ..., n_features - 1`.
+    task
+        Type of task the dataset is meant for.
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> from spotRiver.data.array import ArrayDataset
+
+    >>> dataset = ArrayDataset(np.arange(6.0).reshape(3, 2), np.array([1.0, 2.0, 3.0]), ["a", "b"])
+
+    >>> for x, y in dataset:
+    ...     print(x, y)
+    {'a': 0.0, 'b': 1.0} 1.0
+    {'a': 2.0, 'b': 3.0} 2.0
+    {'a': 4.0, 'b': 5.0} 3.0
+
+    >>> X, y = dataset.batch(1, 3)
+    >>> X.shape, y.tolist()
+    ((2, 2), [2.0, 3.0])
+
+    """
+
+    def __init__(self, X, y, feature_names=None, task=base.REG):
+        X = np.ascontiguousarray(X)
+        y = np.ascontiguousarray(y)
+        if X.ndim != 2:
+            raise ValueError(f"X must be two-dimensional, got shape {X.shape}.")
+        if y.shape != (X.shape[0],):
+            raise ValueError(f"y must have shape ({X.shape[0]},), got {y.shape}.")
+        if feature_names is None:
+            feature_names = list(range(X.shape[1]))
+        if len(feature_names) != X.shape[1]:
+            raise ValueError(f"Expected {X.shape[1]} feature names, got {len(feature_names)}.")
+        super().__init__(task=task, n_features=X.shape[1], n_samples=X.shape[0])
+        self.X = X
+        self.y = y
+        self.feature_names = list(feature_names)
+
+    @classmethod
+    def from_frame(cls, X, y, task=base.REG):
+        """Create a dataset from a data frame of numeric features.
+
+        Parameters
+        ----------
+        X
+            Data frame of numeric features, e.g., returned by `fetch_opm(include_categorical=False)`.
+        y
+            Series of target values or the name of the target column of `X`.
+        task
+            Type of task the dataset is meant for.
+
+        """
+        if isinstance(y, str):
+            X, y = X.drop(columns=y), X[y]
+        return cls(X.to_numpy(), np.asarray(y), feature_names=list(X.columns), task=task)
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def __iter__(self):
+        names = self.feature_names
+        for x, y in zip(self.X.tolist(), self.y.tolist()):
+            yield dict(zip(names, x)), y
+
+    def batch(self, start, stop):
+        """Return the rows `start` to `stop - 1` as a data frame and a series.
+
+        The data frame is a view on the stored array where pandas allows it.
+
+        """
+        index = pd.RangeIndex(start, stop)
+        return (
+            pd.DataFrame(self.X[start:stop], columns=self.feature_names, index=index, copy=False),
+            pd.Series(self.y[start:stop], index=index, copy=False),
+        )
+
+    def iter_batches(self, batch_size):
+        """Iterate over the dataset in mini-batches of `batch_size` rows, see `batch`."""
+        for start in range(0, len(self), batch_size):
+            yield self.batch(start, min(start + batch_size, len(self)))
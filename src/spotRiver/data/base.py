@@ -1,19 +1,27 @@
 import abc
+import contextlib
+import hashlib
 import inspect
+import io
 import itertools
+import json
+import os
 import pathlib
 import re
 import shutil
 import tarfile
 import typing
 import zipfile
-from urllib import request
+from urllib import error, request
 from pathlib import Path
 from os import environ, path
 
 from river import utils
 
-__all__ = ["Dataset", "SyntheticDataset", "FileDataset", "RemoteDataset"]
+from spotRiver.data.line_index import LineReader, load_line_offsets
+from spotRiver.utils.locking import FileLock, atomic_write, lock_path
+
+__all__ = ["Dataset", "SyntheticDataset", "FileDataset", "FileSlice", "RemoteDataset"]
 
 REG = "Regression"
 BINARY_CLF = "Binary classification"
@@ -199,7 +207,136 @@ class SyntheticDataset(Dataset):
         }
 
 
-class FileDataset(Dataset):
+class _RandomAccess:
+    """Random access to the rows of a file dataset with one record per line.
+
+    The byte offsets of the lines are stored in the data home, see `load_line_offsets`, so the
+    file is scanned once. Afterwards, `dataset[i:j]` returns the rows `i` to `j - 1` as a
+    `FileSlice` without reading the rows before them, `dataset[i]` returns a single row and
+    `shards` splits the rows into contiguous slices, e.g., for parallel workers. Slices can be
+    pickled.
+
+    Subclasses support random access by parsing a buffer of lines in `_iter_csv`.
+    """
+
+    # Data home of the stored line index, see `get_data_home`. Set by the constructors.
+    data_home = None
+    _line_index = (None, None)
+
+    def _iter_csv(self, buffer):
+        """Parse the rows of `buffer`, an open file or a `LineReader`."""
+        raise NotImplementedError(f"{type(self).__name__} does not support random access.")
+
+    @property
+    def sliceable(self):
+        """Whether the rows of the dataset can be sliced, i.e., `_iter_csv` is implemented."""
+        return type(self)._iter_csv is not _RandomAccess._iter_csv
+
+    def __getstate__(self):
+        # The line offsets are loaded again from the stored index, e.g., by parallel workers.
+        state = self.__dict__.copy()
+        state.pop("_line_index", None)
+        return state
+
+    def line_offsets(self, data_home=None):
+        """Return the byte offsets of the lines of the file, including the header line.
+
+        Args:
+            data_home (str): data home of the stored index, see `get_data_home`. Defaults to the
+                `data_home` attribute of the dataset.
+
+        Returns:
+            (np.ndarray): the offsets, see `line_offsets`.
+        """
+        stat = self.path.stat()
+        version = (str(self.path), stat.st_size, stat.st_mtime_ns)
+        if self._line_index[0] != version:
+            index_dir = pathlib.Path(get_data_home(data_home or self.data_home), "line_index")
+            self._line_index = (version, load_line_offsets(self.path, index_dir))
+        return self._line_index[1]
+
+    @property
+    def n_rows(self):
+        """Number of rows of the file, excluding the header."""
+        return len(self.line_offsets()) - 1
+
+    def __getitem__(self, index):
+        if not self.sliceable:
+            raise TypeError(f"{type(self).__name__} does not support random access.")
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(self.n_rows)
+            if stride != 1:
+                raise ValueError("Slices with a step are not supported.")
+            return FileSlice(self, start, max(start, stop))
+        n_rows = self.n_rows
+        i = index + n_rows if index < 0 else index
+        if not 0 <= i < n_rows:
+            raise IndexError(f"Row {index} is out of range for {n_rows} rows.")
+        return next(iter(FileSlice(self, i, i + 1)))
+
+    def shards(self, n_shards):
+        """Split the rows into `n_shards` contiguous slices whose sizes differ by at most one.
+
+        Args:
+            n_shards (int): number of shards.
+
+        Returns:
+            (list): the `FileSlice` objects, in file order.
+        """
+        bounds = [i * self.n_rows // n_shards for i in range(n_shards + 1)]
+        return [self[start:stop] for start, stop in zip(bounds, bounds[1:])]
+
+
+class FileSlice(Dataset):
+    """Contiguous rows `start` to `stop - 1` of a file dataset.
+
+    Iterating over the slice seeks to the first row and parses only the rows of the slice.
+
+    Parameters
+    ----------
+    dataset
+        The file dataset, see `FileDataset.__getitem__`.
+    start
+        Index of the first row.
+    stop
+        Index after the last row.
+
+    """
+
+    def __init__(self, dataset, start, stop):
+        super().__init__(
+            task=dataset.task,
+            n_features=dataset.n_features,
+            n_samples=stop - start,
+            n_classes=dataset.n_classes,
+            n_outputs=dataset.n_outputs,
+            sparse=dataset.sparse,
+        )
+        self.dataset = dataset
+        self.start = start
+        self.stop = stop
+
+    def __iter__(self):
+        offsets = self.dataset.line_offsets()
+        return self.dataset._iter_csv(LineReader(self.dataset.path, offsets, range(self.start, self.stop)))
+
+    def __len__(self):
+        return self.stop - self.start
+
+    @property
+    def sliceable(self):
+        return True
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self.dataset[range(self.start, self.stop)[index]]
+        start, stop, stride = index.indices(len(self))
+        if stride != 1:
+            raise ValueError("Slices with a step are not supported.")
+        return FileSlice(self.dataset, self.start + start, self.start + max(start, stop))
+
+
+class FileDataset(_RandomAccess, Dataset):
     """Base class for datasets that are stored in a local file.
 
     Small datasets that are part of the spotRiver package inherit from this class.
@@ -211,15 +348,18 @@ class FileDataset(Dataset):
     directory
         The directory where the file is contained. Defaults to the location of the `datasets`
         module.
+    data_home
+        The data home of the line index of the file, see `get_data_home` and `line_offsets`.
     desc
         Extra dataset parameters to pass as keyword arguments.
 
     """
 
-    def __init__(self, filename, directory=None, **desc):
+    def __init__(self, filename, directory=None, data_home=None, **desc):
         super().__init__(**desc)
         self.filename = filename
         self.directory = directory
+        self.data_home = data_home
 
     @property
     def path(self):
@@ -242,6 +382,17 @@ class RemoteDataset(FileDataset):
     The filename doesn't have to be provided if unpack is False. Indeed in the latter case the
     filename will be inferred from the URL.
 
+    Downloads are written to a `.part` file first. An interrupted download is resumed with an
+    HTTP Range request if the server supports it. The SHA-256 digest of the download is computed
+    while streaming and compared with `sha256`, if given. Archives are unpacked once they are
+    downloaded and verified, and deleted afterwards. Members of tar archives that would be
+    written outside of the data directory, e.g., absolute paths or links, are rejected. A
+    completed download is recorded in a marker file next to the data, so that `is_downloaded`
+    does not need to inspect the data.
+
+    If `read_from_archive` is `True`, the archive is kept and not unpacked. Subclasses read their
+    data with `open_member`, which works for unpacked data as well.
+
     Parameters
     ----------
     url
@@ -252,12 +403,17 @@ class RemoteDataset(FileDataset):
         Whether to unpack the download or not.
     filename
         An optional name to given to the file if the file is unpacked.
+    sha256
+        The expected SHA-256 hex digest of the downloaded file.
+    read_from_archive
+        Whether to keep the archive and read the data directly from it instead of unpacking it.
     desc
-        Extra dataset parameters to pass as keyword arguments.
+        Extra dataset parameters to pass as keyword arguments. The file is downloaded to the
+        `data_home`, see `FileDataset`.
 
     """
 
-    def __init__(self, url, size, unpack=True, filename=None, **desc):
+    def __init__(self, url, size, unpack=True, filename=None, sha256=None, read_from_archive=False, **desc):
 
         if filename is None:
             filename = path.basename(url)
@@ -266,58 +422,165 @@ class RemoteDataset(FileDataset):
         self.url = url
         self.size = size
         self.unpack = unpack
+        self.sha256 = sha256
+        self.read_from_archive = read_from_archive
+
+    @property
+    def _data_dir(self):
+        return pathlib.Path(get_data_home(self.data_home), self.__class__.__name__)
+
+    @property
+    def archive_path(self):
+        return self._data_dir.joinpath(path.basename(self.url))
 
     @property
     def path(self):
-        return pathlib.Path(get_data_home(), self.__class__.__name__, self.filename)
+        if self.read_from_archive:
+            return self.archive_path
+        return self._data_dir.joinpath(self.filename)
 
-    def download(self, force=False, verbose=True):
+    @property
+    def _marker_path(self):
+        return self._data_dir.joinpath(f".{self.path.name}.complete")
 
-        if not force and self.is_downloaded:
-            return
+    def _marker_content(self):
+        return {
+            "url": self.url,
+            "sha256": self.sha256,
+            "unpack": self.unpack,
+            "read_from_archive": self.read_from_archive,
+        }
 
-        # Determine where to download the archive
-        directory = self.path.parent
-        directory.mkdir(parents=True, exist_ok=True)
-        archive_path = directory.joinpath(path.basename(self.url))
+    def _write_marker(self):
+        with atomic_write(self._marker_path, "w") as f:
+            json.dump(self._marker_content(), f)
 
-        with request.urlopen(self.url) as r:
+    def _request(self, offset=0):
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        return request.Request(self.url, headers=headers)
 
-            # Notify the user
-            if verbose:
-                meta = r.info()
-                try:
-                    n_bytes = int(meta["Content-Length"])
-                    msg = f"Downloading {self.url} ({utils.pretty.humanize_bytes(n_bytes)})"
-                except KeyError:
-                    msg = f"Downloading {self.url}"
-                print(msg)
-
-            # Now dump the contents of the requests
-            with open(archive_path, "wb") as f:
-                shutil.copyfileobj(r, f)
-
-        if not self.unpack:
+    def _notify(self, r, verbose):
+        if verbose:
+            try:
+                n_bytes = int(r.info()["Content-Length"])
+                msg = f"Downloading {self.url} ({utils.pretty.humanize_bytes(n_bytes)})"
+            except (KeyError, TypeError):
+                msg = f"Downloading {self.url}"
+            print(msg)
+
+    def _verify(self, digest):
+        """Raise a `RuntimeError` if `digest` does not match `self.sha256`."""
+        if self.sha256 is not None and digest != self.sha256.lower():
+            raise RuntimeError(f"Checksum mismatch for {self.url}: expected {self.sha256}, got {digest}")
+
+    def download(self, force=False, verbose=True):
+
+        if not force and self.is_downloaded:
             return
 
-        if verbose:
-            print(f"Uncompressing into {directory}")
+        # Only one process downloads the data, the others wait and reuse it.
+        with FileLock(lock_path(self.archive_path)):
+            if not force and self.is_downloaded:
+                return
+            self._download(force, verbose)
 
-        if archive_path.suffix.endswith("zip"):
-            with zipfile.ZipFile(archive_path, "r") as zf:
-                zf.extractall(directory)
+    def _download(self, force=False, verbose=True):
 
-        elif archive_path.suffix.endswith(("gz", "tar")):
-            mode = "r:" if archive_path.suffix.endswith("tar") else "r:gz"
-            tar = tarfile.open(archive_path, mode)
-            tar.extractall(directory)
-            tar.close()
+        # Determine where to download the archive
+        directory = self._data_dir
+        directory.mkdir(parents=True, exist_ok=True)
+        self._marker_path.unlink(missing_ok=True)
+        archive_path = self.archive_path
+        self._download_file(archive_path, force, verbose)
 
-        else:
-            raise RuntimeError(f"Unhandled extension type: {archive_path.suffix}")
+        if self.unpack and not self.read_from_archive:
+            if verbose:
+                print(f"Uncompressing into {directory}")
+            try:
+                mode = _tar_mode(archive_path)
+                if mode is not None:
+                    _extract_tar(archive_path, directory, mode)
+                elif archive_path.suffix.endswith("zip"):
+                    with zipfile.ZipFile(archive_path, "r") as zf:
+                        zf.extractall(directory)
+                else:
+                    raise RuntimeError(f"Unhandled extension type: {archive_path.suffix}")
+            finally:
+                # Delete the archive file now that it has been uncompressed
+                archive_path.unlink()
+
+        self._write_marker()
+
+    def _download_file(self, file_path, force=False, verbose=True):
+        """Download the URL to `file_path`, resuming a previous partial download unless `force` is set."""
+        part_path = file_path.with_name(file_path.name + ".part")
+        if force:
+            part_path.unlink(missing_ok=True)
+        hasher, offset = _hash_file(part_path)
+        r = self._open_from(offset)
+        if r is not None:
+            with r:
+                if offset and r.status != 206:
+                    # The server ignored the range, start over.
+                    offset = 0
+                    hasher = hashlib.sha256()
+                self._notify(r, verbose)
+                length = r.info()["Content-Length"]
+                expected = None if length is None else offset + int(length)
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in iter(lambda: r.read(CHUNK_SIZE), b""):
+                        hasher.update(chunk)
+                        f.write(chunk)
+                        offset += len(chunk)
+                if expected is not None and offset < expected:
+                    # The received bytes are kept, so that the next attempt resumes after them.
+                    raise error.ContentTooShortError(
+                        f"Retrieval incomplete: got only {offset} out of {expected} bytes", None
+                    )
+        try:
+            self._verify(hasher.hexdigest())
+        except RuntimeError:
+            part_path.unlink()
+            raise
+        os.replace(part_path, file_path)
+
+    def _open_from(self, offset):
+        """Request the URL from byte `offset` on. Return `None` if there are no bytes after `offset`."""
+        try:
+            return request.urlopen(self._request(offset))
+        except error.HTTPError as err:
+            # 416: the requested range starts at the end of the file, i.e., the file is complete.
+            if offset and err.code == 416:
+                return None
+            raise
+
+    @contextlib.contextmanager
+    def open_member(self, name=None, encoding=None):
+        """Open a file of the dataset, from the archive if `read_from_archive` is set.
+
+        Parameters
+        ----------
+        name
+            Name of the file. Defaults to `filename`. Archive members are also found by their base
+            name, e.g., `data.csv` for `dataset/data.csv`.
+        encoding
+            If given, the file is opened in text mode with this encoding, otherwise in binary mode.
 
-        # Delete the archive file now that it has been uncompressed
-        archive_path.unlink()
+        """
+        name = self.filename if name is None else name
+        with contextlib.ExitStack() as stack:
+            if not self.read_from_archive:
+                file_path = self.path if self.path.is_file() else self.path.joinpath(name)
+                f = stack.enter_context(open(file_path, "rb"))
+            elif self.archive_path.suffix.endswith("zip"):
+                zf = stack.enter_context(zipfile.ZipFile(self.archive_path, "r"))
+                f = stack.enter_context(zf.open(_find_member(zf.namelist(), name)))
+            else:
+                tar = stack.enter_context(tarfile.open(self.archive_path, "r:*"))
+                f = stack.enter_context(tar.extractfile(_find_member(tar.getnames(), name)))
+            if encoding is not None:
+                f = stack.enter_context(io.TextIOWrapper(f, encoding=encoding, newline=""))
+            yield f
 
     @abc.abstractmethod
     def _iter(self):
@@ -326,13 +589,23 @@ class RemoteDataset(FileDataset):
     @property
     def is_downloaded(self):
         """Indicate whether or the data has been correctly downloaded."""
-        if self.path.exists():
-
-            if self.path.is_file():
-                return self.path.stat().st_size == self.size
-            return sum(f.stat().st_size for f in self.path.glob("**/*") if f.is_file())
-
-        return False
+        try:
+            marker = json.loads(self._marker_path.read_text())
+        except (OSError, ValueError):
+            marker = None
+        if marker is not None:
+            return marker == self._marker_content() and self.path.exists()
+
+        # Data without a marker, e.g., downloaded by an earlier version.
+        if not self.path.exists():
+            return False
+        if self.path.is_file():
+            downloaded = self.path.stat().st_size == self.size
+        else:
+            downloaded = any(f.is_file() for f in self.path.glob("**/*"))
+        if downloaded:
+            self._write_marker()
+        return downloaded
 
     def __iter__(self):
         if not self.is_downloaded:
@@ -350,7 +623,72 @@ class RemoteDataset(FileDataset):
         return content
 
 
-class GenericFileDataset(Dataset):
+# Size of the chunks in which downloads are read and hashed.
+CHUNK_SIZE = 2**20
+
+
+def _hash_file(file_path):
+    """Return the SHA-256 hasher and the size of a possibly missing file."""
+    hasher = hashlib.sha256()
+    size = 0
+    if file_path.exists():
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                hasher.update(chunk)
+                size += len(chunk)
+    return hasher, size
+
+
+def _tar_mode(archive_path):
+    """Return the streaming mode of `tarfile.open` for the archive, `None` if it is no tar archive."""
+    if archive_path.suffix.endswith("gz"):
+        return "r|gz"
+    if archive_path.suffix.endswith("tar"):
+        return "r|"
+    return None
+
+
+def _extract_tar(archive_path, directory, mode):
+    """Unpack a tar archive into `directory`.
+
+    The members are unpacked into a staging directory, which is moved into `directory` once the
+    whole archive is unpacked. Members that would be written outside of the staging directory are
+    rejected with a `tarfile.TarError`.
+    """
+    staging = directory.joinpath(f".{archive_path.name}.partial")
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        with tarfile.open(archive_path, mode=mode) as tar:
+            for member in tar:
+                _extract_member(tar, member, staging)
+        for entry in staging.iterdir():
+            target = directory.joinpath(entry.name)
+            if target.is_dir() and not target.is_symlink():
+                shutil.rmtree(target)
+            os.replace(entry, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _extract_member(tar, member, path):
+    """Extract `member` into `path` with the "data" filter of `tarfile`, or an equivalent check of the path."""
+    if hasattr(tarfile, "data_filter"):
+        tar.extract(member, path, filter="data")
+        return
+    target = path.joinpath(member.name).resolve()
+    if member.issym() or member.islnk() or not target.is_relative_to(path.resolve()):
+        raise tarfile.TarError(f"{member.name!r} would be extracted outside of {path}")
+    tar.extract(member, path)
+
+
+def _find_member(names, name):
+    for member in names:
+        if member == name or member.endswith("/" + name):
+            return member
+    raise FileNotFoundError(f"{name} not found in archive")
+
+
+class GenericFileDataset(_RandomAccess, Dataset):
     """Base class for datasets that are stored in a local file.
 
     Small datasets that are part of the spotRiver package inherit from this class.
@@ -362,15 +700,18 @@ class GenericFileDataset(Dataset):
     directory
         The directory where the file is contained. Defaults to the location of the `datasets`
         module.
+    data_home
+        The data home of the line index of the file, see `get_data_home` and `line_offsets`.
     desc
         Extra dataset parameters to pass as keyword arguments.
 
     """
 
-    def __init__(self, filename, target, converters, parse_dates, directory=None, **desc):
+    def __init__(self, filename, target, converters, parse_dates, directory=None, data_home=None, **desc):
         super().__init__(**desc)
         self.filename = filename
         self.directory = directory
+        self.data_home = data_home
         self.target = target
         self.converters = converters
         self.parse_dates = parse_dates
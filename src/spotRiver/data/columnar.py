@@ -0,0 +1,181 @@
+"""Columnar datasets.
+
+`stream.iter_csv` parses every row into a new dictionary and every date with `strptime` on every
+pass. A columnar dataset parses the file once and stores one typed NumPy array per feature:
+numbers as int64 or float64, datetimes as int64 microseconds since the epoch and all other values,
+e.g., strings, dictionary-encoded as int32 codes into a list of categories. Iterating yields
+lightweight read-only row views that decode their values on access.
+
+"""
+import datetime
+import sys
+from collections.abc import Mapping
+
+import numpy as np
+
+from . import base
+
+__all__ = ["ColumnarDataset", "ColumnarFileMixin", "RowView"]
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _encode(values):
+    """Return the storage kind, the array and the categories of a column, see `ColumnarDataset`."""
+    types = set(map(type, values))
+    if types == {int}:
+        try:
+            return "int", np.array(values, dtype=np.int64), None
+        except OverflowError:
+            pass
+    if types == {float}:
+        return "float", np.array(values, dtype=np.float64), None
+    if types == {datetime.datetime} and all(v.tzinfo is None for v in values):
+        return "datetime", np.array([(v - EPOCH) // MICROSECOND for v in values], dtype=np.int64), None
+    codes = {}
+    data = np.array([codes.setdefault(v, len(codes)) for v in values], dtype=np.int32)
+    return "category", data, list(codes)
+
+
+class _Column:
+    """One column of a `ColumnarDataset`."""
+
+    def __init__(self, values):
+        self.kind, self.data, self.categories = _encode(values)
+
+    @property
+    def nbytes(self):
+        if self.categories is None:
+            return self.data.nbytes
+        return self.data.nbytes + sum(8 + sys.getsizeof(c) for c in self.categories)
+
+    def decoder(self):
+        """Return a function that decodes the value of row `i`."""
+        item = self.data.item
+        if self.kind == "datetime":
+            return lambda i: EPOCH + datetime.timedelta(microseconds=item(i))
+        if self.kind == "category":
+            categories = self.categories
+            return lambda i: categories[item(i)]
+        return item
+
+
+class RowView(Mapping):
+    """Read-only view of one row of a `ColumnarDataset`.
+
+    The view behaves like the feature dictionary of the row. Models that modify their features
+    have to copy them with `dict(x)` first.
+    """
+
+    __slots__ = ("_decoders", "_i")
+
+    def __init__(self, decoders, i):
+        self._decoders = decoders
+        self._i = i
+
+    def __getitem__(self, key):
+        return self._decoders[key](self._i)
+
+    def __iter__(self):
+        return iter(self._decoders)
+
+    def __len__(self):
+        return len(self._decoders)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnarDataset(base.Dataset):
+    """A dataset that is held in memory as typed columns.
+
+    Parameters
+    ----------
+    rows
+        Iterable of `(x, y)` pairs, e.g., a dataset. All rows must have the same features.
+    key
+        Cache key of the source of the rows, see `dataset_key`.
+    task
+        Type of task the dataset is meant for.
+    desc
+        Extra dataset parameters to pass as keyword arguments.
+
+    Examples
+    --------
+
+    >>> import datetime
+    >>> from spotRiver.data.columnar import ColumnarDataset
+
+    >>> rows = [({"day": datetime.datetime(2000, 1, d), "town": t}, float(d)) for d, t in [(1, "a"), (2, "b")]]
+    >>> dataset = ColumnarDataset(rows)
+    >>> for x, y in dataset:
+    ...     print(x, y)
+    {'day': datetime.datetime(2000, 1, 1, 0, 0), 'town': 'a'} 1.0
+    {'day': datetime.datetime(2000, 1, 2, 0, 0), 'town': 'b'} 2.0
+
+    >>> dataset.columns["day"].data.dtype, dataset.columns["town"].categories
+    (dtype('int64'), ['a', 'b'])
+
+    """
+
+    def __init__(self, rows, key=None, task=base.REG, **desc):
+        desc.setdefault("n_features", None)
+        super().__init__(task=task, **desc)
+        self.key = key
+        names = None
+        values = None
+        ys = []
+        for x, y in rows:
+            if names is None:
+                names = tuple(x)
+                values = [[] for _ in names]
+            if tuple(x) != names:
+                raise ValueError(f"All rows must have the features {names}, got {tuple(x)}.")
+            for column, v in zip(values, x.values()):
+                column.append(v)
+            ys.append(y)
+        self.columns = {name: _Column(column) for name, column in zip(names or (), values or ())}
+        self.target = _Column(ys)
+        self._decoders = {name: column.decoder() for name, column in self.columns.items()}
+        self.n_samples = len(ys)
+        if self.n_features is None:
+            self.n_features = len(self.columns)
+
+    @property
+    def nbytes(self):
+        """Memory used by the columns."""
+        return sum(column.nbytes for column in self.columns.values()) + self.target.nbytes
+
+    def __iter__(self):
+        decoders = self._decoders
+        for i, y in enumerate(map(self.target.decoder(), range(self.n_samples))):
+            yield RowView(decoders, i), y
+
+    def __len__(self):
+        return self.n_samples
+
+
+class ColumnarFileMixin:
+    """Replay the rows of a file dataset from a `ColumnarDataset`.
+
+    Subclasses parse their file in `_iter_rows` and set `columnar`. If `columnar` is `True`, the
+    file is parsed on the first pass and later passes are replayed from the columns. The columns
+    are rebuilt if the file or the parsing options change.
+    """
+
+    columnar = False
+    _columns = None
+
+    def _iter_rows(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        if not self.columnar:
+            return self._iter_rows()
+        from .materialize import dataset_key
+
+        key = dataset_key(self)
+        if self._columns is None or self._columns.key != key:
+            self._columns = ColumnarDataset(self._iter_rows(), key=key, task=self.task, n_features=self.n_features)
+        return iter(self._columns)
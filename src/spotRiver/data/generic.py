@@ -1,9 +1,13 @@
 from river import stream
 
 from . import base
+from .columnar import ColumnarFileMixin
+from .line_index import LineReader, skip_sample
 
+SAMPLING = ("bernoulli", "skip")
 
-class GenericData(base.GenericFileDataset):
+
+class GenericData(ColumnarFileMixin, base.GenericFileDataset):
     """Generic File Data Class
 
     Args:
@@ -11,7 +15,7 @@ class GenericData(base.GenericFileDataset):
     """
 
     def __init__(self, filename, target, n_features, n_samples, converters, parse_dates, directory,
-                 task=base.REG, fraction=1.0):
+                 task=base.REG, fraction=1.0, columnar=False, seed=123, sampling="bernoulli", data_home=None):
         """Generic File Data
 
         Args:
@@ -23,7 +27,21 @@ class GenericData(base.GenericFileDataset):
             parse_dates (_type_): _description_
             directory:
             task (_type_, optional): _description_. Defaults to base.REG.
+            fraction (float, optional): fraction of the rows that are sampled. Defaults to 1.0.
+            columnar (bool, optional): whether to parse the file once and replay later passes from
+                typed columns, see `ColumnarDataset`. The rows are read-only views. Defaults to False.
+            seed (int, optional): seed of the sample of the rows. Defaults to 123.
+            sampling (str, optional): how the rows are sampled if `fraction` is smaller than 1.
+                "bernoulli" parses every row and draws a random number per row (`stream.iter_csv`).
+                "skip" draws the gaps between the sampled rows up front (`skip_sample`) and seeks to
+                the sampled rows with the line-offset index of the file (`line_offsets`), so only the
+                sampled rows are parsed. It requires an uncompressed file with one record per line.
+                The two modes select different rows. Defaults to "bernoulli".
+            data_home (str, optional): data home of the line-offset index of the file, see
+                `get_data_home`. Defaults to None, i.e., the default data home.
         """
+        if sampling not in SAMPLING:
+            raise ValueError(f"Unknown sampling {sampling!r}, expected one of {SAMPLING}.")
         super().__init__(
             filename=filename,
             n_features=n_features,
@@ -33,9 +51,25 @@ class GenericData(base.GenericFileDataset):
             converters=converters,
             parse_dates=parse_dates,
             directory=directory,
+            data_home=data_home,
         )
         self.fraction = fraction
+        self.columnar = columnar
+        self.seed = seed
+        self.sampling = sampling
+
+    @property
+    def sliceable(self):
+        """Whether the rows can be sliced, see `FileSlice`. Subsampled datasets cannot be sliced."""
+        return self.fraction >= 1
+
+    def _iter_csv(self, buffer):
+        return stream.iter_csv(buffer, target=self.target, converters=self.converters, parse_dates=self.parse_dates)
 
-    def __iter__(self):
+    def _iter_rows(self):
+        if self.sampling == "skip" and self.fraction < 1:
+            offsets = self.line_offsets()
+            rows = skip_sample(len(offsets) - 1, self.fraction, seed=self.seed)
+            return self._iter_csv(LineReader(self.path, offsets, rows))
         return stream.iter_csv(self.path, target=self.target, converters=self.converters, parse_dates=self.parse_dates,
-                               fraction=self.fraction, seed=123)
+                               fraction=self.fraction, seed=self.seed)
@@ -0,0 +1,149 @@
+"""Line offsets of text files.
+
+A line-offset index stores the byte offset of every line of a file, so that single lines can be
+read with a seek instead of parsing the lines before them. This requires one record per line,
+i.e., CSV files whose quoted fields do not contain line breaks.
+
+The index of a file can be stored, see `load_line_offsets`, so that it is built once per file
+and shared by processes.
+
+"""
+import hashlib
+import locale
+from pathlib import Path
+
+import numpy as np
+
+from spotRiver.utils.locking import FileLock, atomic_write, lock_path
+
+__all__ = ["line_offsets", "load_line_offsets", "skip_sample", "LineReader"]
+
+CHUNK_SIZE = 2**22
+# Number of gaps drawn at once by `skip_sample`. It is fixed, so that the sample of the first n
+# rows does not depend on the number of rows.
+SAMPLE_CHUNK = 4096
+
+
+def line_offsets(path, chunk_size=CHUNK_SIZE):
+    """Return the byte offsets of the lines of a file.
+
+    Args:
+        path (str or Path): text file.
+        chunk_size (int): number of bytes read at once.
+
+    Returns:
+        (np.ndarray): int64 offsets of the first byte of every line, in file order. A trailing
+            newline does not start a line.
+    """
+    starts = [np.zeros(1, dtype=np.int64)]
+    position = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n"))
+            starts.append(newlines.astype(np.int64) + position + 1)
+            position += len(chunk)
+    offsets = np.concatenate(starts)
+    return offsets[offsets < position]
+
+
+def load_line_offsets(path, index_dir):
+    """Return the line offsets of a file from a stored index, building the index on the first call.
+
+    The index is stored in `index_dir` under a name derived from the path, the size and the
+    modification time of the file, so it is rebuilt when the file changes. Concurrent callers
+    build the index once, see `FileLock`. The stored index is memory-mapped.
+
+    Args:
+        path (str or Path): text file.
+        index_dir (str or Path): directory of the stored indexes, e.g., in the data home.
+
+    Returns:
+        (np.ndarray): the line offsets, see `line_offsets`.
+    """
+    path = Path(path).absolute()
+    stat = path.stat()
+    digest = hashlib.sha256(repr((str(path), stat.st_size, stat.st_mtime_ns)).encode()).hexdigest()[:16]
+    index_path = Path(index_dir) / f"{path.name}.{digest}.npy"
+    if not index_path.is_file():
+        with FileLock(lock_path(index_path)):
+            if not index_path.is_file():
+                offsets = line_offsets(path)
+                with atomic_write(index_path) as f:
+                    np.save(f, offsets)
+    return np.load(index_path, mmap_mode="r")
+
+
+def skip_sample(n_rows, fraction, seed=None):
+    """Return the sorted indices of a Bernoulli sample of `range(n_rows)`.
+
+    Every row is selected with probability `fraction`. Instead of a random draw per row, the gaps
+    between selected rows are drawn from a geometric distribution, so the cost is proportional to
+    the sample size. The sample of the first rows does not depend on `n_rows`.
+
+    Args:
+        n_rows (int): number of rows.
+        fraction (float): selection probability, between 0 and 1.
+        seed (int): seed of the random number generator.
+
+    Returns:
+        (np.ndarray): int64 row indices.
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError(f"fraction must be in (0, 1], got {fraction}.")
+    if fraction == 1:
+        return np.arange(n_rows, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    chunks = []
+    last = -1
+    while last < n_rows - 1:
+        rows = last + np.cumsum(rng.geometric(fraction, size=SAMPLE_CHUNK))
+        chunks.append(rows)
+        last = rows[-1]
+    rows = np.concatenate(chunks)
+    return rows[rows < n_rows]
+
+
+class LineReader:
+    """Text buffer that reads the header and selected lines of a file.
+
+    The buffer can be passed to `stream.iter_csv` in place of the file, which then parses only the
+    selected rows.
+
+    Args:
+        path (str or Path): text file.
+        offsets (np.ndarray): byte offsets of the lines, see `line_offsets`.
+        rows (iterable): indices of the lines to read, excluding the header. Row `i` is line `i + 1`.
+            A `range` with step 1 is read sequentially after one seek.
+        encoding (str): encoding of the file. Defaults to the encoding of `open`.
+    """
+
+    def __init__(self, path, offsets, rows, encoding=None):
+        self.path = path
+        self.offsets = offsets
+        self.rows = rows
+        self.encoding = encoding or locale.getpreferredencoding(False)
+
+    def __iter__(self):
+        offsets = self.offsets
+        rows = self.rows
+        with open(self.path, "rb") as f:
+            yield f.readline().decode(self.encoding)
+            if isinstance(rows, range) and rows.step == 1:
+                # Contiguous rows are read with a single seek.
+                if len(rows):
+                    f.seek(offsets[rows.start + 1])
+                for _ in rows:
+                    yield f.readline().decode(self.encoding)
+                return
+            for i in rows:
+                f.seek(offsets[i + 1])
+                yield f.readline().decode(self.encoding)
+
+    def read(self):
+        return "".join(self)
+
+    def close(self):
+        pass
@@ -0,0 +1,280 @@
+"""Materialized datasets.
+
+Parsing a CSV file with `stream.iter_csv` is expensive compared to most online models. Objective
+functions evaluate many candidates on the same dataset, so the dataset is parsed once into a
+compact in-memory form and replayed to every candidate.
+
+"""
+import collections
+import hashlib
+import sys
+
+from . import base
+from .array import ArrayDataset
+from .columnar import ColumnarDataset
+
+__all__ = [
+    "MaterializedDataset",
+    "DatasetCache",
+    "DATASET_CACHE",
+    "dataset_key",
+    "dataset_fingerprint",
+    "materialize",
+]
+
+
+def _hash_code(code, h):
+    h.update(code.co_code)
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            _hash_code(const, h)
+        else:
+            h.update(repr(const).encode())
+    h.update(repr(code.co_names).encode())
+
+
+def _callable_key(f):
+    """Return the key of a converter.
+
+    Functions are also identified by their code, defaults and closure, so that lambdas and local
+    functions with the same name are told apart.
+    """
+    name = f"{getattr(f, '__module__', '')}.{getattr(f, '__qualname__', repr(f))}"
+    code = getattr(f, "__code__", None)
+    if code is None:
+        return name
+    h = hashlib.sha256()
+    _hash_code(code, h)
+    closure = tuple(cell.cell_contents for cell in getattr(f, "__closure__", None) or ())
+    h.update(repr((getattr(f, "__defaults__", None), getattr(f, "__kwdefaults__", None), closure)).encode())
+    return f"{name}:{h.hexdigest()}"
+
+
+def _dict_key(d, value_key=repr):
+    if d is None:
+        return None
+    return tuple(sorted((k, value_key(v)) for k, v in d.items()))
+
+
+def dataset_key(dataset):
+    """Return the cache key of a dataset.
+
+    The key consists of the dataset class, the path and the modification time of the file and
+    the parsing options (target, converters, parse_dates, fraction, seed and sampling).
+
+    Args:
+        dataset (base.Dataset): dataset.
+
+    Returns:
+        (tuple): the key, or `None` if the dataset is not stored in a file and cannot be cached.
+    """
+    if not isinstance(dataset, (base.FileDataset, base.GenericFileDataset)):
+        return None
+    path = dataset.path
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (
+        f"{type(dataset).__module__}.{type(dataset).__qualname__}",
+        str(path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        repr(getattr(dataset, "target", None)),
+        _dict_key(getattr(dataset, "converters", None), _callable_key),
+        _dict_key(getattr(dataset, "parse_dates", None)),
+        getattr(dataset, "fraction", None),
+        getattr(dataset, "seed", None),
+        getattr(dataset, "sampling", None),
+    )
+
+
+def _sizeof(x, y):
+    n = sys.getsizeof(x) + sys.getsizeof(y)
+    for v in x.values() if isinstance(x, dict) else x:
+        n += sys.getsizeof(v)
+    return n
+
+
+class MaterializedDataset(base.Dataset):
+    """A dataset that is held in memory.
+
+    Rows that share the feature names of the first row are stored as tuples of values, other rows
+    are stored as dictionaries. Iterating over the dataset yields a fresh feature dictionary per
+    row, so models may modify the features without corrupting the stored data.
+
+    Parameters
+    ----------
+    dataset
+        The dataset to materialize.
+    max_bytes
+        If the estimated size of the materialized data exceeds `max_bytes`, materialization is
+        aborted and a `MemoryError` is raised.
+
+    """
+
+    def __init__(self, dataset, max_bytes=None):
+        super().__init__(
+            task=getattr(dataset, "task", None),
+            n_features=getattr(dataset, "n_features", None),
+            n_classes=getattr(dataset, "n_classes", None),
+            n_outputs=getattr(dataset, "n_outputs", None),
+            sparse=getattr(dataset, "sparse", False),
+        )
+        self.key = dataset_key(dataset)
+        self.keys = None
+        self.rows = []
+        self.nbytes = 0
+        for x, y in dataset:
+            if self.keys is None:
+                self.keys = tuple(x)
+            if tuple(x) == self.keys:
+                values = tuple(x.values())
+                self.rows.append((values, y, False))
+                self.nbytes += _sizeof(values, y)
+            else:
+                self.rows.append((dict(x), y, True))
+                self.nbytes += _sizeof(x, y)
+            if max_bytes is not None and self.nbytes > max_bytes:
+                raise MemoryError(f"Materialized dataset exceeds {max_bytes} bytes.")
+        self.n_samples = len(self.rows)
+
+    def __iter__(self):
+        keys = self.keys
+        for x, y, is_dict in self.rows:
+            yield (dict(x) if is_dict else dict(zip(keys, x))), y
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class DatasetCache:
+    """Least recently used cache of materialized datasets.
+
+    Args:
+        max_bytes (int): upper bound of the estimated memory used by all cached datasets.
+            Datasets that are larger than `max_bytes` are not cached.
+    """
+
+    def __init__(self, max_bytes=2**30):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        # Keys of datasets that exceeded `max_bytes`. They are not parsed again.
+        self._oversized = set()
+
+    @property
+    def nbytes(self):
+        """Estimated memory used by the cached datasets."""
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def clear(self):
+        """Remove all datasets from the cache and forget the datasets that did not fit."""
+        self._entries.clear()
+        self._oversized.clear()
+
+    def get(self, dataset):
+        """Return the materialized version of `dataset`.
+
+        The dataset is parsed on the first call and replayed from memory afterwards. Lists,
+        tuples, materialized datasets and datasets that cannot be keyed (e.g., synthetic
+        datasets) are returned unchanged. So are datasets that do not fit into the cache. Parsing
+        stops as soon as a dataset exceeds `max_bytes`, and its key is remembered, so that it is
+        only tried once.
+
+        Columnar datasets and file datasets with a columnar store are returned unchanged, too.
+
+        Args:
+            dataset (base.Dataset): dataset.
+
+        Returns:
+            dataset: materialized dataset or `dataset` itself.
+        """
+        if isinstance(dataset, (list, tuple, MaterializedDataset, ColumnarDataset)):
+            return dataset
+        if getattr(dataset, "columnar", False):
+            return dataset
+        key = dataset_key(dataset)
+        if key is None or key in self._oversized:
+            return dataset
+        try:
+            return self.get_or_build(key, lambda: MaterializedDataset(dataset, max_bytes=self.max_bytes))
+        except MemoryError:
+            self._oversized.add(key)
+            return dataset
+
+    def get_or_build(self, key, build):
+        """Return the entry `key`, building it with `build()` on the first call.
+
+        Entries must have an `nbytes` attribute. An entry that is larger than `max_bytes` is
+        returned, but not kept.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        entry = build()
+        self._entries[key] = entry
+        while self.nbytes > self.max_bytes:
+            self._entries.popitem(last=False)
+        return entry
+
+
+def dataset_fingerprint(dataset):
+    """Return a fingerprint that identifies the contents of a dataset.
+
+    File based datasets are identified by `dataset_key`, lists and tuples by a hash of their rows,
+    array and columnar datasets by a hash of their arrays and synthetic datasets by their class and
+    parameters.
+
+    Args:
+        dataset: dataset.
+
+    Returns:
+        (str): the fingerprint, or `None` if the dataset cannot be identified.
+    """
+    key = dataset.key if isinstance(dataset, (MaterializedDataset, ColumnarDataset)) else dataset_key(dataset)
+    if key is not None:
+        return repr(key)
+    if isinstance(dataset, ColumnarDataset):
+        h = hashlib.sha256()
+        for name, column in [*dataset.columns.items(), (None, dataset.target)]:
+            h.update(repr((name, column.kind, column.categories)).encode())
+            h.update(column.data.tobytes())
+        return h.hexdigest()
+    if isinstance(dataset, (list, tuple, MaterializedDataset)):
+        h = hashlib.sha256()
+        for row in dataset:
+            h.update(repr(row).encode())
+        return h.hexdigest()
+    if isinstance(dataset, ArrayDataset):
+        h = hashlib.sha256(repr(dataset.feature_names).encode())
+        h.update(dataset.X.tobytes())
+        h.update(dataset.y.tobytes())
+        return h.hexdigest()
+    if hasattr(dataset, "_get_params"):
+        return repr((f"{type(dataset).__module__}.{type(dataset).__qualname__}", sorted(dataset._get_params().items())))
+    return None
+
+
+# Cache shared by all objective function evaluations of a process.
+DATASET_CACHE = DatasetCache()
+
+
+def materialize(dataset, cache=None):
+    """Return the materialized version of `dataset`.
+
+    Args:
+        dataset (base.Dataset): dataset.
+        cache (DatasetCache): cache to use. Defaults to `DATASET_CACHE`.
+
+    Returns:
+        dataset: materialized dataset or `dataset` itself, see `DatasetCache.get`.
+    """
+    if cache is None:
+        cache = DATASET_CACHE
+    return cache.get(dataset)
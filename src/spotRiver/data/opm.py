@@ -8,16 +8,23 @@ The data contains 985,862 observations of up to 14 variables.
 """
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
+import hashlib
+import importlib.util
+import json
 import logging
+import pickle
+import tempfile
 import numpy as np
 import pandas as pd
 
 from pathlib import Path
 from sklearn.utils import Bunch
-from typing import Union, Tuple
+from typing import Iterator, Union, Tuple
 from urllib.request import urlretrieve
 
+from river import stream
 from spotRiver.data.base import get_data_home
+from spotRiver.utils.locking import FileLock, atomic_path, atomic_write, lock_path
 
 logger = logging.Logger(__name__)
 
@@ -37,47 +44,100 @@ OPM_DTYPE = {
     "Serial Number": np.dtype("int64"),
     "Town": np.dtype("O"),
 }
+OPM_FILENAME = "opm_2001-2020.csv"
+OPM_NUMERIC_COLUMNS = ["List Year", "Assessed Value", "Sale Amount", "Sales Ratio", "lat", "lon", "timestamp_rec"]
+OPM_CATEGORICAL_COLUMNS = [
+    "Town",
+    "Address",
+    "Property Type",
+    "Residential Type",
+    "Non Use Code",
+    "Assessor Remarks",
+    "OPM remarks",
+]
+# Bump this whenever the post-processing in `fetch_opm` changes to invalidate cached frames.
+OPM_CACHE_VERSION = 1
+OPM_TARGET_COLUMN = "_target"
 
 
-def fetch_opm(
-    *,
-    data_home: Union[str, Path] = None,
-    download_if_missing: bool = True,
-    return_X_y: bool = False,
-    include_numeric: bool = True,
-    include_categorical: bool = False,
-) -> Union[Tuple[pd.DataFrame, pd.Series], pd.DataFrame, Bunch]:
-    """Load the Office of Planning and Managment dataset (regression).
-    Parameters
-    ----------
-    data_home : str or Path, default=None
-        Specify another download and cache folder for the dataset.
-    download_if_missing : bool, default=True
-        If False, raise an IOError if the data is not locally available
-        instead of trying to download the data from the source site.
-    return_X_y : bool, default=False
-        If True, returns ``(data.data, data.target)`` instead of a
-        :class:`~sklearn.utils.Bunch`.
+def _file_digest(filename: Path) -> str:
+    """Return the SHA-256 digest of `filename`.
 
-    Returns
-    -------
-    dataset : :class:`~sklearn.utils.Bunch`
-        Dictionary-like object, with the following attributes.
-        data : DataFrame
-        target : Series
-    (data, target) : tuple if ``return_X_y`` is True
-        A tuple of a pandas DataFrame (the data) and a pandas Series (target).
+    The digest is stored next to the file together with the size and modification time of the
+    file, so that it is only recomputed if the file changes.
     """
-    filename = get_data_home(data_home=data_home) / "opm_2001-2020.csv"
+    stat = filename.stat()
+    sidecar = filename.with_name(filename.name + ".sha256")
+    try:
+        with open(sidecar) as f:
+            meta = json.load(f)
+        if meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns:
+            return meta["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            h.update(block)
+    meta = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": h.hexdigest()}
+    with atomic_write(sidecar, "w") as f:
+        json.dump(meta, f)
+    return meta["sha256"]
+
+
+def _cache_format() -> str:
+    """Use Parquet if `pyarrow` is available and fall back to pickle otherwise."""
+    if importlib.util.find_spec("pyarrow") is not None:
+        return "parquet"
+    return "pickle"
+
+
+def _opm_cache_path(data_home: Path, digest: str, include_numeric: bool, include_categorical: bool) -> Path:
+    name = f"opm_v{OPM_CACHE_VERSION}_{digest[:16]}_num{int(include_numeric)}_cat{int(include_categorical)}"
+    return data_home / "opm_cache" / f"{name}.{_cache_format()}"
+
+
+def _read_opm_cache(path: Path) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def _write_opm_cache(df: pd.DataFrame, path: Path) -> None:
+    with atomic_path(path) as tmp:
+        if path.suffix == ".parquet":
+            df.to_parquet(tmp)
+        else:
+            df.to_pickle(tmp)
+
+
+def _opm_columns(include_numeric: bool, include_categorical: bool) -> list:
+    cols = []
+    if include_numeric:
+        cols.extend(OPM_NUMERIC_COLUMNS)
+    if include_categorical:
+        cols.extend(OPM_CATEGORICAL_COLUMNS)
+    if len(cols) == 0:
+        raise Exception("No columns selected. Did you set both `include_numeric` and `include_categorical` to False?")
+    return cols
+
+
+def _opm_filename(data_home: Path, download_if_missing: bool) -> Path:
+    filename = data_home / OPM_FILENAME
     if not filename.is_file():
         if not download_if_missing:
             raise IOError("Data not found and `download_if_missing` is False")
-        logger.info(f"Downloading OPM dataset to '{filename}'.")
-        urlretrieve(url=OPM_URL, filename=filename)
+        # Only one process downloads the file, the others wait and reuse it.
+        with FileLock(lock_path(filename)):
+            if not filename.is_file():
+                logger.info(f"Downloading OPM dataset to '{filename}'.")
+                with atomic_path(filename) as tmp:
+                    urlretrieve(url=OPM_URL, filename=tmp)
     # FIXME: Add hash check for download.
+    return filename
 
-    df = pd.read_csv(filename, dtype=OPM_DTYPE, parse_dates=["Date Recorded"])
 
+def _filter_opm(df: pd.DataFrame) -> pd.DataFrame:
     # Collect rows (observations) we want to keep and subset only once.
     #
     # This might look kind of ugly but is much more efficient than making copy
@@ -90,12 +150,17 @@ def fetch_opm(
         & (df["Sale Amount"] <= 2e8)
     )
     logger.debug(f"Removing {len(idx) - idx.sum()} rows for constraint violations.")
+    return df.loc[idx]
 
-    # Now keep only those rows which we selected with `idx`, sort the values by
-    # the date on which they were recorded and then reset the index.
-    df = df.loc[idx].sort_values(by="Date Recorded").reset_index(drop=True)
 
-    cols = []
+def _derive_opm_features(
+    df: pd.DataFrame, include_numeric: bool, include_categorical: bool, categorize: bool = True
+) -> None:
+    """Derive the features of the OPM dataset in place.
+
+    All derivations are row-wise, except for the conversion of categorical columns with less than
+    200 unique values to "category", which is skipped if `categorize` is False.
+    """
     if include_numeric:
         # Extract latitude and longitude from Location field.
         # Converting to float32 looses precision.
@@ -122,40 +187,255 @@ def fetch_opm(
         # Converting `Assessed Value` to int32/float32 changes 175/222 values
         # df["Sale Amount"] = df["Sale Amount"].astype("int32")
 
-        cols.extend(["List Year", "Assessed Value", "Sale Amount", "Sales Ratio", "lat", "lon", "timestamp_rec"])
-
     # FIXME: We probably want to invest some time into deriving more meaninfgul
     # categorical variables from some of these. Especially the remarks columns
     # would benefit from a BoW approach and the Address column really carries very
     # little information.
     if include_categorical:
-        categorical_columns = [
-            "Town",
-            "Address",
-            "Property Type",
-            "Residential Type",
-            "Non Use Code",
-            "Assessor Remarks",
-            "OPM remarks",
-        ]
-        cols.extend(categorical_columns)
-
-        for cat_col in categorical_columns:
+        for cat_col in OPM_CATEGORICAL_COLUMNS:
             df[cat_col] = df[cat_col].fillna("Unknown")
             # If there less than 200 unique values, convert to "category"
             # instead of storing as a string to save space.
-            if df[cat_col].nunique() < 200:
+            if categorize and df[cat_col].nunique() < 200:
                 df[cat_col] = df[cat_col].astype("category")
 
-    if len(cols) == 0:
-        raise Exception("No columns selected. Did you set both `include_numeric` and `include_categorical` to False?")
 
-    X = df[cols]
-    y = df["Sale Amount"]
+def fetch_opm(
+    *,
+    data_home: Union[str, Path] = None,
+    download_if_missing: bool = True,
+    return_X_y: bool = False,
+    include_numeric: bool = True,
+    include_categorical: bool = False,
+    use_cache: bool = True,
+) -> Union[Tuple[pd.DataFrame, pd.Series], pd.DataFrame, Bunch]:
+    """Load the Office of Planning and Managment dataset (regression).
+    Parameters
+    ----------
+    data_home : str or Path, default=None
+        Specify another download and cache folder for the dataset.
+    download_if_missing : bool, default=True
+        If False, raise an IOError if the data is not locally available
+        instead of trying to download the data from the source site.
+    return_X_y : bool, default=False
+        If True, returns ``(data.data, data.target)`` instead of a
+        :class:`~sklearn.utils.Bunch`.
+    include_numeric : bool, default=True
+        If True, include the numeric features.
+    include_categorical : bool, default=False
+        If True, include the categorical features.
+    use_cache : bool, default=True
+        If True, the processed data is stored in a binary cache under
+        ``data_home/opm_cache`` (Parquet if ``pyarrow`` is installed, pickle
+        otherwise) and loaded from there on subsequent calls. The cache is
+        keyed by the SHA-256 digest of the CSV file and the ``include_*``
+        options.
+
+    Returns
+    -------
+    dataset : :class:`~sklearn.utils.Bunch`
+        Dictionary-like object, with the following attributes.
+        data : DataFrame
+        target : Series
+    (data, target) : tuple if ``return_X_y`` is True
+        A tuple of a pandas DataFrame (the data) and a pandas Series (target).
+    """
+    data_home = get_data_home(data_home=data_home)
+    filename = _opm_filename(data_home, download_if_missing)
+    cols = _opm_columns(include_numeric, include_categorical)
+    if not use_cache:
+        X, y = _build_opm(filename, include_numeric, include_categorical, cols)
+    else:
+        cache_path = _opm_cache_path(data_home, _file_digest(filename), include_numeric, include_categorical)
+        X = None
+        if not cache_path.is_file():
+            # Only one process builds the cache entry, the others wait and read it.
+            with FileLock(lock_path(cache_path)):
+                if not cache_path.is_file():
+                    X, y = _build_opm(filename, include_numeric, include_categorical, cols)
+                    _write_opm_cache(X.assign(**{OPM_TARGET_COLUMN: y}), cache_path)
+        if X is None:
+            df = _read_opm_cache(cache_path)
+            X = df[cols]
+            y = df[OPM_TARGET_COLUMN].rename("Sale Amount")
 
     if return_X_y:
         return (X, y)
     return Bunch(data=X, target=y)
 
 
-__all__ = ["fetch_opm"]
+def _build_opm(filename: Path, include_numeric: bool, include_categorical: bool, cols: list):
+    """Read the OPM CSV file and return the features and the target."""
+    df = pd.read_csv(filename, dtype=OPM_DTYPE, parse_dates=["Date Recorded"])
+
+    # Now keep only the valid rows, sort the values by the date on which they
+    # were recorded and then reset the index.
+    df = _filter_opm(df).sort_values(by="Date Recorded").reset_index(drop=True)
+    _derive_opm_features(df, include_numeric, include_categorical)
+    return df[cols], df["Sale Amount"]
+
+
+def _read_opm_chunks(filename: Path, chunksize: int, include_numeric: bool, include_categorical: bool, cols: list):
+    """Read, filter and derive the features of the OPM CSV file chunk by chunk."""
+    keep = list(dict.fromkeys(cols + ["Date Recorded", "Sale Amount"]))
+    for chunk in pd.read_csv(filename, dtype=OPM_DTYPE, parse_dates=["Date Recorded"], chunksize=chunksize):
+        chunk = _filter_opm(chunk).reset_index(drop=True)
+        if len(chunk) == 0:
+            continue
+        _derive_opm_features(chunk, include_numeric, include_categorical, categorize=False)
+        yield chunk[keep]
+
+
+def _write_run(chunk: pd.DataFrame, path: Path, block_size: int) -> None:
+    """Write a sorted chunk to `path` as a sequence of pickled blocks of `block_size` rows."""
+    with open(path, "wb") as f:
+        for start in range(0, len(chunk), block_size):
+            pickle.dump(chunk.iloc[start : start + block_size], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _iter_run(path: Path) -> Iterator[pd.DataFrame]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _merge_runs(paths: list, key: str) -> Iterator[pd.DataFrame]:
+    """Merge sorted runs block by block.
+
+    Only the current block of every run is held in memory. Rows are ordered by their key, the
+    index of their run and their position in the run, so rows with the same key keep the order of
+    the runs. In each round, the run whose current block ends with the smallest row determines the
+    frontier. Its block and all smaller rows of the other blocks are emitted, which keeps the
+    output sorted.
+    """
+    runs = [_iter_run(path) for path in paths]
+    heads = [next(run, None) for run in runs]
+    while True:
+        alive = [i for i, head in enumerate(heads) if head is not None]
+        if not alive:
+            return
+        i_min = min(alive, key=lambda i: (heads[i][key].iloc[-1], i))
+        frontier = heads[i_min][key].iloc[-1]
+        parts = []
+        for i in alive:
+            if i == i_min:
+                parts.append(heads[i])
+                heads[i] = next(runs[i], None)
+                continue
+            keys = heads[i][key]
+            below = ((keys < frontier) | ((keys == frontier) & (i < i_min))).to_numpy()
+            if below.any():
+                parts.append(heads[i][below])
+                heads[i] = heads[i][~below] if not below.all() else next(runs[i], None)
+        # The parts are in the order of the runs, so the stable sort keeps it for equal keys.
+        yield pd.concat(parts).sort_values(by=key, kind="mergesort")
+
+
+def _rechunk(frames: Iterator[pd.DataFrame], chunksize: int) -> Iterator[pd.DataFrame]:
+    buffer, n = [], 0
+    for frame in frames:
+        buffer.append(frame)
+        n += len(frame)
+        while n >= chunksize:
+            df = pd.concat(buffer)
+            yield df.iloc[:chunksize]
+            buffer, n = [df.iloc[chunksize:]], n - chunksize
+    if n > 0:
+        yield pd.concat(buffer)
+
+
+def iter_opm(
+    *,
+    data_home: Union[str, Path] = None,
+    download_if_missing: bool = True,
+    include_numeric: bool = True,
+    include_categorical: bool = False,
+    chunksize: int = 100_000,
+    return_frames: bool = False,
+    presorted: bool = False,
+    tmp_dir: Union[str, Path] = None,
+) -> Iterator:
+    """Stream the Office of Planning and Managment dataset (regression).
+
+    This is the bounded-memory counterpart of `fetch_opm`. The CSV file is read
+    in chunks of `chunksize` rows and the same filters and feature derivations
+    are applied to each chunk. Unless `presorted` is True, the chunks are sorted
+    by ``Date Recorded`` with an external merge sort: every chunk is sorted and
+    written to a temporary file, and the files are merged block by block. Peak
+    memory is therefore proportional to `chunksize` and not to the size of the
+    data set.
+
+    In contrast to `fetch_opm`, categorical columns are not converted to
+    "category" (this would need the number of unique values of the whole
+    column) and rows recorded on the same date keep their file order.
+
+    Parameters
+    ----------
+    data_home : str or Path, default=None
+        Specify another download and cache folder for the dataset.
+    download_if_missing : bool, default=True
+        If False, raise an IOError if the data is not locally available
+        instead of trying to download the data from the source site.
+    include_numeric : bool, default=True
+        If True, include the numeric features.
+    include_categorical : bool, default=False
+        If True, include the categorical features.
+    chunksize : int, default=100_000
+        Number of rows that are read, processed and yielded at once.
+    return_frames : bool, default=False
+        If True, yield ``(X, y)`` tuples of a DataFrame and a Series with at
+        most `chunksize` rows instead of river-style ``(x, y)`` pairs.
+    presorted : bool, default=False
+        If True, the file is assumed to be ordered by ``Date Recorded`` and the
+        chunks are yielded without sorting. A ValueError is raised if this is
+        not the case.
+    tmp_dir : str or Path, default=None
+        Directory for the temporary files of the external sort.
+
+    Yields
+    ------
+    (x, y) : dict and float for every row, or
+    (X, y) : DataFrame and Series if ``return_frames`` is True.
+    """
+    data_home = get_data_home(data_home=data_home)
+    filename = _opm_filename(data_home, download_if_missing)
+    cols = _opm_columns(include_numeric, include_categorical)
+    chunks = _read_opm_chunks(filename, chunksize, include_numeric, include_categorical, cols)
+
+    def split(frames):
+        for df in frames:
+            df = df.reset_index(drop=True)
+            X, y = df[cols], df["Sale Amount"]
+            if return_frames:
+                yield X, y
+            else:
+                yield from stream.iter_pandas(X, y)
+
+    if presorted:
+
+        def check(frames):
+            last = None
+            for df in frames:
+                dates = df["Date Recorded"]
+                if not dates.is_monotonic_increasing or (last is not None and dates.iloc[0] < last):
+                    raise ValueError("OPM data is not sorted by `Date Recorded`. Use `presorted=False`.")
+                last = dates.iloc[-1]
+                yield df
+
+        yield from split(check(chunks))
+        return
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        block_size = max(1, chunksize // 32)
+        paths = []
+        for i, chunk in enumerate(chunks):
+            path = Path(tmp) / f"run_{i}.pkl"
+            _write_run(chunk.sort_values(by="Date Recorded", kind="mergesort"), path, block_size)
+            paths.append(path)
+        yield from split(_rechunk(_merge_runs(paths, "Date Recorded"), chunksize))
+
+
+__all__ = ["fetch_opm", "iter_opm"]
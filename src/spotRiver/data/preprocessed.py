@@ -0,0 +1,233 @@
+"""Preprocessed datasets.
+
+The candidates of a tuning run often share their preprocessing, e.g., the scaler and the feature
+hasher of `fun_HTR_iter_progressive` do not depend on the hyperparameters of the tree. The shared
+preprocessing is run once per dataset in the progressive order, and the transformed features are
+replayed to the final step of every candidate.
+
+"""
+from array import array
+from numbers import Number
+
+from river import compose
+from river.base import Regressor, Wrapper
+
+from . import base
+from .materialize import DatasetCache, dataset_fingerprint
+
+__all__ = [
+    "Features",
+    "PreprocessedDataset",
+    "Preprocessed",
+    "PREPROCESSED_CACHE",
+    "preprocess",
+]
+
+
+class Features:
+    """Transformed features of one sample.
+
+    The unsupervised transformers of a pipeline are updated between the prediction and the update
+    of the final step, so the final step sees different features in `predict_one` and `learn_one`.
+
+    Parameters
+    ----------
+    predict
+        Features passed to `predict_one`.
+    learn
+        Features passed to `learn_one`.
+
+    """
+
+    __slots__ = ("predict", "learn")
+
+    def __init__(self, predict, learn):
+        self.predict = predict
+        self.learn = learn
+
+    def __repr__(self):
+        return f"Features(predict={self.predict!r}, learn={self.learn!r})"
+
+
+class _Recorder(Regressor):
+    """Final step of a pipeline that records the features it receives."""
+
+    def __init__(self):
+        self.predicted = None
+        self.learned = None
+
+    def predict_one(self, x):
+        self.predicted = x
+        return 0.0
+
+    def learn_one(self, x, y):
+        self.learned = x
+        return self
+
+
+class _SparseRows:
+    """Feature dictionaries stored in compressed sparse row format.
+
+    Every feature name is stored once. A row consists of the column indices and the values of its
+    features in their original order, so the rebuilt dictionaries have the original key order.
+    """
+
+    def __init__(self):
+        self.columns = {}
+        self.names = []
+        self.indptr = array("q", [0])
+        self.indices = array("i")
+        self.values = array("d")
+
+    def append(self, x):
+        columns = self.columns
+        for k, v in x.items():
+            i = columns.get(k)
+            if i is None:
+                i = columns[k] = len(self.names)
+                self.names.append(k)
+            if not isinstance(v, Number):
+                raise TypeError(f"Sparse storage requires numeric features, got {k!r}: {v!r}.")
+            self.indices.append(i)
+            self.values.append(v)
+        self.indptr.append(len(self.indices))
+
+    def __getitem__(self, i):
+        a, b = self.indptr[i], self.indptr[i + 1]
+        return dict(zip(map(self.names.__getitem__, self.indices[a:b]), self.values[a:b]))
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.indptr, self.indices, self.values))
+
+
+class PreprocessedDataset(base.Dataset):
+    """A dataset whose features are transformed by a preprocessor in the progressive order.
+
+    For every sample, the preprocessor is applied as the first steps of a pipeline would apply it
+    during a progressive evaluation: the features for the prediction are computed before the
+    features for the update. Iterating over the dataset yields a `Features` object per sample,
+    which is consumed by a `Preprocessed` model.
+
+    Parameters
+    ----------
+    dataset
+        The dataset to transform.
+    preprocessor
+        Transformer, union of transformers or pipeline of transformers. It is cloned, so the
+        passed preprocessor is not modified.
+    sparse
+        Whether to store the features in compressed sparse row format instead of dictionaries.
+        This needs much less memory for hashed features, but requires numeric features.
+
+    Examples
+    --------
+
+    >>> from river import preprocessing
+    >>> from spotRiver.data.preprocessed import Preprocessed, PreprocessedDataset
+
+    >>> dataset = PreprocessedDataset([({"a": 1.0}, 1.0), ({"a": 3.0}, 2.0)], preprocessing.StandardScaler())
+    >>> for x, y in dataset:
+    ...     print(x.predict, x.learn, y)
+    {'a': 0.0} {'a': 0.0} 1.0
+    {'a': 1.0} {'a': 1.0} 2.0
+
+    """
+
+    def __init__(self, dataset, preprocessor, sparse=True):
+        super().__init__(
+            task=getattr(dataset, "task", base.REG),
+            n_features=getattr(dataset, "n_features", None),
+            n_classes=getattr(dataset, "n_classes", None),
+            n_outputs=getattr(dataset, "n_outputs", None),
+            sparse=sparse,
+        )
+        recorder = _Recorder()
+        pipeline = compose.Pipeline(preprocessor.clone(), recorder)
+        if sparse:
+            self.predict_rows, self.learn_rows = _SparseRows(), _SparseRows()
+        else:
+            self.predict_rows, self.learn_rows = [], []
+        self.ys = []
+        for x, y in dataset:
+            pipeline.predict_one(x)
+            pipeline.learn_one(x, y)
+            self.predict_rows.append(recorder.predicted)
+            self.learn_rows.append(recorder.learned)
+            self.ys.append(y)
+        self.n_samples = len(self.ys)
+
+    @property
+    def nbytes(self):
+        """Estimated memory used by the stored features, see `DatasetCache`."""
+        if self.sparse:
+            return self.predict_rows.nbytes + self.learn_rows.nbytes + 8 * len(self.ys)
+        # Rough estimate of two dictionaries per sample.
+        return sum(64 + 100 * (len(p) + len(q)) for p, q in zip(self.predict_rows, self.learn_rows))
+
+    def __iter__(self):
+        predict_rows, learn_rows = self.predict_rows, self.learn_rows
+        # The sparse rows are rebuilt as fresh dictionaries, the stored dictionaries are copied.
+        copy = (lambda x: x) if self.sparse else dict
+        for i, y in enumerate(self.ys):
+            yield Features(copy(predict_rows[i]), copy(learn_rows[i])), y
+
+    def __len__(self):
+        return self.n_samples
+
+
+class Preprocessed(Wrapper, Regressor):
+    """Regressor that is fed with the `Features` of a `PreprocessedDataset`.
+
+    `Preprocessed(model)` on `PreprocessedDataset(dataset, preprocessor)` gives the same predictions
+    as the pipeline `preprocessor | model` on `dataset`.
+
+    Parameters
+    ----------
+    regressor
+        The final step of the pipeline.
+
+    """
+
+    def __init__(self, regressor):
+        self.regressor = regressor
+
+    @property
+    def _wrapped_model(self):
+        return self.regressor
+
+    def predict_one(self, x):
+        return self.regressor.predict_one(x.predict)
+
+    def learn_one(self, x, y):
+        self.regressor.learn_one(x.learn, y)
+        return self
+
+
+# Cache shared by all objective function evaluations of a process.
+PREPROCESSED_CACHE = DatasetCache()
+
+
+def preprocess(dataset, preprocessor, sparse=True, cache=None, fingerprint=None):
+    """Return the `PreprocessedDataset` of `dataset`, transformed once per process.
+
+    Args:
+        dataset: dataset.
+        preprocessor (base.Transformer): preprocessor, see `PreprocessedDataset`.
+        sparse (bool): whether to use the sparse storage, see `PreprocessedDataset`.
+        cache (DatasetCache): cache to use. Defaults to `PREPROCESSED_CACHE`.
+        fingerprint (str): `dataset_fingerprint` of the dataset, if the caller already knows it.
+            Computing it hashes every row of in-memory datasets.
+
+    Returns:
+        (PreprocessedDataset): the transformed dataset. It is not cached if the dataset has no
+            fingerprint, see `dataset_fingerprint`.
+    """
+    if cache is None:
+        cache = PREPROCESSED_CACHE
+    if fingerprint is None:
+        fingerprint = dataset_fingerprint(dataset)
+    if fingerprint is None:
+        return PreprocessedDataset(dataset, preprocessor, sparse=sparse)
+    key = (fingerprint, repr(preprocessor), sparse)
+    return cache.get_or_build(key, lambda: PreprocessedDataset(dataset, preprocessor, sparse=sparse))
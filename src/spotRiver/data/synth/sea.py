@@ -1,7 +1,11 @@
+import bisect
 import random
 
+import numpy as np
 from river import datasets
 
+THRESHOLDS = {0: 8, 1: 9, 2: 7, 3: 9.5}
+
 
 class SEA(datasets.base.SyntheticDataset):
     """SEA synthetic dataset.
@@ -20,6 +24,19 @@ class SEA(datasets.base.SyntheticDataset):
 
     * **Variant 3**: `True` if $att1 + att2 > 9.5$
 
+    Scheduled drift is described by `drift`, a dictionary that maps stream positions to variants:
+    `drift={1000: 1, 5000: 2}` uses `variant` for the first 1000 samples, variant 1 for the
+    samples 1000 to 4999 and variant 2 afterwards.
+
+    By default, the samples are drawn one by one from `random.Random(seed)`. If `block_size` is
+    set, features and noise flips are drawn in blocks of `block_size` samples with NumPy, which is
+    much faster for long streams. `iter_blocks` hands out the blocks as arrays. The seed contract
+    of the block mode is: the features are drawn from `np.random.default_rng(child_0)` and the
+    noise flips from `np.random.default_rng(child_1)`, where `child_0, child_1` are
+    `np.random.SeedSequence(seed).spawn(2)`. The stream of a given seed is therefore the same for
+    every `block_size` and does not depend on `noise` or `drift`, but it differs from the stream
+    of the default mode.
+
     Parameters
     ----------
     variant
@@ -28,6 +45,10 @@ class SEA(datasets.base.SyntheticDataset):
         Determines the amount of observations for which the target sign will be flipped.
     seed
         Random seed number used for reproducibility.
+    drift
+        Dictionary that maps stream positions to the variant used from that position on.
+    block_size
+        If set, samples are generated in NumPy blocks of this size.
 
     Examples
     --------
@@ -44,36 +65,103 @@ class SEA(datasets.base.SyntheticDataset):
     {0: 0.29797, 1: 2.18637, 2: 5.05355} False
     {0: 0.26535, 1: 1.98837, 2: 6.49884} False
 
+    >>> from spotRiver.data.synth import SEA
+
+    >>> dataset = SEA(variant=0, seed=42, drift={2: 3}, block_size=1000)
+
+    >>> for X, y in dataset.iter_blocks(n_samples=4, block_size=4):
+    ...     print(X.shape, y)
+    (4, 3) [ True  True  True  True]
+
     References
     ----------
     [^1]: [A Streaming Ensemble Algorithm (SEA) for Large-Scale Classification](http://citeseerx.ist.psu.edu/viewdoc/download?doi=10.1.1.482.3991&rep=rep1&type=pdf)
 
     """
 
-    def __init__(self, variant=0, noise=0.0, seed: int = None):
+    def __init__(self, variant=0, noise=0.0, seed: int = None, drift: dict = None, block_size: int = None):
 
         super().__init__(n_features=3, task=datasets.base.BINARY_CLF)
 
-        if variant not in (0, 1, 2, 3):
+        if variant not in THRESHOLDS:
             raise ValueError("Unknown variant, possible choices are: 0, 1, 2, 3")
+        if drift is not None and any(v not in THRESHOLDS for v in drift.values()):
+            raise ValueError("Unknown variant in drift, possible choices are: 0, 1, 2, 3")
+        if block_size is not None and block_size < 1:
+            raise ValueError("block_size must be a positive integer")
 
         self.variant = variant
         self.noise = noise
         self.seed = seed
-        self._threshold = {0: 8, 1: 9, 2: 7, 3: 9.5}[variant]
+        self.drift = drift
+        self.block_size = block_size
+        self._threshold = THRESHOLDS[variant]
+        # Positions at which the threshold changes and the thresholds from these positions on.
+        schedule = sorted((drift or {}).items())
+        self._drift_positions = [position for position, _ in schedule]
+        self._drift_thresholds = [self._threshold] + [THRESHOLDS[v] for _, v in schedule]
+
+    def _thresholds(self, start, stop):
+        """Return the thresholds of the samples `start` to `stop - 1`."""
+        if not self._drift_positions:
+            return self._threshold
+        idx = np.searchsorted(self._drift_positions, np.arange(start, stop), side="right")
+        return np.asarray(self._drift_thresholds)[idx]
+
+    def iter_blocks(self, n_samples: int = None, block_size: int = None):
+        """Iterate over the stream in blocks of NumPy arrays.
+
+        Parameters
+        ----------
+        n_samples
+            Number of samples to generate. The stream is infinite by default.
+        block_size
+            Number of samples per block. Defaults to `self.block_size` or 10000.
+
+        Yields
+        ------
+        Tuples `(X, y)` with the features `X` of shape `(n, 3)` and the boolean targets `y`.
+
+        """
+        block_size = block_size or self.block_size or 10_000
+        feature_seed, noise_seed = np.random.SeedSequence(self.seed).spawn(2)
+        feature_rng = np.random.default_rng(feature_seed)
+        noise_rng = np.random.default_rng(noise_seed)
+        start = 0
+        while n_samples is None or start < n_samples:
+            n = block_size if n_samples is None else min(block_size, n_samples - start)
+            X = feature_rng.uniform(0, 10, size=(n, 3))
+            y = X[:, 0] + X[:, 1] > self._thresholds(start, start + n)
+            # The flips are always drawn, so that the features do not depend on `noise`.
+            flip = noise_rng.random(n) < self.noise
+            yield X, y ^ flip
+            start += n
 
     def __iter__(self):
 
+        if self.block_size is not None:
+            for X, y in self.iter_blocks():
+                for x0, x1, x2, y_i in zip(X[:, 0].tolist(), X[:, 1].tolist(), X[:, 2].tolist(), y.tolist()):
+                    yield {0: x0, 1: x1, 2: x2}, y_i
+            return
+
         rng = random.Random(self.seed)
+        threshold = self._threshold
+        positions = self._drift_positions
+        n = 0
 
         while True:
 
+            if positions and n in positions:
+                threshold = self._drift_thresholds[bisect.bisect_right(positions, n)]
+
             x = {i: rng.uniform(0, 10) for i in range(3)}
-            y = x[0] + x[1] > self._threshold
+            y = x[0] + x[1] > threshold
 
             if self.noise and rng.random() < self.noise:
                 y = not y
 
+            n += 1
             yield x, y
 
     @property
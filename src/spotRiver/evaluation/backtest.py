@@ -0,0 +1,156 @@
+"""Rolling-origin backtests of forecasters.
+
+`time_series.evaluate` scores a forecaster with a single pass over the series. A rolling-origin
+backtest scores it on several windows instead: for every forecast origin, the forecaster learns
+the series up to the origin and is then evaluated progressively on the window that starts at the
+origin, as by `time_series.evaluate`.
+
+The state learned up to the origins is shared: one pass over the series learns up to the last
+origin and takes a snapshot of the forecaster at every origin. The windows only depend on their
+snapshot and are evaluated independently, e.g., by the workers of an executor.
+
+"""
+import copyreg
+import io
+import numbers
+import pickle
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
+from river import time_series
+from river.time_series import holt_winters
+
+__all__ = ["rolling_origin_windows", "backtest_forecaster"]
+
+
+def _rebuild_component(cls, items, maxlen, state):
+    component = deque.__new__(cls)
+    deque.__init__(component, items, maxlen)
+    component.__dict__.update(state)
+    return component
+
+
+def _reduce_component(component):
+    return _rebuild_component, (type(component), list(component), component.maxlen, component.__dict__)
+
+
+# The components of `HoltWinters` are deques whose constructors do not take the arguments of
+# `deque.__reduce__`, so the forecaster cannot be pickled without these reducers. They are only
+# used by the pickler of the snapshots, see `_dumps`.
+_DISPATCH_TABLE = copyreg.dispatch_table.copy()
+_DISPATCH_TABLE.update((cls, _reduce_component) for cls in holt_winters.Component.__subclasses__())
+
+
+def _dumps(model):
+    """Return the snapshot of a forecaster. It is restored with `pickle.loads`."""
+    f = io.BytesIO()
+    pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = _DISPATCH_TABLE
+    pickler.dump(model)
+    return f.getvalue()
+
+
+def rolling_origin_windows(n_samples, horizon, origins, window=None, start=None):
+    """Return the windows of a rolling-origin backtest.
+
+    Step `t` of a window forecasts the `horizon` samples after sample `t` and then learns sample `t`,
+    as `time_series.evaluate` does. The last `horizon` samples are not forecast from.
+
+    Args:
+        n_samples (int): length of the series.
+        horizon (int): forecast horizon.
+        origins (int or list): number of evenly spaced origins, or the indices of the origins.
+        window (int): number of steps per window. `None` ends every window at the next origin
+            and the last one at the end of the series.
+        start (int): first origin if `origins` is a number. Defaults to `horizon`, the default
+            grace period of `time_series.evaluate`.
+
+    Returns:
+        (list): `(origin, end)` tuples with the first and the last step (exclusive) of every window,
+            sorted by origin.
+
+    Examples:
+        >>> rolling_origin_windows(144, 12, 3)
+        [(12, 52), (52, 92), (92, 132)]
+        >>> rolling_origin_windows(144, 12, 3, window=24)
+        [(12, 36), (60, 84), (108, 132)]
+    """
+    n_steps = n_samples - horizon
+    if isinstance(origins, numbers.Integral):
+        start = horizon if start is None else start
+        if window is None:
+            origins = np.linspace(start, n_steps, origins + 1)[:-1]
+        else:
+            origins = np.linspace(start, n_steps - window, origins)
+        origins = np.round(origins).astype(int)
+    origins = sorted(set(int(o) for o in origins))
+    if not origins or origins[0] < 0 or origins[-1] >= n_steps:
+        raise ValueError(f"Origins must be between 0 and {n_steps - 1}, got {origins}.")
+    if window is None:
+        ends = origins[1:] + [n_steps]
+    else:
+        ends = [min(o + window, n_steps) for o in origins]
+    return list(zip(origins, ends))
+
+
+def _evaluate_window(snapshot, rows, metric, horizon):
+    model = pickle.loads(snapshot)
+    return time_series.evaluate(rows, model, metric=metric, horizon=horizon, grace_period=0)
+
+
+def backtest_forecaster(dataset, model, metric, horizon, windows, executor=None, budget=None, profiler=None):
+    """Evaluate a forecaster on the windows of a rolling-origin backtest.
+
+    A backtest with the single window `(grace_period, len(dataset) - horizon)` gives the same result
+    as `time_series.evaluate` with that grace period.
+
+    Args:
+        dataset: time series of `(x, y)` pairs.
+        model: forecaster. It is not modified.
+        metric: regression metric.
+        horizon (int): forecast horizon.
+        windows (list): `(origin, end)` tuples, see `rolling_origin_windows`.
+        executor (concurrent.futures.Executor): executor that evaluates the windows in parallel.
+            `None` evaluates them one after the other. Do not pass the executor that runs the
+            calling task, which can deadlock if all of its workers wait for windows.
+        budget (spotRiver.utils.budget.Budget): If set, the budget is checked before every sample
+            of the serial evaluation and after every window evaluated by `executor`.
+        profiler (spotRiver.utils.profiling.PhaseTimer): If set, the time spent in learning up to
+            the origins ("backtest.learn") and in the windows ("backtest.windows") is accumulated.
+
+    Returns:
+        (list): one `time_series.HorizonMetric` per window.
+    """
+    timed = (lambda name: nullcontext()) if profiler is None else profiler.phase
+    rows = dataset if isinstance(dataset, list) else list(dataset)
+    windows = sorted(windows)
+    # Learn up to the last origin and take a snapshot at every origin.
+    snapshots = []
+    model = pickle.loads(_dumps(model))
+    with timed("backtest.learn"):
+        learned = 0
+        for origin, _ in windows:
+            prefix = rows[learned:origin]
+            for x, y in prefix if budget is None else budget.wrap(prefix):
+                model.learn_one(y=y, x=x)
+            learned = origin
+            snapshots.append(_dumps(model))
+    jobs = [(snapshot, rows[origin:end + horizon]) for snapshot, (origin, end) in zip(snapshots, windows)]
+    with timed("backtest.windows"):
+        if executor is None:
+            if budget is not None:
+                jobs = [(snapshot, budget.wrap(rows_i)) for snapshot, rows_i in jobs]
+            return [_evaluate_window(snapshot, rows_i, metric, horizon) for snapshot, rows_i in jobs]
+        futures = [executor.submit(_evaluate_window, snapshot, rows_i, metric, horizon) for snapshot, rows_i in jobs]
+        try:
+            results = []
+            for future in futures:
+                results.append(future.result())
+                if budget is not None:
+                    budget.check()
+            return results
+        finally:
+            # Windows that have not started yet are not evaluated if the budget is exceeded.
+            for future in futures:
+                future.cancel()
@@ -1,13 +1,367 @@
 import matplotlib.pyplot as plt
+from contextlib import ExitStack, nullcontext
+from copy import deepcopy
+from itertools import islice, takewhile
+from river import base, compose, utils
 from river.evaluate import iter_progressive_val_score
 from spotPython.utils.progress import progress_bar
+from time import perf_counter
 from numpy import median
+from numpy import nan
 from numpy import zeros
+from pathlib import Path
+from spotRiver.data.array import ArrayDataset
+from spotRiver.data.materialize import materialize
+from spotRiver.evaluation.sinks import read_checkpoints
 
 
-def eval_oml_iter_progressive(dataset, metric, models, step=100, verbose=False):
+class _MemorySampler:
+    """Decide at which checkpoints the memory of a model is measured."""
+
+    def __init__(self, measure_memory=True, memory_every=None, memory_interval=None, profiler=None):
+        self.measure_memory = measure_memory
+        self.profiler = profiler
+        self.memory_every = 1 if memory_every is None and memory_interval is None else memory_every
+        self.memory_interval = memory_interval
+        self.k = 0
+        self.last_measurement = None
+
+    def __call__(self, model):
+        """Return the memory usage of `model` in MB, or `nan` if it is not measured at this checkpoint."""
+        k = self.k
+        self.k += 1
+        if not self.measure_memory:
+            return nan
+        now = perf_counter()
+        due = self.memory_every is not None and k % self.memory_every == 0
+        if self.memory_interval is not None:
+            due = due or self.last_measurement is None or now - self.last_measurement >= self.memory_interval
+        if not due:
+            return nan
+        self.last_measurement = now
+        if self.profiler is None:
+            return model._raw_memory_usage * 2**-20
+        with self.profiler.phase("memory"):
+            return model._raw_memory_usage * 2**-20
+
+
+class _TimedDataset:
+    """Dataset whose iteration is timed as phase "data" of a `PhaseTimer`."""
+
+    def __init__(self, dataset, profiler):
+        self.dataset = dataset
+        self.profiler = profiler
+
+    def __iter__(self):
+        return self.profiler.iterate(self.dataset, "data")
+
+    def __len__(self):
+        return len(self.dataset)
+
+
+class _ProgressiveState:
+    """Progressive validation state of one model in a single pass over the data."""
+
+    def __init__(self, model, metric):
+        # Check that the model and the metric are in accordance
+        if not metric.works_with(model):
+            raise ValueError(f"{metric.__class__.__name__} metric is not compatible with {model}")
+        # Determine if predict_one or predict_proba_one should be used in case of a classifier
+        if utils.inspect.isanomalydetector(model):
+            self.pred_func = model.score_one
+        elif utils.inspect.isclassifier(model) and not metric.requires_labels:
+            self.pred_func = model.predict_proba_one
+        else:
+            self.pred_func = model.predict_one
+        self.model = model
+        self.metric = metric
+        self.r_time = 0.0
+
+    def update(self, x_pred, x_learn, y):
+        start = perf_counter()
+        y_pred = self.pred_func(x_pred)
+        if y_pred != {} and y_pred is not None:
+            self.metric.update(y_true=y, y_pred=y_pred)
+        if self.model._supervised:
+            self.model.learn_one(x_learn, y)
+        else:
+            self.model.learn_one(x_learn)
+        self.r_time += perf_counter() - start
+
+
+def _supports_many(model):
+    """Check whether `model` and, for pipelines and unions, all of its steps support mini-batches."""
+    if isinstance(model, compose.Pipeline):
+        return all(_supports_many(step) for step in model.steps.values())
+    if isinstance(model, compose.TransformerUnion):
+        return all(_supports_many(t) for t in model.transformers.values())
+    return isinstance(
+        model,
+        (
+            base.MiniBatchTransformer,
+            base.MiniBatchSupervisedTransformer,
+            base.MiniBatchRegressor,
+            base.MiniBatchClassifier,
+        ),
+    )
+
+
+def _iter_mini_batches(
+    dataset, metric, models, step, verbose, n_steps, measure_time, sampler_kwargs, stop_rule, batch_size
+):
+    """Progressive validation with mini-batches.
+
+    Every mini-batch is predicted before the model learns from it. Mini-batches end at the checkpoints,
+    so that the checkpoints are the same as for `iter_progressive_val_score`. With `batch_size=1`, the
+    evaluation is the same as the evaluation one sample at a time.
+    """
+    metric_name = metric.__class__.__name__
+    for model_name, model in models.items():
+        if not _supports_many(model):
+            # Fall back to one feature dictionary per sample.
+            yield from _iter_sequential(
+                dataset, metric, {model_name: model}, step, verbose, n_steps, measure_time, sampler_kwargs, stop_rule
+            )
+            continue
+        metric_i = metric.clone()
+        if not metric_i.works_with(model):
+            raise ValueError(f"{metric_name} metric is not compatible with {model}")
+        proba = utils.inspect.isclassifier(model) and not metric_i.requires_labels
+        sampler = _MemorySampler(**sampler_kwargs)
+        r_time = 0.0
+        n = 0
+        prev_checkpoint = None
+        next_checkpoint = step if step else n_steps + 1
+        while n < n_steps:
+            stop = min(n + batch_size, next_checkpoint, n_steps)
+            X, y = dataset.batch(n, stop)
+            start = perf_counter()
+            if proba:
+                y_pred = model.predict_proba_many(X).to_dict("records")
+            else:
+                y_pred = model.predict_many(X).tolist()
+            for y_true, y_pred_i in zip(y.tolist(), y_pred):
+                metric_i.update(y_true=y_true, y_pred=y_pred_i)
+            model.learn_many(X, y)
+            r_time += perf_counter() - start
+            n = stop
+            # If the dataset was exhausted, the final results are reported as by `iter_progressive_val_score`
+            if n == next_checkpoint or (n == n_steps and prev_checkpoint):
+                if verbose:
+                    progress_bar(n / n_steps, message="Eval mini-batches:")
+                checkpoint = {
+                    "step": n,
+                    "error": metric_i.get(),
+                    "r_time": r_time if measure_time else nan,
+                    "memory": sampler(model),
+                    "metric_name": metric_name,
+                }
+                yield model_name, _check_stop(checkpoint, model_name, stop_rule)
+                if checkpoint.get("stopped", False):
+                    break
+                prev_checkpoint = next_checkpoint
+                next_checkpoint += step
+
+
+def _new_result(stop_rule=None):
+    result_i = {"step": [], "error": [], "r_time": [], "memory": []}
+    if stop_rule is not None:
+        result_i["stopped"] = False
+    return result_i
+
+
+def _check_stop(checkpoint, model_name, stop_rule):
+    if stop_rule is not None:
+        checkpoint["stopped"] = bool(stop_rule(model_name, checkpoint["step"], checkpoint["error"]))
+    return checkpoint
+
+
+def _iter_sequential(dataset, metric, models, step, verbose, n_steps, measure_time, sampler_kwargs, stop_rule):
+    metric_name = metric.__class__.__name__
+    for model_name, model in models.items():
+        sampler = _MemorySampler(**sampler_kwargs)
+        for checkpoint in iter_progressive_val_score(
+            dataset, model, metric.clone(), measure_time=measure_time, measure_memory=False, step=step
+        ):
+            if verbose:
+                progress_bar(checkpoint["Step"] / n_steps, message="Eval iter_prog_val_score:")
+            checkpoint = {
+                "step": checkpoint["Step"],
+                "error": checkpoint[metric_name].get(),
+                # Convert timedelta object into seconds
+                "r_time": checkpoint["Time"].total_seconds() if measure_time else nan,
+                "memory": sampler(model),
+                "metric_name": metric_name,
+            }
+            yield model_name, _check_stop(checkpoint, model_name, stop_rule)
+            if checkpoint.get("stopped", False):
+                break
+
+
+def _iter_single_pass(
+    dataset,
+    metric,
+    models,
+    step,
+    verbose,
+    n_steps,
+    measure_time,
+    sampler_kwargs,
+    stop_rule,
+    start=0,
+    resume_metrics=None,
+    on_checkpoint=None,
+):
+    metric_name = metric.__class__.__name__
+    resume_metrics = {} if resume_metrics is None else resume_metrics
+    states = {
+        model_name: _ProgressiveState(model, resume_metrics.get(model_name) or metric.clone())
+        for model_name, model in models.items()
+    }
+    samplers = {model_name: _MemorySampler(**sampler_kwargs) for model_name in models}
+
+    def report():
+        if verbose:
+            progress_bar(n / n_steps, message="Eval single pass:")
+        checkpoints = []
+        for model_name, state in list(states.items()):
+            checkpoint = {
+                "step": n,
+                "error": state.metric.get(),
+                "r_time": state.r_time if measure_time else nan,
+                "memory": samplers[model_name](state.model),
+                "metric_name": metric_name,
+            }
+            if _check_stop(checkpoint, model_name, stop_rule).get("stopped", False):
+                del states[model_name]
+            elif on_checkpoint is not None:
+                on_checkpoint(model_name, checkpoint, state.model, state.metric)
+            checkpoints.append((model_name, checkpoint))
+        return checkpoints
+
+    # The models have already learned the first `start` samples and `dataset` begins after them.
+    # The checkpoints are counted from the beginning of the dataset.
+    n = start
+    prev_checkpoint = start or None
+    next_checkpoint = (start // step + 1) * step if step else None
+    for x, y in takewhile(lambda _: states, dataset):
+        # Every model predicts on and learns from its own copy of the features,
+        # as `iter_progressive_val_score` does.
+        last = len(states) - 1
+        for j, state in enumerate(states.values()):
+            state.update(deepcopy(x), x if j == last else deepcopy(x), y)
+        n += 1
+        if n == next_checkpoint:
+            yield from report()
+            prev_checkpoint = next_checkpoint
+            next_checkpoint += step
+    # If the dataset was exhausted, we need to make sure that we yield the final results
+    if states and prev_checkpoint and n != prev_checkpoint:
+        yield from report()
+
+
+def _check_batch_size(batch_size, dataset, single_pass):
+    if batch_size is None:
+        return
+    if single_pass:
+        raise ValueError("batch_size cannot be combined with single_pass, start, resume_metrics or on_checkpoint.")
+    if not isinstance(dataset, ArrayDataset):
+        raise ValueError("batch_size requires an ArrayDataset.")
+
+
+def iter_eval_oml_progressive(
+    dataset,
+    metric,
+    models,
+    step=100,
+    verbose=False,
+    cache_data=True,
+    measure_time=True,
+    measure_memory=True,
+    memory_every=None,
+    memory_interval=None,
+    single_pass=False,
+    stop_rule=None,
+    batch_size=None,
+    profiler=None,
+    start=0,
+    resume_metrics=None,
+    on_checkpoint=None,
+    budget=None,
+):
+    """Evaluate OML Models and yield every checkpoint as soon as it is produced.
+
+    This is the generator variant of `eval_oml_iter_progressive`, see there for the arguments.
+
+    Yields:
+        (tuple): the model name and a dictionary with the entries `step`, `error`, `r_time`,
+            `memory` and `metric_name` of the checkpoint. If `stop_rule` is set, the dictionary
+            also contains the entry `stopped`.
+    """
+    skipped = 0
+    if start and getattr(dataset, "sliceable", False):
+        # Seek to the first new row of the file instead of parsing the rows before it.
+        dataset, skipped = dataset[start:], start
+    with nullcontext() if profiler is None else profiler.phase("data.load"):
+        if cache_data:
+            dataset = materialize(dataset)
+        if not hasattr(dataset, "__len__"):
+            dataset = list(dataset)
+    n_steps = len(dataset) + skipped
+    resume = bool(start) or resume_metrics is not None or on_checkpoint is not None
+    _check_batch_size(batch_size, dataset, single_pass or resume)
+    sampler_kwargs = dict(
+        measure_memory=measure_memory, memory_every=memory_every, memory_interval=memory_interval, profiler=profiler
+    )
+    if budget is not None:
+        dataset = budget.wrap(dataset)
+    with ExitStack() as stack:
+        if profiler is not None:
+            metric = profiler.instrument_metric(metric)
+            for model in models.values():
+                stack.enter_context(profiler.instrument(model))
+            if batch_size is None:
+                dataset = _TimedDataset(dataset, profiler)
+        args = (dataset, metric, models, step, verbose, n_steps, measure_time, sampler_kwargs, stop_rule)
+        if batch_size is not None:
+            yield from _iter_mini_batches(*args, batch_size)
+        elif resume:
+            rows = islice(dataset, start - skipped, None)
+            yield from _iter_single_pass(rows, *args[1:], start, resume_metrics, on_checkpoint)
+        else:
+            yield from (_iter_single_pass if single_pass else _iter_sequential)(*args)
+
+
+def eval_oml_iter_progressive(
+    dataset,
+    metric,
+    models,
+    step=100,
+    verbose=False,
+    cache_data=True,
+    measure_time=True,
+    measure_memory=True,
+    memory_every=None,
+    memory_interval=None,
+    single_pass=False,
+    stop_rule=None,
+    sink=None,
+    batch_size=None,
+    profiler=None,
+    start=0,
+    resume_metrics=None,
+    on_checkpoint=None,
+    budget=None,
+):
     """Evaluate OML Models
 
+    Measuring the memory walks through the whole object graph of the model, which can dominate
+    the evaluation time of large models, e.g., Hoeffding trees. It can be switched off or
+    sampled with `memory_every` and `memory_interval`. Checkpoints without a measurement
+    report `nan`.
+
+    Every model is evaluated with its own clone of `metric`.
+
     Args:
         dataset:
         metric:
@@ -15,30 +369,79 @@ def eval_oml_iter_progressive(dataset, metric, models, step=100, verbose=False):
         step (int): Iteration number at which to yield results.
             This only takes into account the predictions, and not the training steps.
         verbose:
+        cache_data (bool): If `True`, file based datasets are parsed once and replayed from
+            `spotRiver.data.materialize.DATASET_CACHE` in subsequent calls.
+        measure_time (bool): Whether or not to measure the elapsed time.
+        measure_memory (bool): Whether or not to measure the memory usage of the models.
+        memory_every (int): If set, the memory is only measured at every `memory_every`-th
+            checkpoint, starting with the first one.
+        memory_interval (float): If set, the memory is only measured if at least `memory_interval`
+            seconds have passed since the last measurement.
+        single_pass (bool): If `True`, every sample is passed through all models in one pass over
+            the dataset instead of one pass per model. The results have the same form, but
+            `r_time` is the time spent in the predictions, updates and metric updates of the
+            respective model.
+        stop_rule (callable): If set, `stop_rule(model_name, step, error)` is called at every checkpoint.
+            If it returns `True`, the evaluation of the model is stopped and the result of the model
+            gets the additional entry `"stopped": True`. Otherwise, the entry is `False`.
+        sink (callable): If set, `sink(model_name, checkpoint)` is called for every checkpoint as soon
+            as it is produced, e.g., a `spotRiver.evaluation.sinks.JSONLinesSink`.
+            See `iter_eval_oml_progressive` for the entries of `checkpoint`.
+        batch_size (int): If set, `dataset` must be a `spotRiver.data.array.ArrayDataset`. Models that
+            support mini-batches, i.e., `learn_many` and `predict_many`, are evaluated on mini-batches of
+            at most `batch_size` samples. Every mini-batch is predicted before the model learns from it.
+            Other models are evaluated one sample at a time.
+        profiler (spotRiver.utils.profiling.PhaseTimer): If set, the time spent in loading and iterating
+            the data ("data.load", "data"), the feature extraction ("features"), the predictions and
+            updates of the models ("model.predict", "model.learn"), the metric updates ("metric") and
+            the memory measurements ("memory") is accumulated in `profiler.timings`.
+        start (int): Number of samples the models have already learned, e.g., when a model is
+            restored from a snapshot. The first `start` samples of `dataset` are skipped, and the
+            steps are counted from the beginning of `dataset`. File datasets that support slicing
+            (see `FileSlice`) seek to sample `start` instead of parsing the samples before it.
+            Implies `single_pass`.
+        resume_metrics (dict): Metric per model name that holds the state of the first `start`
+            samples. It is updated instead of a clone of `metric`. Implies `single_pass`.
+        on_checkpoint (callable): If set, `on_checkpoint(model_name, checkpoint, model, metric)` is
+            called at every checkpoint of a model that was not stopped, e.g., to take a snapshot of
+            the model and its metric. Implies `single_pass`.
+        budget (spotRiver.utils.budget.Budget): If set, the budget is checked before every sample
+            (before every mini-batch if `batch_size` is set), and the evaluation is stopped with
+            `spotRiver.utils.budget.BudgetExceeded` when it is exceeded.
 
     Reference:
         https://riverml.xyz/0.15.0/recipes/on-hoeffding-trees/
     """
-    metric_name = metric.__class__.__name__
-    dataset = list(dataset)
-    n_steps = len(dataset)
-    result = {}
-    for model_name, model in models.items():
-        result_i = {"step": [], "error": [], "r_time": [], "memory": []}
-        for checkpoint in iter_progressive_val_score(
-            dataset, model, metric, measure_time=True, measure_memory=True, step=step
-        ):
-            if verbose:
-                progress_bar(checkpoint["Step"] / n_steps, message="Eval iter_prog_val_score:")
-            result_i["step"].append(checkpoint["Step"])
-            result_i["error"].append(checkpoint[metric_name].get())
-            # Convert timedelta object into seconds
-            result_i["r_time"].append(checkpoint["Time"].total_seconds())
-            # Make sure the memory measurements are in MB
-            raw_memory = checkpoint["Memory"]
-            result_i["memory"].append(raw_memory * 2**-20)
-        result_i["metric_name"] = metric_name
-        result[model_name] = result_i
+    result = {model_name: _new_result(stop_rule) for model_name in models}
+    for model_name, checkpoint in iter_eval_oml_progressive(
+        dataset,
+        metric,
+        models,
+        step=step,
+        verbose=verbose,
+        cache_data=cache_data,
+        measure_time=measure_time,
+        measure_memory=measure_memory,
+        memory_every=memory_every,
+        memory_interval=memory_interval,
+        single_pass=single_pass,
+        stop_rule=stop_rule,
+        batch_size=batch_size,
+        profiler=profiler,
+        start=start,
+        resume_metrics=resume_metrics,
+        on_checkpoint=on_checkpoint,
+        budget=budget,
+    ):
+        if sink is not None:
+            sink(model_name, checkpoint)
+        result_i = result[model_name]
+        for key in ("step", "error", "r_time", "memory"):
+            result_i[key].append(checkpoint[key])
+        if checkpoint.get("stopped", False):
+            result_i["stopped"] = True
+    for result_i in result.values():
+        result_i["metric_name"] = metric.__class__.__name__
     return result
 
 
@@ -46,11 +449,14 @@ def plot_oml_iter_progressive(result, log_y=False):
     """Plot evaluation of OML models.
 
     Args:
-        result (dict):
+        result (dict): result of `eval_oml_iter_progressive` or the path of a file written by
+            a sink from `spotRiver.evaluation.sinks`.
 
     Reference:
         https://riverml.xyz/0.15.0/recipes/on-hoeffding-trees/
     """
+    if isinstance(result, (str, Path)):
+        result = read_checkpoints(result)
     fig, ax = plt.subplots(figsize=(10, 5), nrows=3, dpi=300)
     for model_name, model in result.items():
         ax[0].plot(model["step"], model["error"], label=model_name)
@@ -0,0 +1,158 @@
+"""Batched evaluation of Holt-Winters forecasters.
+
+`time_series.evaluate` steps one `time_series.HoltWinters` forecaster through the series in pure
+Python. The recursions of the level, the trend and the seasonality are the same for every
+forecaster and only differ in the smoothing parameters `alpha`, `beta` and `gamma`. Forecasters
+that share the seasonality and the formulation are advanced together here, with one NumPy array
+per component over the forecasters.
+
+The arithmetic follows `time_series.HoltWinters` and the running means of the metrics operation
+by operation, so the horizon metrics are the same as those of `time_series.evaluate`. The MAE is
+identical, the MSE and the RMSE can differ in the last digit, because NumPy squares the errors
+with a multiplication instead of `pow`.
+
+"""
+import statistics
+
+import numpy as np
+from river import metrics
+
+__all__ = ["BATCH_METRICS", "supports_holt_winters", "evaluate_holt_winters"]
+
+# Metrics that can be evaluated in batches, with the error of a forecast and the final transform
+# of the mean error.
+BATCH_METRICS = {
+    metrics.MAE: (np.abs, None),
+    metrics.MSE: (np.square, None),
+    metrics.RMSE: (np.square, lambda mean: mean**0.5),
+}
+
+
+def supports_holt_winters(n_samples, metric, horizon, seasonality, beta, grace_period=None):
+    """Whether `evaluate_holt_winters` gives the result of `time_series.evaluate`.
+
+    `time_series.evaluate` raises for the other forecasters, e.g., if the grace period is shorter than
+    the initialization of the components, or if a seasonal forecaster has no trend (`beta=0`).
+
+    Args:
+        n_samples (int): length of the series.
+        metric: regression metric, see `BATCH_METRICS`.
+        horizon (int): forecast horizon.
+        seasonality (int): number of periods in a season.
+        beta (float): smoothing parameter of the trend.
+        grace_period (int): number of samples that are learned before the first forecast.
+            Defaults to `horizon`.
+
+    Returns:
+        (bool): `True` if the forecaster can be evaluated in a batch.
+    """
+    grace_period = horizon if grace_period is None else grace_period
+    return (
+        type(metric) in BATCH_METRICS
+        and max(2, seasonality) <= grace_period < n_samples - horizon
+        and not (seasonality and not beta)
+    )
+
+
+def _initial_components(first, seasonality):
+    """Return the initial level, trend and season of `time_series.HoltWinters`.
+
+    They only depend on the first values of the series, so they are computed once per batch.
+    """
+    level = statistics.mean(first)
+    trend = statistics.mean([b - a for a, b in zip(first[:-1], first[1:])])
+    season = [y / level for y in first][-seasonality:] if seasonality else []
+    return level, trend, season
+
+
+def evaluate_holt_winters(
+    dataset, alpha, beta, gamma, seasonality, multiplicative, metric, horizon, grace_period=None
+):
+    """Evaluate a batch of Holt-Winters forecasters with a shared seasonality and formulation.
+
+    This gives the same result as calling `time_series.evaluate` with every forecaster
+    `time_series.HoltWinters(alpha[i], beta[i], gamma[i], seasonality, multiplicative)`, see
+    `supports_holt_winters` for the supported arguments. Forecasters whose recursion divides by
+    zero get infinite or `nan` metric values instead of raising a `ZeroDivisionError`.
+
+    Args:
+        dataset: time series of `(x, y)` pairs. The features are not used.
+        alpha (array): smoothing parameters of the level, one per forecaster.
+        beta (array): smoothing parameters of the trend. Forecasters with `beta=0` have no trend.
+        gamma (array): smoothing parameters of the seasonality.
+        seasonality (int): number of periods in a season. `0` means no seasonality.
+        multiplicative (bool): whether to use the multiplicative formulation.
+        metric: regression metric, see `BATCH_METRICS`.
+        horizon (int): forecast horizon.
+        grace_period (int): number of samples that are learned before the first forecast.
+            Defaults to `horizon`.
+
+    Returns:
+        (numpy.ndarray): metric values with one row per forecaster and one column per step of the
+            horizon, as returned by `time_series.HorizonMetric.get`.
+
+    Examples:
+        >>> import numpy as np
+        >>> from river import metrics, time_series
+        >>> from spotRiver.data import AirlinePassengers
+        >>> values = evaluate_holt_winters(
+        ...     AirlinePassengers(), np.array([0.3, 0.5]), np.array([0.1, 0.1]), np.array([0.6, 0.6]),
+        ...     seasonality=12, multiplicative=False, metric=metrics.MAE(), horizon=12
+        ... )
+        >>> model = time_series.HoltWinters(alpha=0.5, beta=0.1, gamma=0.6, seasonality=12)
+        >>> values[1].tolist() == time_series.evaluate(AirlinePassengers(), model, metrics.MAE(), 12).get()
+        True
+    """
+    ys = [y for _, y in dataset]
+    n_samples = len(ys)
+    grace_period = horizon if grace_period is None else grace_period
+    if not all(supports_holt_winters(n_samples, metric, horizon, seasonality, b, grace_period) for b in beta):
+        raise ValueError("The forecasters are not supported, see `supports_holt_winters`.")
+    error, transform = BATCH_METRICS[type(metric)]
+    alpha, beta, gamma = (np.asarray(a, dtype=float) for a in (alpha, beta, gamma))
+    n = len(alpha)
+    k = max(2, seasonality)
+    level, trend, season = _initial_components(ys[:k], seasonality)
+    level = np.full(n, float(level))
+    # Forecasters without a trend keep a trend of zero.
+    has_trend = beta != 0
+    trend = np.where(has_trend, float(trend), 0.0)
+    # Ring buffer of the last `seasonality` seasonal components. `season[:, p]` is the component
+    # of one season ago, `season[-seasonality]` of `time_series.HoltWinters`.
+    season = np.tile(np.asarray(season, dtype=float), (n, 1)) if seasonality else None
+    p = 0
+    y_true = np.asarray(ys, dtype=float)
+    steps = np.arange(1, horizon + 1)
+    season_steps = np.arange(horizon) % seasonality if seasonality else None
+    mean = np.zeros((n, horizon))
+    n_updates = 0.0
+    with np.errstate(all="ignore"):
+        for t in range(n_samples - horizon):
+            if t >= grace_period:
+                y_pred = level[:, None] + steps * trend[:, None]
+                if season is not None:
+                    s = season[:, (p + season_steps) % seasonality]
+                    y_pred = y_pred * s if multiplicative else y_pred + s
+                n_updates += 1.0
+                mean += (1.0 / n_updates) * (error(y_true[t + 1:t + 1 + horizon] - y_pred) - mean)
+            if t < k:
+                # The first `k` values initialize the components.
+                continue
+            y = y_true[t]
+            if season is None:
+                new_level = alpha * y + (1 - alpha) * (level + trend)
+            else:
+                s = season[:, p]
+                deseasonalized = y / s if multiplicative else y - s
+                new_level = alpha * deseasonalized + (1 - alpha) * (level + trend)
+            new_trend = np.where(has_trend, beta * (new_level - level) + (1 - beta) * trend, 0.0)
+            if season is not None:
+                if multiplicative:
+                    season[:, p] = gamma * y / (level + trend) + (1 - gamma) * s
+                else:
+                    season[:, p] = gamma * (y - level - trend) + (1 - gamma) * s
+                p = (p + 1) % seasonality
+            level, trend = new_level, new_trend
+    if transform is not None:
+        mean = np.array([[transform(float(v)) for v in row] for row in mean])
+    return mean
@@ -0,0 +1,126 @@
+"""Sinks for the checkpoints of `eval_oml_iter_progressive`.
+
+A sink is a callable `sink(model_name, checkpoint)` that receives every checkpoint as soon as it
+is produced. The bundled sinks append one record per checkpoint to a file and flush it, so long
+runs can be watched while they are running and partial results survive a crash. The files are
+read back with `read_checkpoints`, which returns the same dictionary as
+`eval_oml_iter_progressive`.
+
+"""
+import csv
+import json
+from pathlib import Path
+
+__all__ = ["CheckpointSink", "JSONLinesSink", "CSVSink", "read_checkpoints"]
+
+CHECKPOINT_FIELDS = ["model", "step", "error", "r_time", "memory", "metric_name", "stopped"]
+
+
+class CheckpointSink:
+    """Base class of sinks that append checkpoints to a file.
+
+    Args:
+        path (str or Path): file the checkpoints are appended to.
+        mode (str): `"a"` appends to an existing file, `"w"` truncates it.
+    """
+
+    def __init__(self, path, mode="a"):
+        if mode not in ("a", "w"):
+            raise ValueError(f"mode must be 'a' or 'w', got {mode!r}.")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, mode, newline="")
+
+    def __call__(self, model_name, checkpoint):
+        """Write the checkpoint of `model_name` and flush the file."""
+        self.write(dict(checkpoint, model=model_name))
+        self._file.flush()
+
+    def write(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class JSONLinesSink(CheckpointSink):
+    """Append checkpoints to a JSON lines file, one object per checkpoint."""
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+
+
+class CSVSink(CheckpointSink):
+    """Append checkpoints to a CSV file. The header is written if the file is empty."""
+
+    def __init__(self, path, mode="a"):
+        super().__init__(path, mode)
+        self._writer = csv.DictWriter(self._file, fieldnames=CHECKPOINT_FIELDS, extrasaction="ignore")
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def write(self, record):
+        self._writer.writerow(record)
+
+
+def _iter_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A truncated last line, e.g., after a crash.
+                continue
+
+
+def _iter_csv(path):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                record = {
+                    "model": row["model"],
+                    "step": int(row["step"]),
+                    "error": float(row["error"]),
+                    "r_time": float(row["r_time"]),
+                    "memory": float(row["memory"]),
+                    "metric_name": row["metric_name"],
+                }
+            except (TypeError, ValueError):
+                continue
+            if row.get("stopped"):
+                record["stopped"] = row["stopped"] == "True"
+            yield record
+
+
+def read_checkpoints(path):
+    """Read the checkpoints written by a sink.
+
+    Files with the suffix `.csv` are read as CSV, all other files as JSON lines.
+    Incomplete records, e.g., a truncated last line after a crash, are skipped.
+
+    Args:
+        path (str or Path): file written by `JSONLinesSink` or `CSVSink`.
+
+    Returns:
+        (dict): one dictionary per model with the lists `step`, `error`, `r_time` and `memory` and
+            the `metric_name`, as returned by `eval_oml_iter_progressive`. If the checkpoints
+            carry a `stopped` flag, the dictionary has the entry `stopped`, too.
+    """
+    path = Path(path)
+    records = _iter_csv(path) if path.suffix == ".csv" else _iter_jsonl(path)
+    result = {}
+    for record in records:
+        result_i = result.setdefault(record["model"], {"step": [], "error": [], "r_time": [], "memory": []})
+        for key in ("step", "error", "r_time", "memory"):
+            result_i[key].append(record[key])
+        result_i["metric_name"] = record["metric_name"]
+        if "stopped" in record:
+            result_i["stopped"] = result_i.get("stopped", False) or record["stopped"]
+    return result
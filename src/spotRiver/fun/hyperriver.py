@@ -12,12 +12,83 @@ from spotRiver.utils.features import get_weekday_distances
 from spotRiver.utils.features import get_ordinal_date
 from spotRiver.utils.features import get_month_distances
 from spotRiver.utils.features import get_hour_distances
+from spotRiver.evaluation.backtest import backtest_forecaster
+from spotRiver.evaluation.backtest import rolling_origin_windows
 from spotRiver.evaluation.eval_oml import fun_eval_oml_iter_progressive
+from spotRiver.evaluation.holt_winters import evaluate_holt_winters
+from spotRiver.evaluation.holt_winters import supports_holt_winters
 from spotRiver.evaluation.eval_oml import eval_oml_iter_progressive
 from spotRiver.utils.selectors import select_splitter
 from spotRiver.utils.selectors import select_leaf_prediction
 from spotRiver.utils.selectors import select_leaf_model
 from spotRiver.utils.selectors import select_max_depth
+from spotRiver.utils.parallel import aevaluate_rows
+from spotRiver.utils.parallel import evaluate_rows
+from spotRiver.data.materialize import materialize
+from spotRiver.data.materialize import dataset_fingerprint
+from spotRiver.data.preprocessed import Preprocessed
+from spotRiver.data.preprocessed import preprocess
+from spotRiver.utils.result_cache import ResultCache
+from spotRiver.utils.budget import Budget
+from spotRiver.utils.budget import BudgetExceeded
+from spotRiver.utils.profiling import PhaseTimer
+from spotRiver.utils.profiling import capture
+from spotRiver.utils.profiling import uninstrumented
+from spotRiver.utils.locking import atomic_write
+from pathlib import Path
+from contextlib import nullcontext
+from time import perf_counter
+import hashlib
+import pickle
+
+# Casts that the objective functions apply to the hyperparameters. Vectors that are equal
+# after the casts result in the same model.
+SNARIMAX_CASTS = (int, int, int, int, int, int, int, float, float, int, int, int)
+HW_CASTS = (float, float, float, int, int)
+HTR_CASTS = (int, int, float, float, int, int, float, int, int, int, float)
+# Row method and hyperparameter casts of the objective functions, see `HyperRiver.aevaluate`.
+OBJECTIVES = {
+    "fun_snarimax": ("_fun_snarimax_row", SNARIMAX_CASTS),
+    "fun_hw": ("_fun_hw_row", HW_CASTS),
+    "fun_HTR_iter_progressive": ("_fun_HTR_iter_progressive_row", HTR_CASTS),
+}
+# Methods that evaluate all rows of an objective function at once, per `fun_control["engine"]`.
+ENGINES = {
+    "river": {},
+    "numpy": {"_fun_hw_row": "_fun_hw_batch"},
+}
+
+
+# Format of the snapshots of `fun_HTR_iter_progressive`, see `HyperRiver._save_snapshot`.
+SNAPSHOT_VERSION = 2
+
+
+def _prefix_digests(data, step):
+    """Return the digests of the prefixes of `data` whose lengths are multiples of `step`.
+
+    The digest of a prefix hashes all of its rows as `(dict(x), y)`, so that the rows of a
+    `ColumnarDataset` and the feature dictionaries of the same stream have the same digest.
+
+    Returns:
+        (dict): digest per prefix length.
+    """
+    h = hashlib.sha256()
+    digests = {}
+    for n, (x, y) in enumerate(data, 1):
+        h.update(repr((dict(x), y)).encode())
+        if n % step == 0:
+            digests[n] = h.hexdigest()
+    return digests
+
+
+def _cacheable(info):
+    """Whether the result of a candidate is cached, i.e., it neither timed out nor exceeded its budget."""
+    return not info.get("timed_out", False) and "budget_exceeded" not in info
+
+
+def _prepend_result(prefix, result):
+    """Prepend the checkpoints of a snapshot to the result of the resumed evaluation."""
+    return {**result, **{key: list(prefix[key]) + result[key] for key in ("step", "error", "r_time", "memory")}}
 
 
 class HyperRiver:
@@ -38,7 +109,558 @@ class HyperRiver:
                             "data": None,
                             "horizon": None,
                             "grace_period": None,
-                            "metric": metrics.MAE()}
+                            "metric": metrics.MAE(),
+                            "n_jobs": None,
+                            "executor": None,
+                            "cache_data": True,
+                            "measure_time": False,
+                            "measure_memory": False,
+                            "early_stopping": None,
+                            "early_stopping_min_candidates": 3,
+                            "result_cache": None,
+                            "profile": False,
+                            "profile_cprofile": False,
+                            "profile_tracemalloc": False,
+                            "profile_candidates": None,
+                            "profile_dir": None,
+                            "snapshot_dir": None,
+                            "shared_preprocessing": None,
+                            "max_concurrency": None,
+                            "timeout": None,
+                            "budget_time": None,
+                            "budget_memory": None,
+                            "budget_penalty": np.nan,
+                            "backtest_origins": None,
+                            "backtest_window": None,
+                            "engine": "river"}
+        # Additional information about the candidates of the last call of an objective function.
+        self.candidate_info = []
+        # Error series of the completed candidates per dataset and settings, see `_get_stopping_history`.
+        self._stopping_history = {}
+        # Last dataset and its fingerprint, see `_get_fingerprint`.
+        self._fingerprint_cache = (None, None)
+        # Last dataset, step and its prefix digests, see `_get_prefix_digests`.
+        self._prefix_digest_cache = (None, None, None)
+        # Row method that is evaluated by `_profiled_row`.
+        self._profiled_method = None
+
+    def __getstate__(self):
+        # Executors cannot be pickled. Workers evaluate their rows serially.
+        state = self.__dict__.copy()
+        state["fun_control"] = {**self.fun_control, "n_jobs": None, "executor": None, "result_cache": None}
+        state["_fingerprint_cache"] = (None, None)
+        state["_prefix_digest_cache"] = (None, None, None)
+        return state
+
+    def _evaluate_rows(self, method_name, X, casts=None):
+        """Evaluate the row method `method_name` for all rows of `X`.
+
+        Rows are evaluated in worker processes if `fun_control["n_jobs"]` is larger than one
+        or if a `concurrent.futures` executor is passed as `fun_control["executor"]`.
+
+        If `fun_control["result_cache"]` is set, rows whose hyperparameters are equal after applying
+        `casts` are evaluated only once, and results from the cache are reused. The cache key
+        includes a fingerprint of the dataset, the metric and the other settings in `fun_control`.
+        Rows that exceeded their budget are not cached, see `_over_budget`.
+
+        Additional information that the row method returns is stored in `self.candidate_info`.
+        Cached results are marked with `"cached": True`.
+
+        Args:
+            method_name (str): name of the method that evaluates one row.
+            X (array): design matrix.
+            casts (tuple): one cast per hyperparameter, e.g., `int` or `float`.
+
+        Returns:
+            (numpy.ndarray): objective function values in the order of the rows of `X`.
+        """
+        cache = self._get_result_cache()
+        fingerprint = self._get_fingerprint() if cache is not None and casts is not None else None
+        if fingerprint is None:
+            z_res, self.candidate_info = self._evaluate_rows_uncached(method_name, X)
+            return z_res
+        keys = self._cache_keys(method_name, X, casts, fingerprint)
+        # Evaluate the first row of every key that is not cached yet.
+        todo = {}
+        for i, key in enumerate(keys):
+            if key not in cache and key not in todo:
+                todo[key] = i
+        fresh = {}
+        if todo:
+            row_ids = list(todo.values())
+            z, infos = self._evaluate_rows_uncached(method_name, X[row_ids], row_ids=row_ids)
+            for key, y, info in zip(todo, z, infos):
+                if _cacheable(info):
+                    cache.put(key, float(y), info)
+                fresh[key] = (y, info)
+        z_res = np.zeros(len(keys))
+        self.candidate_info = []
+        for i, key in enumerate(keys):
+            if todo.get(key) == i:
+                z_res[i], info = fresh[key]
+            else:
+                z_res[i], info = fresh[key] if key in fresh else cache.get(key)
+                info = {**info, "cached": True}
+            self.candidate_info.append(info)
+        return z_res
+
+    def _row_kwargs(self, method_name, row_ids=None):
+        """Return the arguments of `evaluate_rows` for the row method `method_name`."""
+        kwargs = dict(
+            method_name=method_name,
+            n_jobs=self.fun_control["n_jobs"],
+            executor=self.fun_control["executor"],
+            seed=self.fun_control["seed"],
+            row_ids=row_ids,
+        )
+        if self.fun_control["profile"]:
+            self._profiled_method = method_name
+            kwargs.update(method_name="_profiled_row", pass_row_id=True)
+        return kwargs
+
+    def _evaluate_rows_uncached(self, method_name, X, row_ids=None):
+        engine = self.fun_control["engine"]
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {list(ENGINES)}.")
+        batch_method = ENGINES[engine].get(method_name)
+        if batch_method is not None and self._batchable():
+            return getattr(self, batch_method)(X, row_ids)
+        return evaluate_rows(self, X=X, **self._row_kwargs(method_name, row_ids))
+
+    def _batchable(self):
+        """Whether the settings in `fun_control` allow evaluating all rows at once, see `fun_control["engine"]`."""
+        return not self.fun_control["profile"] and self.fun_control["backtest_origins"] is None and (
+            self._get_budget() is None
+        )
+
+    def _fun_hw_batch(self, X, row_ids=None):
+        """Evaluate the rows of `fun_hw` with `evaluate_holt_winters`.
+
+        The rows are evaluated in one batch per seasonality and formulation. Rows that the batch
+        does not support, see `supports_holt_winters`, are evaluated by `_fun_hw_row`.
+
+        Args:
+            X (array): design matrix, see `fun_hw`.
+            row_ids (array): ids of the rows, see `evaluate_rows`.
+
+        Returns:
+            (tuple): one objective function value and one (empty) dictionary per row of `X`.
+        """
+        data = list(self._get_data())
+        n_samples = len(data)
+        metric = self.fun_control["metric"]
+        horizon = self.fun_control["horizon"]
+        grace_period = self.fun_control["grace_period"]
+        z = np.zeros(X.shape[0])
+        alpha, beta, gamma, seasonality, multiplicative = (X[:, j].astype(cast) for j, cast in enumerate(HW_CASTS))
+        supported = np.array(
+            [supports_holt_winters(n_samples, metric, horizon, s, b, grace_period) for s, b in zip(seasonality, beta)],
+            dtype=bool,
+        )
+        groups = {}
+        for i in np.flatnonzero(supported):
+            groups.setdefault((seasonality[i], multiplicative[i]), []).append(i)
+        for (s, m), rows in groups.items():
+            values = evaluate_holt_winters(
+                data, alpha[rows], beta[rows], gamma[rows], s, m, metric, horizon, grace_period
+            )
+            # Sum up as `_mean_over_horizon` does.
+            y = 0.0
+            for j in range(horizon):
+                y = y + values[:, j]
+            z[rows] = y / horizon
+        others = np.flatnonzero(~supported)
+        if len(others):
+            ids = None if row_ids is None else [row_ids[i] for i in others]
+            z[others], _ = evaluate_rows(self, X=X[others], **self._row_kwargs("_fun_hw_row", ids))
+        return z, [{} for _ in range(X.shape[0])]
+
+    async def aevaluate(self, fun_name, X, fun_control=None):
+        """Evaluate the candidates of an objective function without blocking the event loop.
+
+        The candidates are evaluated as by the objective function `fun_name`, e.g., `"fun_hw"`, on
+        `fun_control["executor"]` or on `fun_control["n_jobs"]` worker processes, see
+        `aevaluate_rows`. At most `fun_control["max_concurrency"]` candidates are evaluated at the
+        same time. Candidates that take longer than `fun_control["timeout"]` seconds are reported
+        with the value `nan` and the information `{"timed_out": True}`. They are not cached, nor
+        are candidates that exceeded their budget.
+        Cached candidates, see `fun_control["result_cache"]`, are yielded first.
+
+        Args:
+            fun_name (str): name of the objective function, see `OBJECTIVES`.
+            X (array): design matrix.
+            fun_control (dict): parameters that are not optimized, see the objective function.
+
+        Yields:
+            (tuple): the row index of the candidate in `X`, its objective function value and its
+                information, in completion order.
+
+        Examples:
+            >>> import asyncio
+            >>> import numpy as np
+            >>> from spotRiver.data import AirlinePassengers
+            >>> from spotRiver.fun.hyperriver import HyperRiver
+            >>> async def tune():
+            ...     X = np.array([[0.3, 0.1, 0.6, 12, 0], [0.5, 0.1, 0.6, 12, 1]])
+            ...     fun_control = {"data": AirlinePassengers(), "horizon": 12, "max_concurrency": 2}
+            ...     return [i async for i, y, info in HyperRiver().aevaluate("fun_hw", X, fun_control)]
+            >>> sorted(asyncio.run(tune()))
+            [0, 1]
+        """
+        if fun_name not in OBJECTIVES:
+            raise ValueError(f"Unknown objective function {fun_name!r}, expected one of {list(OBJECTIVES)}.")
+        method_name, casts = OBJECTIVES[fun_name]
+        self.fun_control.update(fun_control or {})
+        X = np.atleast_2d(X)
+        if X.shape[1] != len(casts):
+            raise ValueError(f"{fun_name} expects {len(casts)} hyperparameters, got {X.shape[1]}.")
+        cache = self._get_result_cache()
+        fingerprint = self._get_fingerprint() if cache is not None else None
+        # Row indices per key. Only the first row of a key that is not cached is evaluated.
+        rows = {}
+        for i, key in enumerate(self._cache_keys(method_name, X, casts, fingerprint)):
+            rows.setdefault(key, []).append(i)
+        todo = {}
+        for key, indices in rows.items():
+            if fingerprint is not None and key in cache:
+                y, info = cache.get(key)
+                for i in indices:
+                    yield i, y, {**info, "cached": True}
+            else:
+                todo[indices[0]] = key
+        row_ids = list(todo)
+        kwargs = self._row_kwargs(method_name, row_ids)
+        kwargs.update(max_concurrency=self.fun_control["max_concurrency"], timeout=self.fun_control["timeout"])
+        async for j, y, info in aevaluate_rows(self, X=X[row_ids], **kwargs):
+            key = todo[row_ids[j]]
+            if fingerprint is not None and _cacheable(info):
+                cache.put(key, y, info)
+            first, *duplicates = rows[key]
+            yield first, y, info
+            for i in duplicates:
+                yield i, y, {**info, "cached": True}
+
+    @staticmethod
+    def _cache_keys(method_name, X, casts, fingerprint):
+        """Return the result cache keys of the rows of `X`, or the row indices if `fingerprint` is `None`."""
+        if fingerprint is None:
+            return range(len(X))
+        return [ResultCache.key(method_name, tuple(c(v) for c, v in zip(casts, x)), fingerprint) for x in X]
+
+    async def _agather(self, fun_name, X, fun_control):
+        """Collect the results of `aevaluate` in the order of the rows of `X`."""
+        results = {}
+        async for i, y, info in self.aevaluate(fun_name, X, fun_control):
+            results[i] = (y, info)
+        z_res = np.array([results[i][0] for i in range(len(results))], dtype=float)
+        self.candidate_info = [results[i][1] for i in range(len(results))]
+        return z_res
+
+    async def afun_snarimax(self, X, fun_control=None):
+        """Asynchronous variant of `fun_snarimax`, see `aevaluate`."""
+        return await self._agather("fun_snarimax", X, fun_control)
+
+    async def afun_hw(self, X, fun_control=None):
+        """Asynchronous variant of `fun_hw`, see `aevaluate`."""
+        return await self._agather("fun_hw", X, fun_control)
+
+    async def afun_HTR_iter_progressive(self, X, fun_control=None):
+        """Asynchronous variant of `fun_HTR_iter_progressive`, see `aevaluate`."""
+        return await self._agather("fun_HTR_iter_progressive", X, fun_control)
+
+    def _profiled_row(self, x, row_id):
+        """Evaluate one row with `self._profiled_method` and record its phase timings.
+
+        The timings are stored in the entry "profile" of the row information, together with the
+        total time and, for the candidates selected by `fun_control["profile_candidates"]`, the
+        cProfile and tracemalloc reports, see `spotRiver.utils.profiling.capture`.
+
+        Args:
+            x (array): hyperparameters.
+            row_id (int): index of the row in the design matrix.
+
+        Returns:
+            (tuple): objective function value and row information.
+        """
+        candidates = self.fun_control["profile_candidates"]
+        selected = candidates is None or row_id in candidates
+        cprofile = selected and self.fun_control["profile_cprofile"]
+        profile_dir = self.fun_control["profile_dir"]
+        path = Path(profile_dir) / f"candidate_{row_id}.prof" if cprofile and profile_dir is not None else None
+        trace_memory = selected and self.fun_control["profile_tracemalloc"]
+        timer = PhaseTimer()
+        with capture(cprofile=cprofile, trace_memory=trace_memory, path=path) as report:
+            start = perf_counter()
+            result = getattr(self, self._profiled_method)(x, profiler=timer)
+            total = perf_counter() - start
+        y, info = result if isinstance(result, tuple) else (result, {})
+        return y, {**info, "profile": {"timings": timer.as_dict(), "total": total, **report}}
+
+    def _evaluate_forecaster(self, model, profiler=None, **kwargs):
+        """Evaluate a forecaster with `time_series.evaluate` on `fun_control["data"]`.
+
+        Args:
+            model: forecaster.
+            profiler (PhaseTimer): if set, the phases of the evaluation are timed.
+            kwargs: further arguments of `time_series.evaluate`, e.g., `grace_period`.
+
+        Returns:
+            (float): mean of the metric values over the horizon, or the penalty and the row
+                information if the candidate exceeds its budget, see `_over_budget`.
+        """
+        metric = self.fun_control["metric"]
+        horizon = self.fun_control["horizon"]
+        budget = self._get_budget()
+        if self.fun_control["backtest_origins"] is not None:
+            return self._backtest_forecaster(model, profiler, budget, **kwargs)
+        try:
+            if profiler is None:
+                data = self._budgeted(self._get_data(), budget)
+                res = time_series.evaluate(data, model, metric=metric, horizon=horizon, **kwargs)
+            else:
+                with profiler.phase("data.load"):
+                    data = self._budgeted(self._get_data(), budget)
+                with profiler.instrument(model):
+                    res = time_series.evaluate(
+                        profiler.iterate(data), model, metric=profiler.instrument_metric(metric), horizon=horizon,
+                        **kwargs
+                    )
+        except BudgetExceeded as err:
+            return self._over_budget(err)
+        return self._mean_over_horizon(res)
+
+    @staticmethod
+    def _mean_over_horizon(res):
+        """Return the mean of the metric values of a `time_series.HorizonMetric` over the horizon."""
+        y = res.metrics
+        z = 0.0
+        for j in range(len(y)):
+            z = z + y[j].get()
+        return z / len(y)
+
+    def _backtest_forecaster(self, model, profiler=None, budget=None, grace_period=None):
+        """Evaluate a forecaster with a rolling-origin backtest, see `fun_control["backtest_origins"]`.
+
+        Args:
+            model: forecaster.
+            profiler (PhaseTimer): if set, the phases of the backtest are timed.
+            budget (Budget): budget of the candidate.
+            grace_period (int): first origin if `fun_control["backtest_origins"]` is a number.
+
+        Returns:
+            (tuple): the mean of the window scores and the row information with the origins and the
+                scores of the windows (`"backtest"`). The score of a window is the mean of the metric
+                values over the horizon.
+        """
+        with nullcontext() if profiler is None else profiler.phase("data.load"):
+            data = list(self._get_data())
+        horizon = self.fun_control["horizon"]
+        try:
+            windows = rolling_origin_windows(
+                len(data), horizon, self.fun_control["backtest_origins"], self.fun_control["backtest_window"],
+                start=grace_period,
+            )
+            res = backtest_forecaster(
+                data, model, self.fun_control["metric"], horizon, windows, budget=budget, profiler=profiler
+            )
+        except BudgetExceeded as err:
+            return self._over_budget(err)
+        scores = [self._mean_over_horizon(horizon_metric) for horizon_metric in res]
+        return float(np.mean(scores)), {"backtest": {"windows": windows, "scores": scores}}
+
+    def _get_budget(self):
+        """Return the `Budget` of a candidate set by `fun_control["budget_time"]` and `["budget_memory"]`, or `None`."""
+        time_limit = self.fun_control["budget_time"]
+        memory_limit = self.fun_control["budget_memory"]
+        if time_limit is None and memory_limit is None:
+            return None
+        return Budget(time_limit=time_limit, memory_limit=memory_limit)
+
+    @staticmethod
+    def _budgeted(data, budget):
+        return data if budget is None else budget.wrap(data)
+
+    def _over_budget(self, err, info=None):
+        """Return `fun_control["budget_penalty"]` and the row information of a candidate that exceeded its budget.
+
+        The information contains the reason (`"budget_exceeded"`: "time" or "memory") and the time
+        in seconds and the memory in MB used until the evaluation was stopped (`"budget_used"`).
+        """
+        return self.fun_control["budget_penalty"], {**(info or {}), "budget_exceeded": err.reason,
+                                                    "budget_used": err.used}
+
+    def _get_result_cache(self):
+        """Return the `ResultCache` of `fun_control["result_cache"]`, which may also be a path."""
+        cache = self.fun_control["result_cache"]
+        if cache is None or isinstance(cache, ResultCache):
+            return cache
+        self.fun_control["result_cache"] = ResultCache(cache)
+        return self.fun_control["result_cache"]
+
+    def _get_dataset_fingerprint(self):
+        """Return the `dataset_fingerprint` of `fun_control["data"]`, computed once per dataset and process."""
+        data = self.fun_control["data"]
+        if self._fingerprint_cache[0] is not data:
+            self._fingerprint_cache = (data, dataset_fingerprint(data))
+        return self._fingerprint_cache[1]
+
+    def _get_fingerprint(self):
+        """Return a fingerprint of the dataset, the metric and the settings that affect the objective.
+
+        Returns:
+            (str): the fingerprint, or `None` if the dataset cannot be identified.
+        """
+        dataset = self._get_dataset_fingerprint()
+        if dataset is None:
+            return None
+        metric = self.fun_control["metric"]
+        settings = [
+            self.fun_control.get(k)
+            for k in ("horizon", "grace_period", "n_samples", "early_stopping", "early_stopping_min_candidates",
+                      "backtest_origins", "backtest_window")
+        ]
+        return repr((dataset, type(metric).__qualname__, metric._get_params(), settings))
+
+    def _get_stop_rule(self):
+        """Return the stop rule for `eval_oml_iter_progressive` selected by `fun_control["early_stopping"]`.
+
+        The "median" rule stops a candidate at a checkpoint if its running error is larger than the
+        median of the running errors of the completed candidates at the same checkpoint. The rule is
+        only applied if at least `fun_control["early_stopping_min_candidates"]` candidates are completed.
+        """
+        if self.fun_control["early_stopping"] is None:
+            return None
+        if self.fun_control["early_stopping"] != "median":
+            raise ValueError(f"Unknown early stopping rule {self.fun_control['early_stopping']!r}.")
+        min_candidates = self.fun_control["early_stopping_min_candidates"]
+        history = self._get_stopping_history()
+
+        def stop_rule(model_name, step, error):
+            errors = history.get(step, [])
+            return len(errors) >= min_candidates and error > np.median(errors)
+
+        return stop_rule
+
+    def _get_stopping_history(self):
+        """Return the error series of the completed candidates on the current dataset and settings.
+
+        The series are kept per fingerprint, see `_get_fingerprint`, so that candidates are only
+        compared with candidates on the same data. Datasets without a fingerprint are identified
+        by the object.
+
+        Returns:
+            (dict): list of running errors per checkpoint.
+        """
+        key = self._get_fingerprint()
+        if key is None:
+            key = ("object", id(self.fun_control["data"]))
+        return self._stopping_history.setdefault(key, {})
+
+    def _complete_error_series(self, result, step):
+        """Record the error series of a completed candidate or extrapolate the series of a stopped one.
+
+        The series of a stopped candidate is extended to the number of checkpoints of a full run by
+        holding its last running error.
+
+        Returns:
+            (dict): the result with the (extrapolated) error series.
+        """
+        if not result.get("stopped", False):
+            history = self._get_stopping_history()
+            for s, e in zip(result["step"], result["error"]):
+                history.setdefault(s, []).append(e)
+            return result
+        n_samples = self.fun_control["n_samples"]
+        n_checkpoints = -(-n_samples // step) if n_samples >= step else 0
+        errors = result["error"]
+        return {**result, "error": errors + errors[-1:] * (n_checkpoints - len(errors))}
+
+    def _get_data(self):
+        """Return `fun_control["data"]`, materialized if `fun_control["cache_data"]` is set."""
+        if self.fun_control["cache_data"]:
+            return materialize(self.fun_control["data"])
+        return self.fun_control["data"]
+
+    def _preprocess(self, data, preprocessor):
+        """Return `data` transformed by `preprocessor`, see `fun_control["shared_preprocessing"]`."""
+        shared_preprocessing = self.fun_control["shared_preprocessing"]
+        if shared_preprocessing not in ("sparse", "dict"):
+            raise ValueError(f"Unknown shared preprocessing storage {shared_preprocessing!r}.")
+        return preprocess(
+            data, preprocessor, sparse=shared_preprocessing == "sparse", fingerprint=self._get_dataset_fingerprint()
+        )
+
+    def _snapshot_path(self, name, x, casts, *parts):
+        """Return the snapshot file of the candidate `x` in `fun_control["snapshot_dir"]`, or `None`.
+
+        The file name is derived from the cast hyperparameters and further `parts` that affect the
+        model, e.g., the step.
+        """
+        snapshot_dir = self.fun_control["snapshot_dir"]
+        if snapshot_dir is None:
+            return None
+        key = ResultCache.key(name, tuple(c(v) for c, v in zip(casts, x)), *parts)
+        return Path(snapshot_dir) / f"{name}_{key}.pkl"
+
+    def _get_prefix_digests(self, data, step):
+        """Return the prefix digests of `data`, see `_prefix_digests`.
+
+        They identify the stream of a snapshot and are computed once per dataset and process.
+        """
+        if self._prefix_digest_cache[0] is not data or self._prefix_digest_cache[1] != step:
+            self._prefix_digest_cache = (data, step, _prefix_digests(data, step))
+        return self._prefix_digest_cache[2]
+
+    def _load_snapshot(self, path, data, step):
+        """Load a snapshot if it exists and if `data` extends the stream the snapshot was taken on.
+
+        Returns:
+            (dict): the snapshot with the entries `model`, `metric`, `n_seen` and `result`, or `None`.
+        """
+        if path is None or not path.is_file():
+            return None
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return None
+        if self._get_prefix_digests(data, step).get(snapshot["n_seen"]) != snapshot["prefix_digest"]:
+            return None
+        snapshot["model"], snapshot["metric"] = pickle.loads(snapshot.pop("state"))
+        return snapshot
+
+    def _snapshot_taker(self, taken, step):
+        """Return an `on_checkpoint` callback that keeps a snapshot of the last checkpoint at a multiple of `step`.
+
+        The model and the metric are pickled immediately, because they keep learning afterwards. The
+        methods timed by the profiler are not pickled.
+        """
+
+        def on_checkpoint(model_name, checkpoint, model, metric):
+            if checkpoint["step"] % step == 0:
+                taken["n_seen"] = checkpoint["step"]
+                with uninstrumented(model, metric):
+                    taken["state"] = pickle.dumps((model, metric))
+
+        return on_checkpoint
+
+    def _save_snapshot(self, path, data, step, taken, result):
+        """Persist the snapshot of the last checkpoint at a multiple of `step`, see `_snapshot_taker`."""
+        if "n_seen" not in taken:
+            return
+        n_seen = taken["n_seen"]
+        k = result["step"].index(n_seen) + 1
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "state": taken["state"],
+            "n_seen": n_seen,
+            "prefix_digest": self._get_prefix_digests(data, step)[n_seen],
+            "result": {key: result[key][:k] for key in ("step", "error", "r_time", "memory")},
+        }
+        with atomic_write(path) as f:
+            pickle.dump(snapshot, f)
 
     # def get_month_distances(x):
     #     return {
@@ -160,6 +782,59 @@ class HyperRiver:
 
                 3. `data`: dataset. Default `AirlinePassengers`.
 
+                4. `n_jobs`: (int) Number of worker processes used to evaluate the rows of `X`.
+                    `None` (default) evaluates the rows serially, `-1` uses all CPUs.
+
+                5. `executor`: (concurrent.futures.Executor) Executor used to evaluate the rows of `X`.
+                    Takes precedence over `n_jobs`.
+
+                6. `cache_data`: (bool) If `True` (default), file based datasets are parsed once
+                    and replayed from memory for every candidate.
+
+                7. `result_cache`: (ResultCache or str) Cache of objective function values, or the path of
+                    a JSON lines file that persists the cache. Hyperparameter vectors that are equal after
+                    casting, e.g., `p=1.2` and `p=1.4`, are only evaluated once. Default `None`.
+
+                8. `profile`: (bool) If `True`, the time spent in loading and iterating the data, the
+                    feature extraction, the predictions and updates of the model and the metric updates
+                    is recorded per candidate in `self.candidate_info[i]["profile"]`, see
+                    `spotRiver.utils.profiling.export_timings`. The objective values do not change.
+                    Default `False`.
+
+                9. `profile_cprofile`, `profile_tracemalloc`: (bool) If `profile` is set, additionally
+                    capture a cProfile report and the traced memory allocations of the candidates.
+                    Default `False`.
+
+                10. `profile_candidates`: (list) Row indices of `X` for which cProfile and tracemalloc
+                    reports are captured. `None` (default) selects all rows.
+
+                11. `profile_dir`: (str) If set, the cProfile statistics are dumped to
+                    `<profile_dir>/candidate_<i>.prof`. Default `None`.
+
+                12. `max_concurrency`, `timeout`: Limits of the asynchronous variants, e.g.,
+                    `afun_snarimax`, see `aevaluate`. Default `None`.
+
+                13. `budget_time`, `budget_memory`, `budget_penalty`: Budget of every candidate. The
+                    evaluation of a candidate is stopped when it takes longer than `budget_time`
+                    seconds or when the resident set size of the process grows by more than
+                    `budget_memory` MB, see `spotRiver.utils.budget.Budget`. The budget is checked
+                    between two samples. The candidate gets the value `budget_penalty` (default `nan`),
+                    and the reason ("time" or "memory") and the used resources are stored as
+                    `"budget_exceeded"` and `"budget_used"` in `self.candidate_info`. Such results are
+                    not cached. Default `None`, i.e., no budget.
+
+                14. `backtest_origins`: (int or list) If set, the candidates are scored with a rolling-origin
+                    backtest instead of a single pass: for every origin, the model learns the series up
+                    to the origin and is evaluated on the window that starts there, see
+                    `spotRiver.evaluation.backtest`. An int places that many origins evenly, starting at
+                    the `grace_period`, a list gives the origins. The objective value is the mean of the
+                    window scores, which are stored with the windows as `"backtest"` in
+                    `self.candidate_info`. The state learned up to the origins is computed once per
+                    candidate and shared by the windows. Default `None`.
+
+                15. `backtest_window`: (int) Number of steps per window. `None` (default) ends every window
+                    at the next origin.
+
         Returns:
             (float): objective function value. Mean of the MAEs of the predicted values.
         """
@@ -171,67 +846,57 @@ class HyperRiver:
             X = np.array([X])
         if X.shape[1] != 12:
             raise Exception
-        p = X[:, 0]
-        d = X[:, 1]
-        q = X[:, 2]
-        m = X[:, 3]
-        sp = X[:, 4]
-        sd = X[:, 5]
-        sq = X[:, 6]
-        lr = X[:, 7]
-        intercept_lr = X[:, 8]
-        hour = X[:, 9]
-        weekday = X[:, 10]
-        month = X[:, 11]
+        return self._evaluate_rows("_fun_snarimax_row", X, SNARIMAX_CASTS)
+
+    def _fun_snarimax_row(self, x, profiler=None):
+        """Evaluate one hyperparameter vector of `fun_snarimax`.
+
+        Args:
+            x (array): twelve hyperparameters, see `fun_snarimax`.
+            profiler (PhaseTimer): if set, the phases of the evaluation are timed.
 
+        Returns:
+            (float): mean of the metric values over the horizon.
+        """
+        p, d, q, m, sp, sd, sq, lr, intercept_lr, hour, weekday, month = x
         # TODO:
         # horizon = fun_control["horizon"]
         # future = [
         #   {"month": dt.date(year=1961, month=m, day=1)} for m in range(1, horizon + 1)
         # ]
-        z_res = np.array([], dtype=float)
-        for i in range(X.shape[0]):
-            h_i = int(hour[i])
-            w_i = int(weekday[i])
-            m_i = int(month[i])
-            # baseline:
-            extract_features = compose.TransformerUnion(get_ordinal_date)
-            if h_i:
-                extract_features = compose.TransformerUnion(get_ordinal_date, get_hour_distances)
-            if w_i:
-                extract_features = compose.TransformerUnion(extract_features, get_weekday_distances)
-            if m_i:
-                extract_features = compose.TransformerUnion(extract_features, get_month_distances)
-            model = compose.Pipeline(
-                extract_features,
-                time_series.SNARIMAX(
-                    p=int(p[i]),
-                    d=int(d[i]),
-                    q=int(q[i]),
-                    m=int(m[i]),
-                    sp=int(sp[i]),
-                    sd=int(sd[i]),
-                    sq=int(sq[i]),
-                    regressor=compose.Pipeline(
-                        preprocessing.StandardScaler(),
-                        linear_model.LinearRegression(
-                            intercept_init=0,
-                            optimizer=optim.SGD(float(lr[i])),
-                            intercept_lr=float(intercept_lr[i]),
-                        ),
+        h_i = int(hour)
+        w_i = int(weekday)
+        m_i = int(month)
+        # baseline:
+        extract_features = compose.TransformerUnion(get_ordinal_date)
+        if h_i:
+            extract_features = compose.TransformerUnion(get_ordinal_date, get_hour_distances)
+        if w_i:
+            extract_features = compose.TransformerUnion(extract_features, get_weekday_distances)
+        if m_i:
+            extract_features = compose.TransformerUnion(extract_features, get_month_distances)
+        model = compose.Pipeline(
+            extract_features,
+            time_series.SNARIMAX(
+                p=int(p),
+                d=int(d),
+                q=int(q),
+                m=int(m),
+                sp=int(sp),
+                sd=int(sd),
+                sq=int(sq),
+                regressor=compose.Pipeline(
+                    preprocessing.StandardScaler(),
+                    linear_model.LinearRegression(
+                        intercept_init=0,
+                        optimizer=optim.SGD(float(lr)),
+                        intercept_lr=float(intercept_lr),
                     ),
                 ),
-            )
-            # eval:
-            res = time_series.evaluate(
-                self.fun_control["data"], model, metric=self.fun_control["metric"], horizon=self.fun_control["horizon"]
-            )
-            y = res.metrics
-            z = 0.0
-            for j in range(len(y)):
-                z = z + y[j].get()
-            z_res = np.append(z_res, z / len(y))
-        return z_res
+            ),
+        )
+        # eval:
+        return self._evaluate_forecaster(model, profiler)
 
     def fun_hw(self, X, fun_control=None):
         """Hyperparameter Tuning of the HoltWinters model.
@@ -257,6 +922,21 @@ class HyperRiver:
                     producing meaningful forecasts.
                     The value of this parameter is equal to the `horizon` by default.
                 2. `data`: dataset. Default `AirlinePassengers`.
+                3. `n_jobs`: (int) Number of worker processes used to evaluate the rows of `X`.
+                4. `executor`: (concurrent.futures.Executor) Executor used to evaluate the rows of `X`.
+                5. `cache_data`: (bool) If `True` (default), the dataset is parsed once and replayed from memory.
+                6. `result_cache`: (ResultCache or str) Cache of objective function values, see `fun_snarimax`.
+                7. `profile`, `profile_cprofile`, `profile_tracemalloc`, `profile_candidates`, `profile_dir`:
+                    Phase timings and profiles of the candidates, see `fun_snarimax`.
+                8. `budget_time`, `budget_memory`, `budget_penalty`: Budget of every candidate, see `fun_snarimax`.
+                9. `backtest_origins`, `backtest_window`: Rolling-origin backtest, see `fun_snarimax`.
+                10. `engine`: (str) "river" (default) evaluates every candidate with `time_series.HoltWinters`.
+                    "numpy" evaluates all candidates with the same `seasonality` and `multiplicative` at
+                    once with NumPy arrays over the candidates, see `evaluate_holt_winters`. It supports
+                    the metrics MAE, MSE and RMSE and gives the same objective values, up to rounding
+                    for MSE and RMSE. `n_jobs` and `executor` are not used for the batches. Candidates
+                    that the batch does not support, and all candidates if `profile`, a budget or a
+                    backtest is set, are evaluated by the "river" engine.
 
         Returns:
             (float): objective function value. Mean of the MAEs of the predicted values.
@@ -268,34 +948,27 @@ class HyperRiver:
             X = np.array([X])
         if X.shape[1] != 5:
             raise Exception
+        return self._evaluate_rows("_fun_hw_row", X, HW_CASTS)
 
-        alpha = X[:, 0]
-        beta = X[:, 1]
-        gamma = X[:, 2]
-        seasonality = X[:, 3]
-        multiplicative = X[:, 4]
-        z_res = np.array([], dtype=float)
-        for i in range(X.shape[0]):
-            model = time_series.HoltWinters(
-                alpha=alpha[i],
-                beta=beta[i],
-                gamma=gamma[i],
-                seasonality=int(seasonality[i]),
-                multiplicative=int(multiplicative[i]),
-            )
-            res = time_series.evaluate(
-                self.fun_control["data"],
-                model,
-                metric=self.fun_control["metric"],
-                horizon=self.fun_control["horizon"],
-                grace_period=self.fun_control["grace_period"],
-            )
-            y = res.metrics
-            z = 0.0
-            for j in range(len(y)):
-                z = z + y[j].get()
-            z_res = np.append(z_res, z / len(y))
-        return z_res
+    def _fun_hw_row(self, x, profiler=None):
+        """Evaluate one hyperparameter vector of `fun_hw`.
+
+        Args:
+            x (array): five hyperparameters, see `fun_hw`.
+            profiler (PhaseTimer): if set, the phases of the evaluation are timed.
+
+        Returns:
+            (float): mean of the metric values over the horizon.
+        """
+        alpha, beta, gamma, seasonality, multiplicative = x
+        model = time_series.HoltWinters(
+            alpha=alpha,
+            beta=beta,
+            gamma=gamma,
+            seasonality=int(seasonality),
+            multiplicative=int(multiplicative),
+        )
+        return self._evaluate_forecaster(model, profiler, grace_period=self.fun_control["grace_period"])
 
     def fun_HTR_iter_progressive(self, X, fun_control=None):
         """Hyperparameter Tuning of HTR model.
@@ -360,6 +1033,40 @@ class HyperRiver:
                         producing meaningful forecasts.
                         The value of this parameter is equal to the `horizon` by default.
                 3. `data`: dataset. Default `AirlinePassengers`.
+                4. `n_jobs`: (int) Number of worker processes used to evaluate the rows of `X`.
+                5. `executor`: (concurrent.futures.Executor) Executor used to evaluate the rows of `X`.
+                6. `cache_data`: (bool) If `True` (default), the dataset is parsed once and replayed from memory.
+                7. `measure_time`, `measure_memory`: (bool) Passed to `eval_oml_iter_progressive`.
+                    Both default to `False`, because only the error series is used.
+                8. `early_stopping`: (str) If "median", a candidate is stopped at a checkpoint if its
+                    running error is worse than the median of the completed candidates at the same
+                    checkpoint, see `_get_stop_rule`. Its objective is computed from its error series
+                    extended by its last running error. Completed candidates are remembered across
+                    calls on the same data and settings, but not across worker processes. Default `None`.
+                9. `early_stopping_min_candidates`: (int) Number of completed candidates that are
+                    needed before candidates are stopped. Default 3.
+                10. `result_cache`: (ResultCache or str) Cache of objective function values, see `fun_snarimax`.
+                11. `profile`, `profile_cprofile`, `profile_tracemalloc`, `profile_candidates`, `profile_dir`:
+                    Phase timings and profiles of the candidates, see `fun_snarimax`. The timings
+                    additionally contain the memory measurements ("memory").
+                12. `snapshot_dir`: (str) If set, the model and the metric of every candidate that is not
+                    stopped are saved at its last checkpoint at a multiple of the step (10000 samples).
+                    A later call with the same hyperparameters on a longer prefix of the same stream
+                    resumes from the snapshot and learns only the new samples. Its error series and
+                    objective value are the same as those of an evaluation from scratch. The number of
+                    samples learned before is stored as `"resumed_from"` in `self.candidate_info`.
+                    Default `None`.
+                13. `shared_preprocessing`: (str) If set, the scaler and the feature hasher, which do not
+                    depend on the hyperparameters, are applied once per dataset and process in the
+                    progressive order, and all candidates are fed with the transformed features,
+                    see `PreprocessedDataset`. "sparse" stores the features in compressed sparse row
+                    format, "dict" as dictionaries. The objective values are the same as without
+                    shared preprocessing. Default `None`.
+                14. `budget_time`, `budget_memory`, `budget_penalty`: Budget of every candidate, see
+                    `fun_snarimax`. The penalty is returned as it is, i.e., it is not divided by `n_samples`.
+
+            The number of samples consumed by each candidate and whether it was stopped are stored
+            in `self.candidate_info`.
 
         Returns
         -------
@@ -372,66 +1079,95 @@ class HyperRiver:
             X = np.array([X])
         if X.shape[1] != 11:
             raise Exception
-        grace_period = X[:, 0]
-        max_depth = X[:, 1]
-        delta = X[:, 2]
-        tau = X[:, 3]
-        leaf_prediction = X[:, 4]
-        leaf_model = X[:, 5]
-        model_selector_decay = X[:, 6]
-        splitter = X[:, 7]
-        min_samples_split = X[:, 8]
-        binary_split = X[:, 9]
-        max_size = X[:, 10]
-        z_res = np.array([], dtype=float)
+        return self._evaluate_rows("_fun_HTR_iter_progressive_row", X, HTR_CASTS)
+
+    def _fun_HTR_iter_progressive_row(self, x, profiler=None):
+        """Evaluate one hyperparameter vector of `fun_HTR_iter_progressive`.
+
+        Args:
+            x (array): eleven hyperparameters, see `fun_HTR_iter_progressive`.
+            profiler (PhaseTimer): if set, the phases of the evaluation are timed.
+
+        Returns:
+            (float): median error divided by `fun_control["n_samples"]`, `np.nan` if the evaluation failed.
+        """
+        (grace_period, max_depth, delta, tau, leaf_prediction, leaf_model, model_selector_decay, splitter,
+         min_samples_split, binary_split, max_size) = x
         verbose = False
         if self.fun_control["verbosity"] > 0:
             verbose = True
-        for i in range(X.shape[0]):
-            if self.fun_control["verbosity"] > 1:
-                print("grace_period", int(grace_period[i]))
-                print("max_depth", select_max_depth(int(max_depth[i])))
-                print("delta", float(delta[i]))
-                print("tau", float(tau[i]))
-                print("leaf_prediction", select_leaf_prediction(int(leaf_prediction[i])))
-                print("leaf_model", select_leaf_model(int(leaf_model[i])))
-                print("model_selector_decay", float(model_selector_decay[i]))
-                print("splitter", select_splitter(int(splitter[i])))
-                print("min_samples_split", int(min_samples_split[i]))
-                print("binary_split", int(binary_split[i]))
-                print("max_size", float(max_size[i]))
-            num = compose.SelectType(numbers.Number) | preprocessing.StandardScaler()
-            # cat = compose.SelectType(str) | preprocessing.OneHotEncoder()
-            cat = compose.SelectType(str) | preprocessing.FeatureHasher(n_features=1000, seed=1)
-            try:
-                res = eval_oml_iter_progressive(
-                    dataset=self.fun_control["data"],
-                    step=10000,
-                    verbose=verbose,
-                    metric=metrics.MAE(),
-                    models={
-                        "HTR": (
-                            (num + cat)
-                            | tree.HoeffdingTreeRegressor(
-                                grace_period=int(grace_period[i]),
-                                max_depth=select_max_depth(int(max_depth[i])),
-                                delta=float(delta[i]),
-                                tau=float(tau[i]),
-                                leaf_prediction=select_leaf_prediction(int(leaf_prediction[i])),
-                                leaf_model=select_leaf_model(int(leaf_model[i])),
-                                model_selector_decay=float(model_selector_decay[i]),
-                                splitter=select_splitter(int(splitter[i])),
-                                min_samples_split=int(min_samples_split[i]),
-                                binary_split=int(binary_split[i]),
-                                max_size=float(max_size[i])
-                            )
-                        ),
-                    },
+        if self.fun_control["verbosity"] > 1:
+            print("grace_period", int(grace_period))
+            print("max_depth", select_max_depth(int(max_depth)))
+            print("delta", float(delta))
+            print("tau", float(tau))
+            print("leaf_prediction", select_leaf_prediction(int(leaf_prediction)))
+            print("leaf_model", select_leaf_model(int(leaf_model)))
+            print("model_selector_decay", float(model_selector_decay))
+            print("splitter", select_splitter(int(splitter)))
+            print("min_samples_split", int(min_samples_split))
+            print("binary_split", int(binary_split))
+            print("max_size", float(max_size))
+        num = compose.SelectType(numbers.Number) | preprocessing.StandardScaler()
+        # cat = compose.SelectType(str) | preprocessing.OneHotEncoder()
+        cat = compose.SelectType(str) | preprocessing.FeatureHasher(n_features=1000, seed=1)
+        step = 10000
+        info = {"n_samples": 0, "stopped": False}
+        budget = self._get_budget()
+        try:
+            data = self._get_data()
+            shared_preprocessing = self.fun_control["shared_preprocessing"]
+            snapshot_path = self._snapshot_path("HTR", x, HTR_CASTS, step, shared_preprocessing)
+            snapshot = self._load_snapshot(snapshot_path, data, step)
+            if snapshot is None:
+                model = tree.HoeffdingTreeRegressor(
+                    grace_period=int(grace_period),
+                    max_depth=select_max_depth(int(max_depth)),
+                    delta=float(delta),
+                    tau=float(tau),
+                    leaf_prediction=select_leaf_prediction(int(leaf_prediction)),
+                    leaf_model=select_leaf_model(int(leaf_model)),
+                    model_selector_decay=float(model_selector_decay),
+                    splitter=select_splitter(int(splitter)),
+                    min_samples_split=int(min_samples_split),
+                    binary_split=int(binary_split),
+                    max_size=float(max_size)
                 )
-                y = fun_eval_oml_iter_progressive(res, metric=None)
-            except Exception as err:
-                y = np.nan
-                print(f"Error in fun(). Call to evaluate failed. {err=}, {type(err)=}")
-                print(f"Setting y to {y:.2f}.")
-            z_res = np.append(z_res, y / self.fun_control["n_samples"])
-        return z_res
+                model = Preprocessed(model) if shared_preprocessing else (num + cat) | model
+                resume = {}
+            else:
+                model = snapshot["model"]
+                resume = {"start": snapshot["n_seen"], "resume_metrics": {"HTR": snapshot["metric"]}}
+                info["resumed_from"] = snapshot["n_seen"]
+            taken = {}
+            if snapshot_path is not None:
+                resume["on_checkpoint"] = self._snapshot_taker(taken, step)
+            res = eval_oml_iter_progressive(
+                dataset=self._preprocess(data, num + cat) if shared_preprocessing else data,
+                step=step,
+                verbose=verbose,
+                cache_data=self.fun_control["cache_data"],
+                measure_time=self.fun_control["measure_time"],
+                measure_memory=self.fun_control["measure_memory"],
+                stop_rule=self._get_stop_rule(),
+                profiler=profiler,
+                metric=metrics.MAE(),
+                models={"HTR": model},
+                budget=budget,
+                **resume,
+            )
+            if snapshot is not None:
+                res["HTR"] = _prepend_result(snapshot["result"], res["HTR"])
+            if snapshot_path is not None and not res["HTR"].get("stopped", False):
+                self._save_snapshot(snapshot_path, data, step, taken, res["HTR"])
+            info["n_samples"] = res["HTR"]["step"][-1] if res["HTR"]["step"] else 0
+            info["stopped"] = res["HTR"].get("stopped", False)
+            res["HTR"] = self._complete_error_series(res["HTR"], step)
+            y = fun_eval_oml_iter_progressive(res, metric=None)[0]
+        except BudgetExceeded as err:
+            return self._over_budget(err, info)
+        except Exception as err:
+            y = np.nan
+            print(f"Error in fun(). Call to evaluate failed. {err=}, {type(err)=}")
+            print(f"Setting y to {y:.2f}.")
+        return y / self.fun_control["n_samples"], info
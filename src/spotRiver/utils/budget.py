@@ -0,0 +1,130 @@
+import os
+import sys
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Reasons of `BudgetExceeded`.
+TIME = "time"
+MEMORY = "memory"
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # Windows
+    _PAGE_SIZE = None
+
+
+class BudgetExceeded(Exception):
+    """Raised when a candidate exceeds its time or memory budget, see `Budget`.
+
+    Args:
+        reason (str): `"time"` or `"memory"`.
+        used (dict): the time in seconds and the memory in MB used when the budget was exceeded.
+    """
+
+    def __init__(self, reason, used):
+        super().__init__(f"{reason} budget exceeded: {used}")
+        self.reason = reason
+        self.used = used
+
+
+def rss_mb():
+    """Return the resident set size of the process in MB.
+
+    The current size is read from `/proc/self/statm`. Where it does not exist, the peak size of
+    `resource.getrusage` is returned, which is an upper bound of the current size. Returns `nan`
+    if neither is available.
+    """
+    if _PAGE_SIZE is not None:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * _PAGE_SIZE * 2**-20
+        except OSError:
+            pass
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return peak * 2**-20 if sys.platform == "darwin" else peak * 2**-10
+
+
+class Budget:
+    """Wall-clock time and memory budget of the evaluation of a candidate.
+
+    The budget is checked while the candidate consumes its data, see `wrap`. The time is checked
+    for every sample, the memory every `check_every` samples, because reading the resident set
+    size is a system call. An evaluation that exceeds its budget is stopped with a
+    `BudgetExceeded` exception.
+
+    The memory budget limits the growth of the resident set size of the process since `start`.
+    Candidates that are evaluated in threads of the same process share the resident set size.
+
+    Args:
+        time_limit (float): seconds. `None` does not limit the time.
+        memory_limit (float): MB. `None` does not limit the memory.
+        check_every (int): number of samples between two memory checks.
+
+    Examples:
+        >>> budget = Budget(time_limit=60)
+        >>> sum(1 for _ in budget.wrap(range(1000)))
+        1000
+    """
+
+    def __init__(self, time_limit=None, memory_limit=None, check_every=100):
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.check_every = check_every
+        self.start()
+
+    def start(self):
+        """Start the budget, e.g., when the evaluation of the candidate starts."""
+        self.started = perf_counter()
+        self.rss_start = rss_mb() if self.memory_limit is not None else None
+
+    def used(self):
+        """Return the time in seconds and the memory in MB used since `start`."""
+        memory = rss_mb() - self.rss_start if self.rss_start is not None else None
+        return {"time": perf_counter() - self.started, "memory": memory}
+
+    def check(self, memory=True):
+        """Raise `BudgetExceeded` if the budget is exceeded.
+
+        Args:
+            memory (bool): whether to check the memory, too.
+        """
+        if self.time_limit is not None and perf_counter() - self.started > self.time_limit:
+            raise BudgetExceeded(TIME, self.used())
+        if memory and self.memory_limit is not None and rss_mb() - self.rss_start > self.memory_limit:
+            raise BudgetExceeded(MEMORY, self.used())
+
+    def wrap(self, dataset):
+        """Return `dataset` with budget checks before every sample, see `BudgetedDataset`."""
+        return BudgetedDataset(dataset, self)
+
+
+class BudgetedDataset:
+    """Dataset whose iteration checks a `Budget` before every sample.
+
+    Mini-batches of an `ArrayDataset` check the budget once per `batch` call.
+    """
+
+    def __init__(self, dataset, budget):
+        self.dataset = dataset
+        self.budget = budget
+
+    def __iter__(self):
+        budget = self.budget
+        check_every = budget.check_every
+        for i, sample in enumerate(self.dataset):
+            budget.check(memory=i % check_every == 0)
+            yield sample
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def batch(self, start, stop):
+        self.budget.check()
+        return self.dataset.batch(start, stop)
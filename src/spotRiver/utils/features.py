@@ -1,23 +1,102 @@
 import calendar
 import math
 
+import numpy as np
+
+# There are only 12/7/24 possible distance vectors, so they are computed once.
+MONTH_NAMES = [calendar.month_name[month] for month in range(1, 13)]
+WEEKDAY_NAMES = [calendar.day_name[weekday] for weekday in range(0, 7)]
+HOUR_NAMES = [str(hour) for hour in range(0, 24)]
+
+_MONTH_MATRIX = np.exp(-((np.arange(1, 13)[:, None] - np.arange(1, 13)[None, :]) ** 2.0))
+_WEEKDAY_MATRIX = np.exp(-((np.arange(0, 7)[:, None] - np.arange(0, 7)[None, :]) ** 2.0))
+_HOUR_MATRIX = np.exp(-((np.arange(0, 24)[:, None] - np.arange(0, 24)[None, :]) ** 2.0))
+
+_MONTH_TABLE = {
+    m: {MONTH_NAMES[month - 1]: math.exp(-((m - month) ** 2)) for month in range(1, 13)} for m in range(1, 13)
+}
+_WEEKDAY_TABLE = {
+    w: {WEEKDAY_NAMES[weekday]: math.exp(-((w - weekday) ** 2)) for weekday in range(0, 7)} for w in range(0, 7)
+}
+_HOUR_TABLE = {h: {HOUR_NAMES[hour]: math.exp(-((h - hour) ** 2)) for hour in range(0, 24)} for h in range(0, 24)}
+
+
+def _first_value(x):
+    return next(iter(x.values()))
+
 
 def get_month_distances(x):
-    k = list(x.keys())[0]
-    return {calendar.month_name[month]: math.exp(-((x[k].month - month) ** 2)) for month in range(1, 13)}
+    return _MONTH_TABLE[_first_value(x).month].copy()
 
 
 def get_weekday_distances(x):
     # Monday is the first day, i.e., 0:
-    k = list(x.keys())[0]
-    return {calendar.day_name[weekday]: math.exp(-((x[k].weekday() - weekday) ** 2)) for weekday in range(0, 7)}
+    return _WEEKDAY_TABLE[_first_value(x).weekday()].copy()
 
 
 def get_hour_distances(x):
-    k = list(x.keys())[0]
-    return {str(hour): math.exp(-((x[k].hour - hour) ** 2)) for hour in range(0, 24)}
+    return _HOUR_TABLE[_first_value(x).hour].copy()
 
 
 def get_ordinal_date(x):
-    k = list(x.keys())[0]
-    return {"ordinal_date": x[k].toordinal()}
+    return {"ordinal_date": _first_value(x).toordinal()}
+
+
+def _to_datetime64(dates):
+    return np.asarray(dates, dtype="datetime64[s]")
+
+
+def get_month_distances_batch(dates):
+    """Batch version of `get_month_distances`.
+
+    Args:
+        dates (array-like): datetimes, e.g., a list of `datetime.datetime` or a `numpy.datetime64` array.
+
+    Returns:
+        (dict): one `numpy.ndarray` per month name with the distances of all dates.
+    """
+    months = _to_datetime64(dates).astype("datetime64[M]").astype(np.int64) % 12
+    distances = _MONTH_MATRIX[months]
+    return {name: distances[:, j] for j, name in enumerate(MONTH_NAMES)}
+
+
+def get_weekday_distances_batch(dates):
+    """Batch version of `get_weekday_distances`.
+
+    Args:
+        dates (array-like): datetimes, e.g., a list of `datetime.datetime` or a `numpy.datetime64` array.
+
+    Returns:
+        (dict): one `numpy.ndarray` per weekday name with the distances of all dates.
+    """
+    # 1970-01-01 was a Thursday, i.e., weekday 3:
+    weekdays = (_to_datetime64(dates).astype("datetime64[D]").astype(np.int64) + 3) % 7
+    distances = _WEEKDAY_MATRIX[weekdays]
+    return {name: distances[:, j] for j, name in enumerate(WEEKDAY_NAMES)}
+
+
+def get_hour_distances_batch(dates):
+    """Batch version of `get_hour_distances`.
+
+    Args:
+        dates (array-like): datetimes, e.g., a list of `datetime.datetime` or a `numpy.datetime64` array.
+
+    Returns:
+        (dict): one `numpy.ndarray` per hour with the distances of all dates.
+    """
+    hours = _to_datetime64(dates).astype("datetime64[h]").astype(np.int64) % 24
+    distances = _HOUR_MATRIX[hours]
+    return {name: distances[:, j] for j, name in enumerate(HOUR_NAMES)}
+
+
+def get_ordinal_date_batch(dates):
+    """Batch version of `get_ordinal_date`.
+
+    Args:
+        dates (array-like): datetimes, e.g., a list of `datetime.datetime` or a `numpy.datetime64` array.
+
+    Returns:
+        (dict): the ordinal dates as `numpy.ndarray`.
+    """
+    # The ordinal of 1970-01-01 is 719163:
+    return {"ordinal_date": _to_datetime64(dates).astype("datetime64[D]").astype(np.int64) + 719163}
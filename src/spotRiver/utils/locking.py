@@ -0,0 +1,136 @@
+"""File locks and atomic writes for the data home.
+
+Several tuning workers may download the same dataset or build the same cache entry at the same
+time. The first worker takes the lock of the entry and builds it, the others wait for the lock and
+reuse the result. Files are written to a temporary name in the same directory and renamed when they
+are complete, so readers never see partial files.
+
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def lock_path(path):
+    """Return the path of the lock file that guards `path`."""
+    path = Path(path)
+    return path.with_name(f".{path.name}.lock")
+
+
+class FileLock:
+    """Inter-process lock based on an advisory lock of a lock file.
+
+    The lock is exclusive between processes and between threads, because every acquisition opens
+    the lock file anew. It is not reentrant. The lock file itself is not removed.
+
+    Args:
+        path (str or Path): lock file. Its parent directory is created if necessary.
+        timeout (float): maximum number of seconds to wait for the lock. `None` waits forever.
+        poll_interval (float): seconds between two attempts to take the lock.
+
+    Examples:
+        >>> import tempfile
+        >>> from pathlib import Path
+        >>> with tempfile.TemporaryDirectory() as tmp:
+        ...     with FileLock(Path(tmp) / "data.lock") as lock:
+        ...         lock.is_locked
+        True
+    """
+
+    def __init__(self, path, timeout=None, poll_interval=0.05):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    @property
+    def is_locked(self):
+        return self._fd is not None
+
+    def _try_lock(self, fd):
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self):
+        """Wait for the lock and take it. Raise a `TimeoutError` if `timeout` is exceeded."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        start = time.monotonic()
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if self._try_lock(fd):
+                self._fd = fd
+                return self
+            os.close(fd)
+            if self.timeout is not None and time.monotonic() - start >= self.timeout:
+                raise TimeoutError(f"Could not acquire the lock {self.path} within {self.timeout} seconds.")
+            time.sleep(self.poll_interval)
+
+    def release(self):
+        """Release the lock."""
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def _tmp_path(path):
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path that is renamed to `path` if the body succeeds.
+
+    The temporary file is removed if the body raises. Use it for functions that write to a
+    file name, e.g., `DataFrame.to_parquet` or `urlretrieve`.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(path)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+@contextmanager
+def atomic_write(path, mode="wb", **kwargs):
+    """Open a temporary file that is renamed to `path` when it is closed without an error.
+
+    Args:
+        path (str or Path): destination.
+        mode (str): file mode, `"wb"` or `"w"`.
+        kwargs: further arguments of `open`, e.g., `encoding`.
+    """
+    with atomic_path(path) as tmp:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
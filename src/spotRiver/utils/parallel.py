@@ -0,0 +1,224 @@
+import asyncio
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+# Object whose row method is called in a worker process. It is installed once per worker
+# by `_init_worker`, so that large datasets in `fun_control` are not pickled for every row.
+_WORKER_OBJ = None
+
+
+def _init_worker(obj):
+    global _WORKER_OBJ
+    _WORKER_OBJ = obj
+
+
+def seed_row(seed, i):
+    """Seed the global random number generators for the evaluation of row `i`.
+
+    Args:
+        seed (int): base seed. If `None`, the generators are left untouched.
+        i (int): index of the row in the design matrix.
+    """
+    if seed is None:
+        return
+    random.seed(seed + i)
+    np.random.seed(seed + i)
+
+
+def _call_row(obj, method_name, seed, i, x, pass_row_id=False):
+    seed_row(seed, i)
+    if pass_row_id:
+        return getattr(obj, method_name)(x, row_id=i)
+    return getattr(obj, method_name)(x)
+
+
+def _call_worker_row(method_name, seed, i, x, pass_row_id=False):
+    return _call_row(_WORKER_OBJ, method_name, seed, i, x, pass_row_id)
+
+
+def get_n_jobs(n_jobs):
+    """Resolve the number of worker processes.
+
+    Args:
+        n_jobs (int): number of jobs. `None` or `1` means serial evaluation,
+            negative values are counted back from the number of CPUs, i.e., `-1` uses all CPUs.
+
+    Returns:
+        (int): number of worker processes.
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+    return max(1, n_jobs)
+
+
+def evaluate_rows(obj, method_name, X, n_jobs=None, executor=None, seed=None, row_ids=None, pass_row_id=False):
+    """Evaluate `obj.<method_name>(x)` for every row `x` of `X`.
+
+    The rows are evaluated serially unless `n_jobs` is larger than one or an `executor`
+    is passed. In both cases the rows are evaluated in worker processes and the results
+    are returned in input order. Exceptions raised by the row method are propagated.
+
+    The row method returns either a float or a tuple `(float, dict)`, where the dictionary
+    holds additional information about the evaluation of the row.
+
+    Args:
+        obj (object): picklable object that provides the row method.
+        method_name (str): name of the method that evaluates a single row.
+        X (array): design matrix, one candidate per row.
+        n_jobs (int): number of worker processes. Ignored if `executor` is given.
+        executor (concurrent.futures.Executor): executor used to evaluate the rows.
+        seed (int): base seed. Row `i` is evaluated with the global random number generators
+            seeded with `seed + i`, independently of the worker that evaluates it.
+        row_ids (array): ids of the rows used for seeding. Defaults to `range(X.shape[0])`.
+        pass_row_id (bool): if `True`, the row method is called as `method(x, row_id=i)`.
+
+    Returns:
+        (tuple): a `numpy.ndarray` with one float per row of `X` and a list with one
+            dictionary per row of `X`. The dictionaries are empty if the row method returns floats.
+    """
+    n = X.shape[0]
+    if row_ids is None:
+        row_ids = range(n)
+    rows = list(zip(row_ids, X))
+    if executor is not None:
+        futures = [executor.submit(_call_row, obj, method_name, seed, i, x, pass_row_id) for i, x in rows]
+        return _split_results([f.result() for f in futures])
+    n_jobs = min(get_n_jobs(n_jobs), n)
+    if n_jobs <= 1:
+        return _split_results([_call_row(obj, method_name, seed, i, x, pass_row_id) for i, x in rows])
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(obj,)) as pool:
+        futures = [pool.submit(_call_worker_row, method_name, seed, i, x, pass_row_id) for i, x in rows]
+        return _split_results([f.result() for f in futures])
+
+
+def _split_result(r):
+    return r if isinstance(r, tuple) else (r, {})
+
+
+def _split_results(results):
+    values, infos = [], []
+    for r in results:
+        y, info = _split_result(r)
+        values.append(y)
+        infos.append(info)
+    return np.array(values, dtype=float), infos
+
+
+def _submitter(obj, method_name, n, n_jobs, executor, seed, pass_row_id):
+    """Return the submit function, the created pool (or `None`) and its number of workers for `aevaluate_rows`."""
+    if executor is not None:
+        # `_max_workers` is set by the executors of `concurrent.futures`.
+        n_workers = getattr(executor, "_max_workers", None)
+        return lambda i, x: executor.submit(_call_row, obj, method_name, seed, i, x, pass_row_id), None, n_workers
+    n_workers = min(get_n_jobs(n_jobs), n)
+    if n_workers > 1:
+        pool = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(obj,))
+        return lambda i, x: pool.submit(_call_worker_row, method_name, seed, i, x, pass_row_id), pool, n_workers
+    pool = ThreadPoolExecutor(max_workers=1)
+    return lambda i, x: pool.submit(_call_row, obj, method_name, seed, i, x, pass_row_id), pool, 1
+
+
+async def _arun_row(semaphore, release, submit, timeout, k, i, x):
+    """Evaluate row `k` of `aevaluate_rows` in a slot of `semaphore`."""
+    await semaphore.acquire()
+    try:
+        future = submit(i, x)
+    except BaseException:
+        # E.g., a broken or shut down pool.
+        semaphore.release()
+        raise
+    try:
+        r = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except BaseException as err:
+        # A row holds its slot until it is finished or cancelled, also after a timeout, so that
+        # the rows behind it do not wait for a busy worker while their timeout runs.
+        future.cancel()
+        future.add_done_callback(release)
+        if isinstance(err, asyncio.TimeoutError):
+            return k, np.nan, {"timed_out": True}
+        raise
+    # The slot is released after the result is delivered, so that a row that is started in the
+    # freed slot cannot complete before it.
+    semaphore.release()
+    y, info = _split_result(r)
+    return k, float(y), info
+
+
+async def aevaluate_rows(
+    obj,
+    method_name,
+    X,
+    n_jobs=None,
+    executor=None,
+    max_concurrency=None,
+    timeout=None,
+    seed=None,
+    row_ids=None,
+    pass_row_id=False,
+):
+    """Evaluate `obj.<method_name>(x)` for every row `x` of `X` without blocking the event loop.
+
+    This is the asynchronous variant of `evaluate_rows`. The rows are evaluated by `executor`, a
+    process or thread pool, or by a process pool with `n_jobs` workers that is created for the
+    call. Without either, the rows are evaluated one at a time in a background thread.
+
+    The results are yielded in completion order as soon as a row is finished. If the consumer
+    stops the iteration or its task is cancelled, the rows that have not started yet are
+    cancelled. Exceptions raised by the row method are propagated and cancel the other rows.
+
+    Args:
+        obj (object): picklable object that provides the row method.
+        method_name (str): name of the method that evaluates a single row.
+        X (array): design matrix, one candidate per row.
+        n_jobs (int): number of worker processes. Ignored if `executor` is given.
+        executor (concurrent.futures.Executor): executor used to evaluate the rows.
+        max_concurrency (int): maximum number of rows that are submitted to the executor at
+            the same time. Defaults to the number of workers of the executor or of the created
+            pool, so that a submitted row starts right away. No limit if the number of workers
+            of `executor` is unknown.
+        timeout (float): maximum number of seconds per row. It is counted from the submission of
+            the row to the executor, which is the start of the row unless `max_concurrency` is
+            larger than the number of workers. A row that exceeds the timeout is reported with
+            the value `nan` and the information `{"timed_out": True}`. A row that is already
+            running in a pool cannot be interrupted. It finishes in the background, keeps its
+            slot of `max_concurrency` until then, and its result is discarded.
+        seed (int): base seed, see `evaluate_rows`.
+        row_ids (array): ids of the rows used for seeding. Defaults to `range(X.shape[0])`.
+        pass_row_id (bool): if `True`, the row method is called as `method(x, row_id=i)`.
+
+    Yields:
+        (tuple): the position of the row in `X`, its float value and its information dictionary.
+    """
+    n = X.shape[0]
+    if row_ids is None:
+        row_ids = range(n)
+    submit, own_pool, n_workers = _submitter(obj, method_name, n, n_jobs, executor, seed, pass_row_id)
+    max_concurrency = max_concurrency or n_workers
+    semaphore = asyncio.Semaphore(max_concurrency or max(n, 1))
+    loop = asyncio.get_running_loop()
+
+    def release(_):
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            # The event loop is closed.
+            pass
+
+    tasks = [
+        asyncio.ensure_future(_arun_row(semaphore, release, submit, timeout, k, i, x))
+        for k, (i, x) in enumerate(zip(row_ids, X))
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if own_pool is not None:
+            own_pool.shutdown(wait=False, cancel_futures=True)
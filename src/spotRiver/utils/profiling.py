@@ -0,0 +1,249 @@
+import cProfile
+import csv
+import functools
+import io
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+
+from river import compose
+
+# Methods of the final step of a model that are timed as "model.predict" and "model.learn".
+PREDICT_METHODS = ("predict_one", "predict_proba_one", "score_one", "forecast", "predict_many", "predict_proba_many")
+LEARN_METHODS = ("learn_one", "learn_many")
+# Methods of the other steps of a pipeline that are timed as "features".
+FEATURE_METHODS = ("transform_one", "learn_one", "transform_many", "learn_many")
+
+
+class PhaseTimer:
+    """Accumulate the wall-clock time spent in named phases.
+
+    Phases can be nested. The time of a phase excludes the time of the phases nested in it, so that
+    the timings of all phases add up to the instrumented time, e.g., the time of the feature
+    extraction of a pipeline is not counted twice in the time of its `learn_one`.
+
+    Examples:
+        >>> timer = PhaseTimer()
+        >>> with timer.phase("data"):
+        ...     pass
+        >>> sorted(timer.timings)
+        ['data']
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.counts = {}
+        self._stack = []
+
+    def start(self, name):
+        """Enter phase `name` and pause the enclosing phase."""
+        now = perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.timings[outer[0]] = self.timings.get(outer[0], 0.0) + now - outer[1]
+        self._stack.append([name, now])
+
+    def stop(self):
+        """Leave the current phase and resume the enclosing phase."""
+        now = perf_counter()
+        name, start = self._stack.pop()
+        self.timings[name] = self.timings.get(name, 0.0) + now - start
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if self._stack:
+            self._stack[-1][1] = now
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager that times its body as phase `name`."""
+        self.start(name)
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def timed(self, func, name):
+        """Return a wrapper of `func` that times every call as phase `name`."""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.start(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.stop()
+
+        # Marks the wrapper for `uninstrumented`.
+        wrapper.timed_phase = name
+        return wrapper
+
+    def iterate(self, iterable, name="data"):
+        """Iterate over `iterable` and time the production of every item as phase `name`."""
+        iterator = iter(iterable)
+        while True:
+            self.start(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.stop()
+            yield item
+
+    def _patch(self, obj, names, phase, patched):
+        for method_name in names:
+            method = getattr(obj, method_name, None)
+            if method is not None and method_name not in vars(obj):
+                setattr(obj, method_name, self.timed(method, phase))
+                patched.append((obj, method_name))
+
+    def _instrument(self, model, patched):
+        if isinstance(model, compose.Pipeline):
+            steps = list(model.steps.values())
+            for step in steps[:-1]:
+                self._patch(step, FEATURE_METHODS, "features", patched)
+            self._instrument(steps[-1], patched)
+            return
+        self._patch(model, PREDICT_METHODS, "model.predict", patched)
+        self._patch(model, LEARN_METHODS, "model.learn", patched)
+        # E.g., the regressor of SNARIMAX.
+        regressor = getattr(model, "regressor", None)
+        if regressor is not None:
+            self._instrument(regressor, patched)
+
+    @contextmanager
+    def instrument(self, model):
+        """Time the methods of `model` while the context is active.
+
+        The predictions and updates of the final step are timed as "model.predict" and
+        "model.learn", the transformers of a pipeline as "features". The methods are patched on
+        the instances and restored when the context is left.
+        """
+        patched = []
+        self._instrument(model, patched)
+        try:
+            yield model
+        finally:
+            for obj, method_name in reversed(patched):
+                delattr(obj, method_name)
+
+    def instrument_metric(self, metric):
+        """Return a clone of `metric` whose updates, and those of its clones, are timed as "metric"."""
+        metric = metric.clone()
+        metric.update = self.timed(metric.update, "metric")
+        clone = metric.clone
+
+        def instrumented_clone(*args, **kwargs):
+            return self.instrument_metric(clone(*args, **kwargs))
+
+        instrumented_clone.timed_phase = None
+        metric.clone = instrumented_clone
+        return metric
+
+    def as_dict(self):
+        """Return the timings in seconds per phase."""
+        return dict(self.timings)
+
+
+def _parts(obj):
+    """Yield `obj` and the objects nested in it that `PhaseTimer.instrument` patches."""
+    yield obj
+    if isinstance(obj, compose.Pipeline):
+        for step in obj.steps.values():
+            yield from _parts(step)
+    regressor = getattr(obj, "regressor", None)
+    if regressor is not None:
+        yield from _parts(regressor)
+
+
+@contextmanager
+def uninstrumented(*objs):
+    """Remove the methods patched by a `PhaseTimer` from models and metrics while the context is active.
+
+    The patched methods are closures, so instrumented models and metrics cannot be pickled, e.g., for
+    a snapshot. The methods are restored when the context is left.
+
+    Examples:
+        >>> import pickle
+        >>> from river import metrics
+        >>> metric = PhaseTimer().instrument_metric(metrics.MAE())
+        >>> with uninstrumented(metric):
+        ...     state = pickle.dumps(metric)
+        >>> type(pickle.loads(state)).__name__
+        'MAE'
+    """
+    removed = []
+    for obj in objs:
+        for part in _parts(obj):
+            for name, value in list(vars(part).items()):
+                if hasattr(value, "timed_phase"):
+                    removed.append((part, name, value))
+                    delattr(part, name)
+    try:
+        yield
+    finally:
+        for part, name, value in reversed(removed):
+            setattr(part, name, value)
+
+
+@contextmanager
+def capture(cprofile=False, trace_memory=False, n_top=20, path=None):
+    """Capture a cProfile profile and/or the traced memory of the body.
+
+    Args:
+        cprofile (bool): whether to run the body under `cProfile`.
+        trace_memory (bool): whether to trace the memory allocations with `tracemalloc`.
+        n_top (int): number of entries of the summaries.
+        path (str or Path): if set, the cProfile statistics are dumped to this file,
+            e.g., for `snakeviz` or `pstats`.
+
+    Yields:
+        (dict): filled when the context is left with the entries `cprofile` (the `n_top` functions
+            with the largest cumulative time as text) and `tracemalloc_peak` and `tracemalloc_top`
+            (the peak memory in bytes and the `n_top` lines that allocated the most memory).
+    """
+    report = {}
+    profile = cProfile.Profile() if cprofile else None
+    # Do not stop a tracing that was started outside of the context.
+    start_tracing = trace_memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    if profile is not None:
+        profile.enable()
+    try:
+        yield report
+    finally:
+        if profile is not None:
+            profile.disable()
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(n_top)
+            report["cprofile"] = out.getvalue()
+            if path is not None:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                profile.dump_stats(path)
+        if trace_memory:
+            report["tracemalloc_peak"] = tracemalloc.get_traced_memory()[1]
+            stats = tracemalloc.take_snapshot().statistics("lineno")[:n_top]
+            report["tracemalloc_top"] = [str(stat) for stat in stats]
+            if start_tracing:
+                tracemalloc.stop()
+
+
+def export_timings(candidate_info, path):
+    """Write the phase timings of `HyperRiver.candidate_info` to a CSV file.
+
+    Args:
+        candidate_info (list): one dictionary per candidate, see `HyperRiver.candidate_info`.
+        path (str or Path): CSV file with one row per candidate and one column per phase.
+            Candidates without timings, e.g., cached ones, have empty cells.
+    """
+    timings = [info.get("profile", {}).get("timings", {}) for info in candidate_info]
+    phases = sorted({phase for t in timings for phase in t})
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["candidate", *phases])
+        writer.writeheader()
+        for i, t in enumerate(timings):
+            writer.writerow({"candidate": i, **t})
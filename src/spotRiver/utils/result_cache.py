@@ -0,0 +1,55 @@
+import hashlib
+import json
+import math
+from pathlib import Path
+
+
+class ResultCache:
+    """Cache of objective function values.
+
+    Results are stored in memory and, if `path` is given, appended to a JSON lines file. The
+    file is read when the cache is created, so that restarted tuning runs can reuse the results
+    of earlier runs. Failed evaluations (`nan`) are not cached.
+
+    Args:
+        path (str or Path): optional JSON lines file that persists the results.
+    """
+
+    def __init__(self, path=None):
+        self.path = None if path is None else Path(path)
+        self._results = {}
+        if self.path is not None and self.path.is_file():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A truncated last line, e.g., after a crash.
+                        continue
+                    self._results[record["key"]] = (record["y"], record["info"])
+
+    @staticmethod
+    def key(*parts):
+        """Return the key for the given parts, e.g., the objective name, the hyperparameters and a fingerprint."""
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, key):
+        return key in self._results
+
+    def get(self, key):
+        """Return the cached `(y, info)` tuple for `key` or `None`."""
+        return self._results.get(key)
+
+    def put(self, key, y, info=None):
+        """Store the result `y` and the additional information `info` under `key`."""
+        if math.isnan(y):
+            return
+        info = {} if info is None else info
+        self._results[key] = (y, info)
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"key": key, "y": y, "info": info}) + "\n")
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _write_opm_csv(path, n=200, seed=1):
+    """Write a small CSV file with the layout of the OPM dataset."""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2001-06-01") + pd.to_timedelta(rng.integers(0, 5000, n), unit="D")
+    lon = rng.uniform(-73.9, -71.5, n)
+    lat = rng.uniform(40.9, 42.2, n)
+    df = pd.DataFrame(
+        {
+            "Serial Number": np.arange(n),
+            "List Year": dates.year,
+            "Date Recorded": dates.strftime("%m/%d/%Y"),
+            "Town": rng.choice(["Andover", "Bethel", "Canton"], n),
+            "Address": [f"{i} MAIN ST" for i in range(n)],
+            "Assessed Value": rng.uniform(1000, 1e6, n).round(),
+            "Sale Amount": rng.uniform(1000, 2e6, n).round(),
+            "Sales Ratio": rng.uniform(0, 1, n),
+            "Property Type": rng.choice(["Residential", "Commercial", None], n),
+            "Residential Type": rng.choice(["Single Family", "Condo", None], n),
+            "Non Use Code": None,
+            "Assessor Remarks": None,
+            "OPM remarks": None,
+            "Location": [f"POINT ({a:.6f} {b:.6f})" if i % 7 else None for i, (a, b) in enumerate(zip(lon, lat))],
+        }
+    )
+    df.to_csv(path, index=False)
+
+
+@pytest.fixture
+def write_opm_csv():
+    """Return a function `write_opm_csv(path, n=200, seed=1)` that writes a synthetic OPM file."""
+    return _write_opm_csv
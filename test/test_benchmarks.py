@@ -0,0 +1,19 @@
+import copy
+from spotRiver.benchmarks import compare_results, load_results, run_benchmarks, save_results
+
+
+def test_benchmarks(tmp_path):
+    """
+    Test that a quick benchmark run can be saved, loaded and compared
+    """
+    names = ["fun_hw.airline_passengers", "fetch_opm.cold", "features.batch"]
+    results = run_benchmarks(names=names, scale=0.01, repeat=1, tmp_dir=tmp_path)
+    assert list(results["benchmarks"]) == names
+    assert all(m["time"] > 0 and m["peak_memory"] > 0 for m in results["benchmarks"].values())
+    save_results(results, tmp_path / "baseline.json")
+    baseline = load_results(tmp_path / "baseline.json")
+    assert not any(row["regression"] for row in compare_results(baseline, results))
+    slower = copy.deepcopy(results)
+    slower["benchmarks"]["features.batch"]["time"] *= 2
+    rows = compare_results(baseline, slower, threshold=0.5)
+    assert [row["name"] for row in rows if row["regression"]] == ["features.batch"]
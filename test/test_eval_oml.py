@@ -0,0 +1,104 @@
+import itertools
+import numpy as np
+from river import linear_model, metrics, preprocessing, tree
+from spotRiver.data.array import ArrayDataset
+from spotRiver.data.synth import SEA
+from spotRiver.evaluation.eval_oml import eval_oml_iter_progressive
+from spotRiver.evaluation.sinks import CSVSink, JSONLinesSink, read_checkpoints
+
+
+def get_data(n=2000):
+    return list(itertools.islice(((x, float(y)) for x, y in SEA(seed=1)), n))
+
+
+def test_eval_oml_measurements():
+    """
+    Test that switching off or sampling the measurements does not change the error series
+    """
+    dataset = get_data()
+    results = [
+        eval_oml_iter_progressive(dataset, metrics.MAE(), {"HTR": tree.HoeffdingTreeRegressor()}, step=200, **kwargs)
+        for kwargs in ({}, {"measure_time": False, "measure_memory": False}, {"memory_every": 3})
+    ]
+    full, cheap, sampled = (r["HTR"] for r in results)
+    assert full["error"] == cheap["error"] == sampled["error"]
+    assert np.all(np.isnan(cheap["r_time"])) and np.all(np.isnan(cheap["memory"]))
+    assert not np.any(np.isnan(full["memory"]))
+    assert [not np.isnan(m) for m in sampled["memory"]] == [k % 3 == 0 for k in range(len(full["memory"]))]
+
+
+def test_eval_oml_single_pass():
+    """
+    Test that the single pass mode reproduces the results of one pass per model
+    """
+    dataset = get_data()
+
+    def get_models():
+        return {"HTR": tree.HoeffdingTreeRegressor(), "HTR_small": tree.HoeffdingTreeRegressor(grace_period=50)}
+
+    sequential = eval_oml_iter_progressive(dataset, metrics.MAE(), get_models(), step=300)
+    single = eval_oml_iter_progressive(dataset, metrics.MAE(), get_models(), step=300, single_pass=True)
+    assert single.keys() == sequential.keys()
+    for model_name in sequential:
+        assert single[model_name].keys() == sequential[model_name].keys()
+        assert single[model_name]["step"] == sequential[model_name]["step"]
+        assert single[model_name]["error"] == sequential[model_name]["error"]
+        assert len(single[model_name]["memory"]) == len(sequential[model_name]["memory"])
+
+
+def test_eval_oml_stop_rule():
+    """
+    Test that a model is no longer evaluated after the stop rule fired
+    """
+    dataset = get_data()
+
+    def stop_rule(model_name, step, error):
+        return model_name == "HTR" and step >= 600
+
+    for single_pass in (False, True):
+        models = {"HTR": tree.HoeffdingTreeRegressor(), "HTR_small": tree.HoeffdingTreeRegressor(grace_period=50)}
+        result = eval_oml_iter_progressive(
+            dataset, metrics.MAE(), models, step=300, stop_rule=stop_rule, single_pass=single_pass
+        )
+        assert result["HTR"]["step"] == [300, 600]
+        assert result["HTR"]["stopped"]
+        assert result["HTR_small"]["step"][-1] == 2000
+        assert not result["HTR_small"]["stopped"]
+
+
+def test_eval_oml_sinks(tmp_path):
+    """
+    Test that the checkpoints written by the sinks reproduce the result
+    """
+    dataset = get_data(1000)
+    for sink_class, filename in ((JSONLinesSink, "run.jsonl"), (CSVSink, "run.csv")):
+        models = {"HTR": tree.HoeffdingTreeRegressor(), "HTR_small": tree.HoeffdingTreeRegressor(grace_period=50)}
+        with sink_class(tmp_path / filename) as sink:
+            result = eval_oml_iter_progressive(dataset, metrics.MAE(), models, step=300, sink=sink)
+        with open(tmp_path / filename, "a") as f:
+            f.write('{"model": "HTR", "st')
+        assert read_checkpoints(tmp_path / filename) == result
+
+
+def test_eval_oml_mini_batches():
+    """
+    Test that mini-batches of size one reproduce the evaluation one sample at a time
+    """
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(1000, 3))
+    dataset = ArrayDataset(X, X @ np.array([1.0, 2.0, 3.0]) + rng.normal(size=1000))
+
+    def get_models():
+        return {
+            "LR": preprocessing.StandardScaler() | linear_model.LinearRegression(),
+            "HTR": tree.HoeffdingTreeRegressor(),
+        }
+
+    rows = eval_oml_iter_progressive(dataset, metrics.MAE(), get_models(), step=300)
+    for batch_size in (1, 64):
+        batches = eval_oml_iter_progressive(dataset, metrics.MAE(), get_models(), step=300, batch_size=batch_size)
+        for model_name in rows:
+            assert batches[model_name]["step"] == rows[model_name]["step"] == [300, 600, 900, 1000]
+        assert batches["HTR"]["error"] == rows["HTR"]["error"]
+        if batch_size == 1:
+            assert np.allclose(batches["LR"]["error"], rows["LR"]["error"])
@@ -1,5 +1,14 @@
+import datetime
+import math
+import numpy as np
 from spotRiver import data
 from spotRiver.utils.features import get_hour_distances, get_month_distances, get_ordinal_date, get_weekday_distances
+from spotRiver.utils.features import (
+    get_hour_distances_batch,
+    get_month_distances_batch,
+    get_ordinal_date_batch,
+    get_weekday_distances_batch,
+)
 
 
 def test_features():
@@ -14,3 +23,32 @@ def test_features():
         assert(get_weekday_distances(x)["Saturday"] == 1.0)
         assert(get_month_distances(x)["January"] == 1.0)
         break
+
+
+def test_features_batch():
+    """
+    Test that the batch features equal the features of the single samples
+    """
+    dates = [datetime.datetime(2023, 1, 1) + datetime.timedelta(hours=7 * i) for i in range(500)]
+    pairs = [
+        (get_month_distances, get_month_distances_batch),
+        (get_weekday_distances, get_weekday_distances_batch),
+        (get_hour_distances, get_hour_distances_batch),
+        (get_ordinal_date, get_ordinal_date_batch),
+    ]
+    for fun, fun_batch in pairs:
+        batch = fun_batch(dates)
+        for i, date in enumerate(dates):
+            features = fun({"date": date})
+            assert features.keys() == batch.keys()
+            assert np.allclose([features[k] for k in features], [batch[k][i] for k in features])
+
+
+def test_features_are_copies():
+    """
+    Test that modifying returned features does not change the lookup tables
+    """
+    x = {"date": datetime.datetime(2023, 5, 1, 13)}
+    get_month_distances(x)["May"] = 0.0
+    assert get_month_distances(x)["May"] == 1.0
+    assert get_month_distances(x)["April"] == math.exp(-1)
@@ -0,0 +1,72 @@
+import numbers
+import pickle
+import numpy as np
+from river import compose, linear_model, metrics
+from spotRiver.data.generic import GenericData
+from spotRiver.data.line_index import skip_sample
+from spotRiver.data.opm import OPM_FILENAME
+from spotRiver.evaluation.eval_oml import eval_oml_iter_progressive
+
+
+def opm_generic_data(directory, **kwargs):
+    return GenericData(
+        filename=OPM_FILENAME,
+        directory=directory,
+        target="Sale Amount",
+        n_features=13,
+        n_samples=2000,
+        converters={"Assessed Value": float, "Sale Amount": float, "Sales Ratio": float, "List Year": int},
+        parse_dates={"Date Recorded": "%m/%d/%Y"},
+        **kwargs,
+    )
+
+
+def test_skip_sampling(tmp_path, monkeypatch, write_opm_csv):
+    """
+    Test that skip sampling parses exactly the rows selected by skip_sample
+    """
+    monkeypatch.setenv("SPOTRIVER_DATA", str(tmp_path / "data_home"))
+    write_opm_csv(tmp_path / OPM_FILENAME, 2000)
+    rows = list(opm_generic_data(tmp_path))
+    sample = list(opm_generic_data(tmp_path, fraction=0.1, sampling="skip", seed=7))
+    indices = skip_sample(len(rows), 0.1, seed=7)
+    assert sample == [rows[i] for i in indices]
+    assert 100 < len(sample) < 300
+    assert sample == list(opm_generic_data(tmp_path, fraction=0.1, sampling="skip", seed=7))
+    assert sample != list(opm_generic_data(tmp_path, fraction=0.1, sampling="skip", seed=8))
+    # The sample of a prefix does not depend on the number of rows
+    assert np.array_equal(skip_sample(500, 0.1, seed=7), indices[indices < 500])
+
+
+def test_random_access(tmp_path, write_opm_csv):
+    """
+    Test slicing, indexing and sharding with the stored line index
+    """
+    write_opm_csv(tmp_path / OPM_FILENAME, 2000)
+    dataset = opm_generic_data(tmp_path, data_home=tmp_path / "data_home")
+    rows = list(dataset)
+    assert dataset.n_rows == 2000
+    assert list(dataset[1500:1510]) == rows[1500:1510]
+    assert list(dataset[-5:]) == rows[-5:]
+    assert list(dataset[100:200][10:20]) == rows[110:120]
+    assert dataset[-1] == rows[-1]
+    assert len(list((tmp_path / "data_home" / "line_index").glob("*.npy"))) == 1
+    shards = pickle.loads(pickle.dumps(dataset.shards(3)))
+    assert [len(shard) for shard in shards] == [666, 667, 667]
+    assert [row for shard in shards for row in shard] == rows
+    assert not opm_generic_data(tmp_path, fraction=0.5).sliceable
+
+
+def test_resume_from_slice(tmp_path, monkeypatch, write_opm_csv):
+    """
+    Test that resuming an evaluation on a sliceable file dataset seeks to the start
+    """
+    monkeypatch.setenv("SPOTRIVER_DATA", str(tmp_path / "data_home"))
+    write_opm_csv(tmp_path / OPM_FILENAME, 2000)
+    dataset = opm_generic_data(tmp_path)
+    model = compose.SelectType(numbers.Number) | linear_model.LinearRegression()
+    kwargs = dict(metric=metrics.MAE(), step=500, cache_data=False)
+    result = eval_oml_iter_progressive(list(dataset), models={"LR": model.clone()}, start=1000, **kwargs)
+    result_file = eval_oml_iter_progressive(dataset, models={"LR": model.clone()}, start=1000, **kwargs)
+    assert result_file["LR"]["step"] == [1500, 2000]
+    assert result_file["LR"]["error"] == result["LR"]["error"]
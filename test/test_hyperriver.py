@@ -0,0 +1,312 @@
+import asyncio
+import copyreg
+import time
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from river import metrics
+from river import time_series
+from river.time_series import holt_winters
+from spotRiver import data
+from spotRiver.data import preprocessed
+from spotRiver.data.columnar import ColumnarDataset
+from spotRiver.data.materialize import dataset_fingerprint
+from spotRiver.data.synth import SEA
+from spotRiver.evaluation.backtest import backtest_forecaster
+from spotRiver.fun import hyperriver
+from spotRiver.fun.hyperriver import HyperRiver
+from spotRiver.utils.parallel import _arun_row
+from spotRiver.utils.profiling import export_timings
+
+
+def test_fun_hw_parallel():
+    """
+    Test that parallel evaluation returns the serial results in input order
+    """
+    X = np.array([[0.3, 0.1, 0.6, 12, 0], [0.5, 0.1, 0.6, 12, 1], [0.2, 0.2, 0.2, 12, 0]])
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 12}
+    y_serial = HyperRiver().fun_hw(X, fun_control)
+    y_jobs = HyperRiver().fun_hw(X, {**fun_control, "n_jobs": 2})
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        y_executor = HyperRiver().fun_hw(X, {**fun_control, "executor": executor})
+    assert y_serial.shape == (3,)
+    assert np.array_equal(y_serial, y_jobs)
+    assert np.array_equal(y_serial, y_executor)
+
+
+def test_fun_hw_result_cache(tmp_path):
+    """
+    Test that equal hyperparameters after casting are evaluated once and that results persist
+    """
+    X = np.array([[0.3, 0.1, 0.6, 12.2, 0], [0.3, 0.1, 0.6, 12.4, 0], [0.5, 0.1, 0.6, 12, 1]])
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 12}
+    y = HyperRiver().fun_hw(X, fun_control)
+    path = tmp_path / "results.jsonl"
+    hyper_river = HyperRiver()
+    y_cached = hyper_river.fun_hw(X, {**fun_control, "result_cache": str(path)})
+    assert np.array_equal(y, y_cached)
+    assert [info.get("cached", False) for info in hyper_river.candidate_info] == [False, True, False]
+    hyper_river = HyperRiver()
+    y_restarted = hyper_river.fun_hw(X, {**fun_control, "result_cache": str(path)})
+    assert np.array_equal(y, y_restarted)
+    assert all(info["cached"] for info in hyper_river.candidate_info)
+    hyper_river.fun_hw(X, {**fun_control, "horizon": 6})
+    assert not hyper_river.candidate_info[0].get("cached", False)
+
+
+def test_fun_hw_profile(tmp_path):
+    """
+    Test that profiling records phase timings without changing the objective values
+    """
+    X = np.array([[0.3, 0.1, 0.6, 12, 0], [0.5, 0.1, 0.6, 12, 1]])
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 12}
+    y = HyperRiver().fun_hw(X, fun_control)
+    hyper_river = HyperRiver()
+    profile_control = {"profile": True, "profile_cprofile": True, "profile_candidates": [1], "profile_dir": tmp_path}
+    y_profiled = hyper_river.fun_hw(X, {**fun_control, **profile_control})
+    assert np.array_equal(y, y_profiled)
+    profiles = [info["profile"] for info in hyper_river.candidate_info]
+    assert {"data", "model.learn", "model.predict", "metric"} <= profiles[0]["timings"].keys()
+    assert "cprofile" not in profiles[0] and "cprofile" in profiles[1]
+    assert (tmp_path / "candidate_1.prof").is_file()
+    export_timings(hyper_river.candidate_info, tmp_path / "timings.csv")
+    assert len((tmp_path / "timings.csv").read_text().splitlines()) == 3
+
+
+def test_fun_htr_early_stopping():
+    """
+    Test that the median rule stops a hopeless candidate and does not compare candidates across datasets
+    """
+    stream = [(x, float(y)) for x, y in islice(SEA(seed=1), 11_000)]
+    good = [50, 20, 1e-7, 0.05, 0, 0, 0.95, 0, 5, 0, 500]
+    hopeless = [1000, 20, 1e-7, 0.05, 0, 0, 0.95, 0, 5, 0, 500]
+    fun_control = {
+        "data": stream,
+        "n_samples": len(stream),
+        "shared_preprocessing": "sparse",
+        "early_stopping": "median",
+        "early_stopping_min_candidates": 1,
+    }
+    fun = HyperRiver()
+    fun.fun_HTR_iter_progressive(np.array([good, hopeless]), fun_control)
+    assert [(info["stopped"], info["n_samples"]) for info in fun.candidate_info] == [(False, 11_000), (True, 10_000)]
+    # The errors on the scaled targets are larger than all errors recorded on the first stream
+    scaled = [(x, 1000 * y) for x, y in stream]
+    fun.fun_HTR_iter_progressive(np.array([good]), {**fun_control, "data": scaled})
+    assert [(info["stopped"], info["n_samples"]) for info in fun.candidate_info] == [(False, 11_000)]
+
+
+def test_fun_htr_snapshot(tmp_path):
+    """
+    Test that a candidate resumed from a snapshot on a longer prefix matches an evaluation from scratch
+    """
+    stream = [(x, float(y)) for x, y in islice(SEA(seed=1), 25_000)]
+    X = np.array([[200, 20, 1e-7, 0.05, 0, 0, 0.95, 0, 5, 0, 500]])
+    y_cold = HyperRiver().fun_HTR_iter_progressive(X, {"data": stream, "n_samples": len(stream)})
+    snapshot_control = {"snapshot_dir": tmp_path}
+    HyperRiver().fun_HTR_iter_progressive(X, {"data": stream[:15_000], "n_samples": 15_000, **snapshot_control})
+    hyper_river = HyperRiver()
+    y_warm = hyper_river.fun_HTR_iter_progressive(X, {"data": stream, "n_samples": len(stream), **snapshot_control})
+    assert np.array_equal(y_cold, y_warm)
+    assert hyper_river.candidate_info[0]["resumed_from"] == 10_000
+    # A different stream does not resume from the snapshot, even if only an early row differs.
+    hyper_river.fun_HTR_iter_progressive(X, {"data": stream[1:], "n_samples": len(stream) - 1, **snapshot_control})
+    assert "resumed_from" not in hyper_river.candidate_info[0]
+    changed = [(stream[0][0], stream[0][1] + 1), *stream[1:12_000]]
+    hyper_river.fun_HTR_iter_progressive(X, {"data": changed, "n_samples": len(changed), **snapshot_control})
+    assert "resumed_from" not in hyper_river.candidate_info[0]
+    # A snapshot taken on the columnar rows of a stream is resumed from on its feature dictionaries.
+    columnar_dir = {"snapshot_dir": tmp_path / "columnar"}
+    HyperRiver().fun_HTR_iter_progressive(
+        X, {"data": ColumnarDataset(stream[:15_000]), "n_samples": 15_000, "cache_data": False, **columnar_dir}
+    )
+    hyper_river.fun_HTR_iter_progressive(X, {"data": stream[:12_000], "n_samples": 12_000, **columnar_dir})
+    assert hyper_river.candidate_info[0]["resumed_from"] == 10_000
+
+
+def test_fun_htr_snapshot_profile(tmp_path):
+    """
+    Test that snapshots of profiled candidates are taken and do not change the objective values
+    """
+    stream = [(x, float(y)) for x, y in islice(SEA(seed=1), 11_000)]
+    X = np.array([[200, 20, 1e-7, 0.05, 0, 0, 0.95, 0, 5, 0, 500]])
+    fun_control = {"data": stream, "n_samples": len(stream)}
+    y = HyperRiver().fun_HTR_iter_progressive(X, fun_control)
+    profile_control = {"profile": True, "snapshot_dir": tmp_path}
+    assert np.array_equal(HyperRiver().fun_HTR_iter_progressive(X, {**fun_control, **profile_control}), y)
+    hyper_river = HyperRiver()
+    assert np.array_equal(hyper_river.fun_HTR_iter_progressive(X, {**fun_control, **profile_control}), y)
+    assert hyper_river.candidate_info[0]["resumed_from"] == 10_000
+    assert "model.learn" in hyper_river.candidate_info[0]["profile"]["timings"]
+
+
+def test_fun_htr_shared_preprocessing(monkeypatch):
+    """
+    Test that shared preprocessing gives the same objective values as the per-candidate pipelines
+    and that the dataset is fingerprinted once, not per candidate
+    """
+    stream = [({**x, "color": "rgb"[i % 3]}, float(y)) for i, (x, y) in enumerate(islice(SEA(seed=1), 12_000))]
+    X = np.array([[200, 20, 1e-7, 0.05, 0, 0, 0.95, 0, 5, 0, 500], [50, 10, 1e-5, 0.05, 1, 0, 0.95, 0, 5, 1, 500]])
+    fun_control = {"data": stream, "n_samples": len(stream)}
+    y = HyperRiver().fun_HTR_iter_progressive(X, fun_control)
+    fingerprinted = []
+    for module in (hyperriver, preprocessed):
+        monkeypatch.setattr(module, "dataset_fingerprint", lambda d: fingerprinted.append(d) or dataset_fingerprint(d))
+    for storage in ("sparse", "dict"):
+        y_shared = HyperRiver().fun_HTR_iter_progressive(X, {**fun_control, "shared_preprocessing": storage})
+        assert np.array_equal(y, y_shared)
+    assert len(fingerprinted) == 2
+
+
+def test_budget(tmp_path):
+    """
+    Test that candidates that exceed their budget get the penalty and are not cached
+    """
+    X = np.array([[0.3, 0.1, 0.6, 12, 0], [0.5, 0.1, 0.6, 12, 1]])
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "result_cache": str(tmp_path / "cache.jsonl")}
+    fun = HyperRiver()
+    y = fun.fun_hw(X, {**fun_control, "budget_time": 1e-9, "budget_penalty": 1e9})
+    assert np.array_equal(y, [1e9, 1e9])
+    assert [info["budget_exceeded"] for info in fun.candidate_info] == ["time", "time"]
+    y_budget = fun.fun_hw(X, {**fun_control, "budget_time": 60, "budget_memory": 1024})
+    assert not any(info.get("cached", False) for info in fun.candidate_info)
+    assert np.array_equal(y_budget, HyperRiver().fun_hw(X, {"data": data.AirlinePassengers(), "horizon": 12}))
+
+    stream = list(islice(SEA(seed=1), 1000))
+    X_htr = np.array([[200, 20, 1e-7, 0.05, 0, 0, 0.95, 0, 5, 0, 500]])
+    fun = HyperRiver()
+    y = fun.fun_HTR_iter_progressive(X_htr, {"data": stream, "n_samples": len(stream), "budget_time": 1e-9})
+    assert np.isnan(y[0]) and fun.candidate_info[0]["budget_exceeded"] == "time"
+
+
+def test_fun_hw_backtest():
+    """
+    Test that a backtest with one window equals the single pass and that parallel windows equal serial ones
+    """
+    X = np.array([[0.3, 0.1, 0.6, 12, 0], [0.5, 0.1, 0.6, 12, 1]])
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12}
+    y = HyperRiver().fun_hw(X, fun_control)
+    assert np.array_equal(HyperRiver().fun_hw(X, {**fun_control, "backtest_origins": [12]}), y)
+    fun_control.update(backtest_origins=3, backtest_window=24)
+    fun = HyperRiver()
+    y_serial = fun.fun_hw(X, fun_control)
+    assert fun.candidate_info[0]["backtest"]["windows"] == [(12, 36), (60, 84), (108, 132)]
+    assert np.allclose(y_serial, [np.mean(info["backtest"]["scores"]) for info in fun.candidate_info])
+    assert np.array_equal(HyperRiver().fun_hw(X, {**fun_control, "n_jobs": 2}), y_serial)
+    windows = fun.candidate_info[0]["backtest"]["windows"]
+    model = time_series.HoltWinters(alpha=0.3, beta=0.1, gamma=0.6, seasonality=12)
+    serial = backtest_forecaster(data.AirlinePassengers(), model, metrics.MAE(), 12, windows)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        res = backtest_forecaster(data.AirlinePassengers(), model, metrics.MAE(), 12, windows, executor=executor)
+    assert [m.get() for m in res] == [m.get() for m in serial]
+    assert holt_winters.AdditiveLevel not in copyreg.dispatch_table
+
+
+def test_fun_hw_numpy_engine():
+    """
+    Test that the batched Holt-Winters engine gives the same objective values as the river engine
+    """
+    rng = np.random.default_rng(1)
+    n = 50
+    alpha, beta, gamma = rng.uniform(size=(3, n))
+    X = np.column_stack([alpha, beta, gamma, rng.choice([0, 1, 4, 12, 24], n), rng.integers(2, size=n)])
+    # Without trend and seasonality.
+    X[:3, 1], X[:3, 3] = 0, 0
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 24}
+    y = HyperRiver().fun_hw(X, fun_control)
+    assert np.array_equal(HyperRiver().fun_hw(X, {**fun_control, "engine": "numpy"}), y)
+    # Metrics without a batch implementation are evaluated by river.
+    fun_control["metric"] = metrics.MAPE()
+    y = HyperRiver().fun_hw(X[:5], fun_control)
+    assert np.array_equal(HyperRiver().fun_hw(X[:5], {**fun_control, "engine": "numpy"}), y)
+
+
+class SlowHyperRiver(HyperRiver):
+    """Holt-Winters objective whose candidates with alpha > 0.4 take `delay` seconds longer"""
+
+    def __init__(self, delay=1.0):
+        super().__init__()
+        self.delay = delay
+        self.started = []
+
+    def _fun_hw_row(self, x, profiler=None):
+        self.started.append(float(x[0]))
+        if x[0] > 0.4:
+            time.sleep(self.delay)
+        return super()._fun_hw_row(x, profiler=profiler)
+
+
+def test_afun_hw():
+    """
+    Test that the asynchronous objective gives the same values as the synchronous one
+    """
+    X = np.array([[0.3, 0.1, 0.6, 12, 0], [0.5, 0.1, 0.6, 12, 1], [0.3, 0.1, 0.6, 12, 0]])
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 12}
+    y = HyperRiver().fun_hw(X, fun_control)
+    assert np.array_equal(asyncio.run(HyperRiver().afun_hw(X, fun_control)), y)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        y_executor = asyncio.run(HyperRiver().afun_hw(X, {**fun_control, "executor": executor}))
+    assert np.array_equal(y_executor, y)
+
+
+def test_aevaluate_completion_order_timeout_and_cancellation():
+    """
+    Test that results arrive in completion order, that stragglers time out and that
+    leaving the iteration cancels the candidates that have not started
+    """
+    X = np.array([[0.5, 0.1, 0.6, 12, 0], [0.2, 0.1, 0.6, 12, 0], [0.3, 0.1, 0.6, 12, 0]])
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "grace_period": 12}
+
+    async def collect(hyper_river, executor, **kwargs):
+        control = {**fun_control, "executor": executor, **kwargs}
+        return [(i, y, info) async for i, y, info in hyper_river.aevaluate("fun_hw", X, control)]
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = asyncio.run(collect(SlowHyperRiver(), executor))
+        assert [i for i, _, _ in results][-1] == 0
+        results = asyncio.run(collect(SlowHyperRiver(), executor, timeout=0.5))
+        timed_out = {i for i, y, info in results if info.get("timed_out", False) and np.isnan(y)}
+        assert timed_out == {0}
+
+        async def first(hyper_river):
+            control = {**fun_control, "executor": executor, "max_concurrency": 1}
+            async for result in hyper_river.aevaluate("fun_hw", X[::-1], control):
+                return result
+
+        hyper_river = SlowHyperRiver()
+        assert asyncio.run(first(hyper_river))[0] == 0
+        time.sleep(0.2)
+        assert len(hyper_river.started) < len(X)
+
+
+def test_aevaluate_timeout_with_queued_rows():
+    """
+    Test that rows waiting for a busy executor do not time out before they start
+    """
+    X = np.array([[0.5, 0.1, 0.6, 12, 0], [0.6, 0.1, 0.6, 12, 0], [0.7, 0.1, 0.6, 12, 0]])
+    fun_control = {"data": data.AirlinePassengers(), "horizon": 12, "timeout": 1.0}
+
+    async def collect(executor):
+        control = {**fun_control, "executor": executor}
+        return [info async for _, _, info in SlowHyperRiver(delay=0.6).aevaluate("fun_hw", X, control)]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        infos = asyncio.run(collect(executor))
+    assert not any(info.get("timed_out", False) for info in infos)
+
+
+def test_arun_row_releases_slot_on_submit_error():
+    """
+    Test that a row whose submission fails, e.g., to a shut down executor, releases its slot
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.shutdown()
+
+    async def run():
+        semaphore = asyncio.Semaphore(1)
+        with pytest.raises(RuntimeError):
+            await _arun_row(semaphore, None, lambda i, x: executor.submit(print), None, 0, 0, None)
+        return semaphore.locked()
+
+    assert not asyncio.run(run())
@@ -0,0 +1,27 @@
+import pytest
+from spotRiver.utils.locking import FileLock, atomic_write
+
+
+def test_file_lock_timeout(tmp_path):
+    """
+    Test that a held lock cannot be taken a second time
+    """
+    with FileLock(tmp_path / "data.lock"):
+        with pytest.raises(TimeoutError):
+            FileLock(tmp_path / "data.lock", timeout=0.1).acquire()
+    with FileLock(tmp_path / "data.lock", timeout=0.1) as lock:
+        assert lock.is_locked
+
+
+def test_atomic_write(tmp_path):
+    """
+    Test that a failed write leaves neither the destination nor a temporary file
+    """
+    with pytest.raises(RuntimeError):
+        with atomic_write(tmp_path / "data.txt", "w") as f:
+            f.write("partial")
+            raise RuntimeError
+    assert list(tmp_path.iterdir()) == []
+    with atomic_write(tmp_path / "data.txt", "w") as f:
+        f.write("complete")
+    assert (tmp_path / "data.txt").read_text() == "complete"
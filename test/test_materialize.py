@@ -0,0 +1,117 @@
+import numpy as np
+from spotRiver import data
+from spotRiver.data.columnar import ColumnarDataset
+from spotRiver.data.generic import GenericData
+from spotRiver.data.materialize import DatasetCache, MaterializedDataset, dataset_key
+from spotRiver.fun.hyperriver import HyperRiver
+
+
+def test_materialized_dataset_replays_rows():
+    """
+    Test that a materialized dataset yields the same rows as the file
+    """
+    dataset = data.AirlinePassengers()
+    materialized = MaterializedDataset(dataset)
+    assert len(materialized) == 144
+    assert list(materialized) == list(dataset)
+    # Modifying a replayed row must not change the stored data
+    x, _ = next(iter(materialized))
+    x["month"] = None
+    assert next(iter(materialized))[0]["month"] is not None
+
+
+def test_dataset_cache_lru():
+    """
+    Test that the cache reuses entries and evicts the least recently used dataset
+    """
+    airline = data.AirlinePassengers()
+    generic = GenericData(
+        filename="airline-passengers.csv",
+        directory=airline.path.parent,
+        target="passengers",
+        n_features=1,
+        n_samples=144,
+        converters={"passengers": float},
+        parse_dates={"month": "%Y-%m"},
+    )
+    cache = DatasetCache()
+    first = cache.get(airline)
+    assert cache.get(data.AirlinePassengers()) is first
+    cache.max_bytes = int(first.nbytes * 1.5)
+    second = cache.get(generic)
+    assert isinstance(second, MaterializedDataset)
+    assert len(cache) == 1
+    assert cache.get(generic) is second
+    # Datasets larger than the cache are returned unchanged and only parsed once
+    cache.max_bytes = 1
+    assert cache.get(data.AirlinePassengers()).__class__ is data.AirlinePassengers
+    dataset = CountingAirlinePassengers()
+    assert cache.get(dataset) is dataset
+    assert cache.get(dataset) is dataset
+    assert dataset.n_passes == 1
+
+
+def test_dataset_key_converters():
+    """
+    Test that datasets parsed with different lambda converters do not share a cache entry
+    """
+    def generic(converter):
+        return GenericData(
+            filename="airline-passengers.csv",
+            directory=data.AirlinePassengers().path.parent,
+            target="passengers",
+            n_features=1,
+            n_samples=144,
+            converters={"passengers": converter},
+            parse_dates={"month": "%Y-%m"},
+        )
+
+    def scaled(scale):
+        return lambda v: float(v) * scale
+
+    halved, doubled = generic(lambda v: float(v) / 2), generic(lambda v: float(v) * 2)
+    assert dataset_key(halved) != dataset_key(doubled)
+    assert dataset_key(generic(scaled(1))) != dataset_key(generic(scaled(2)))
+    assert dataset_key(generic(scaled(2))) == dataset_key(generic(scaled(2)))
+    cache = DatasetCache()
+    assert [y for _, y in cache.get(halved)] != [y for _, y in cache.get(doubled)]
+    assert len(cache) == 2
+
+
+class CountingAirlinePassengers(data.AirlinePassengers):
+    """Airline passengers that count the passes over the file"""
+
+    def __init__(self):
+        super().__init__()
+        self.n_passes = 0
+
+    def __iter__(self):
+        self.n_passes += 1
+        return super().__iter__()
+
+
+def test_columnar_dataset_replays_rows():
+    """
+    Test that the columnar store yields the same rows as the file with typed, compact columns
+    """
+    dataset = data.AirlinePassengers(columnar=True)
+    assert list(dataset) == list(data.AirlinePassengers())
+    assert list(dataset) == list(dataset)
+    assert dataset._columns.columns["month"].data.dtype == np.int64
+    rows = [({"town": "ab"[i % 2], "n": i, "v": i / 3, "missing": None}, i) for i in range(100)]
+    columnar = ColumnarDataset(rows)
+    assert [(dict(x), y) for x, y in columnar] == rows
+    assert [column.kind for column in columnar.columns.values()] == ["category", "int", "float", "category"]
+    assert 4 * columnar.nbytes < MaterializedDataset(rows).nbytes
+    assert DatasetCache().get(dataset) is dataset
+
+
+def test_columnar_dataset_objective_values():
+    """
+    Test that the objective functions give the same values on the columnar store
+    """
+    X = np.array([[0.3, 0.1, 0.6, 12, 0], [0.5, 0.1, 0.6, 12, 1]])
+    fun_control = {"horizon": 12, "grace_period": 12}
+    y = HyperRiver().fun_hw(X, {**fun_control, "data": data.AirlinePassengers()})
+    y_columnar = HyperRiver().fun_hw(X, {**fun_control, "data": data.AirlinePassengers(columnar=True)})
+    assert np.array_equal(y, y_columnar)
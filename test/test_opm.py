@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import pandas as pd
+from spotRiver.data.opm import OPM_FILENAME, fetch_opm, iter_opm
+
+
+def test_fetch_opm_cache(tmp_path, write_opm_csv):
+    """
+    Test that the cached frame equals the freshly processed frame
+    """
+    write_opm_csv(tmp_path / OPM_FILENAME)
+    for include_categorical in (False, True):
+        kwargs = dict(data_home=tmp_path, download_if_missing=False, include_categorical=include_categorical)
+        X, y = fetch_opm(return_X_y=True, use_cache=False, **kwargs)
+        X_cold, y_cold = fetch_opm(return_X_y=True, **kwargs)
+        X_warm, y_warm = fetch_opm(return_X_y=True, **kwargs)
+        pd.testing.assert_frame_equal(X, X_cold)
+        pd.testing.assert_frame_equal(X, X_warm)
+        pd.testing.assert_series_equal(y, y_warm)
+    assert len(list((tmp_path / "opm_cache").glob("opm_*"))) == 2
+
+
+def test_iter_opm(tmp_path, write_opm_csv):
+    """
+    Test that the streamed chunks are ordered by date and contain the rows of fetch_opm
+    """
+    write_opm_csv(tmp_path / OPM_FILENAME)
+    kwargs = dict(data_home=tmp_path, download_if_missing=False, include_categorical=True)
+    X, y = fetch_opm(return_X_y=True, use_cache=False, **kwargs)
+    chunks = list(iter_opm(chunksize=17, return_frames=True, **kwargs))
+    assert max(len(X_chunk) for X_chunk, _ in chunks) == 17
+    X_stream = pd.concat([X_chunk for X_chunk, _ in chunks], ignore_index=True)
+    assert X_stream["timestamp_rec"].is_monotonic_increasing
+    assert pd.concat([y_chunk for _, y_chunk in chunks]).sum() == y.sum()
+    key = ["timestamp_rec", "Address"]
+    pd.testing.assert_frame_equal(
+        X.astype(X_stream.dtypes).sort_values(key).reset_index(drop=True),
+        X_stream.sort_values(key).reset_index(drop=True),
+    )
+    pairs = list(iter_opm(chunksize=50, **kwargs))
+    assert len(pairs) == len(X)
+    assert pairs[0][0].keys() == set(X.columns)
+    with pytest.raises(ValueError):
+        list(iter_opm(chunksize=50, presorted=True, **kwargs))
+
+
+def test_iter_opm_stable(tmp_path, write_opm_csv):
+    """
+    Test that rows recorded on the same date keep their file order across chunk boundaries
+    """
+    write_opm_csv(tmp_path / OPM_FILENAME)
+    df = pd.read_csv(tmp_path / OPM_FILENAME)
+    df["Date Recorded"] = np.random.default_rng(2).choice(["03/01/2005", "01/01/2005", "02/01/2005"], len(df))
+    df.to_csv(tmp_path / OPM_FILENAME, index=False)
+    kwargs = dict(data_home=tmp_path, download_if_missing=False, include_categorical=True)
+    X = fetch_opm(return_X_y=True, use_cache=False, **kwargs)[0]
+    df = df[df["Address"].isin(X["Address"])]
+    expected = df.sort_values("Date Recorded", key=lambda d: pd.to_datetime(d), kind="mergesort")["Address"]
+    for chunksize in (17, 64):
+        X_stream = pd.concat([X_chunk for X_chunk, _ in iter_opm(chunksize=chunksize, return_frames=True, **kwargs)])
+        assert X_stream["Address"].tolist() == expected.tolist()
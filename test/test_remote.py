@@ -0,0 +1,156 @@
+import hashlib
+import io
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from river import stream
+from spotRiver.data import base
+
+CSV = b"x,y\n" + b"".join(f"{i},{2 * i}\n".encode() for i in range(1000))
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serve `server.files` with support for Range requests. Truncate the first `server.n_truncate` responses."""
+
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.server.requests.append(self.headers.get("Range"))
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            if start >= len(body):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        if self.server.n_truncate > 0:
+            self.server.n_truncate -= 1
+            self.wfile.write(body[start:start + (len(body) - start) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv("SPOTRIVER_DATA", str(tmp_path / "data_home"))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.files, httpd.requests, httpd.n_truncate = {}, [], 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class Remote(base.RemoteDataset):
+    def __init__(self, url, **kwargs):
+        super().__init__(url=url, size=len(CSV), task=base.REG, n_features=1, **kwargs)
+
+    def _iter(self):
+        with self.open_member("data.csv", encoding="utf-8") as f:
+            yield from stream.iter_csv(f, target="y", converters={"x": int, "y": int})
+
+
+def url(server, name):
+    return f"http://127.0.0.1:{server.server_address[1]}/{name}"
+
+
+def tar_gz(name="remote/data.csv"):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        info = tarfile.TarInfo(name)
+        info.size = len(CSV)
+        tar.addfile(info, io.BytesIO(CSV))
+    return buffer.getvalue()
+
+
+def test_remote_resume(server):
+    """
+    Test that a truncated download is resumed with a Range request and verified
+    """
+    server.files["/data.csv"] = CSV
+    server.n_truncate = 1
+    dataset = Remote(url(server, "data.csv"), unpack=False, sha256=hashlib.sha256(CSV).hexdigest())
+    with pytest.raises(Exception):
+        dataset.download(verbose=False)
+    assert not dataset.is_downloaded
+    dataset.download(verbose=False)
+    assert server.requests[0] is None and server.requests[1] == f"bytes={len(CSV) // 2}-"
+    assert dataset.path.read_bytes() == CSV
+    assert dataset.is_downloaded
+    assert sum(1 for _ in dataset) == 1000
+    assert len(server.requests) == 2
+
+
+def test_remote_unpack(server):
+    """
+    Test that tar archives are resumed, verified and unpacked
+    """
+    server.files["/remote.tar.gz"] = tar_gz()
+    dataset = Remote(url(server, "remote.tar.gz"), filename="remote", sha256="0" * 64)
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        dataset.download(verbose=False)
+    assert not dataset.path.exists() and not dataset.is_downloaded
+    server.n_truncate = 1
+    dataset = Remote(url(server, "remote.tar.gz"), filename="remote", sha256=hashlib.sha256(tar_gz()).hexdigest())
+    with pytest.raises(Exception):
+        dataset.download(verbose=False)
+    assert not dataset.path.exists()
+    assert [y for _, y in dataset][:3] == [0, 2, 4]
+    assert server.requests[-1] == f"bytes={len(tar_gz()) // 2}-"
+    assert (dataset.path / "data.csv").read_bytes() == CSV
+    assert not dataset.archive_path.exists()
+
+
+def test_remote_unpack_outside(server, tmp_path):
+    """
+    Test that tar members outside of the data directory are rejected
+    """
+    server.files["/evil.tar.gz"] = tar_gz("../../evil.csv")
+    dataset = Remote(url(server, "evil.tar.gz"), filename="evil")
+    with pytest.raises(tarfile.TarError):
+        dataset.download(verbose=False)
+    assert not dataset.is_downloaded
+    assert not list(tmp_path.glob("**/evil.csv"))
+
+
+def test_remote_read_from_archive(server):
+    """
+    Test that the data is read from the archive without unpacking it
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("data.csv", CSV)
+    server.files["/remote.zip"] = buffer.getvalue()
+    dataset = Remote(url(server, "remote.zip"), read_from_archive=True)
+    assert sum(1 for _ in dataset) == 1000
+    assert dataset.path == dataset.archive_path
+    assert not dataset.archive_path.with_name("data.csv").exists()
+
+
+def test_remote_concurrent_download(server):
+    """
+    Test that concurrent downloads of the same dataset fetch it once
+    """
+    server.files["/data.csv"] = CSV
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        datasets = [Remote(url(server, "data.csv"), unpack=False) for _ in range(4)]
+        futures = [executor.submit(dataset.download, verbose=False) for dataset in datasets]
+        for f in futures:
+            f.result()
+    assert len(server.requests) == 1
+    assert Remote(url(server, "data.csv"), unpack=False).path.read_bytes() == CSV
@@ -0,0 +1,29 @@
+import itertools
+import numpy as np
+from spotRiver.data.synth import SEA
+
+
+def test_sea_drift():
+    """
+    Test that the scheduled drift switches the threshold at the given positions
+    """
+    plain = list(itertools.islice(SEA(seed=1), 100))
+    drifting = list(itertools.islice(SEA(seed=1, drift={40: 2, 70: 3}), 100))
+    assert [x for x, _ in plain] == [x for x, _ in drifting]
+    for n, (x, y) in enumerate(drifting):
+        threshold = 8 if n < 40 else 7 if n < 70 else 9.5
+        assert y == (x[0] + x[1] > threshold)
+
+
+def test_sea_blocks():
+    """
+    Test the seed contract of the block mode: the stream does not depend on the block size
+    """
+    dataset = SEA(seed=1, noise=0.1, drift={500: 1})
+    X_a, y_a = map(np.concatenate, zip(*dataset.iter_blocks(n_samples=1000, block_size=64)))
+    X_b, y_b = map(np.concatenate, zip(*dataset.iter_blocks(n_samples=1000, block_size=1000)))
+    assert X_a.shape == (1000, 3)
+    assert np.array_equal(X_a, X_b) and np.array_equal(y_a, y_b)
+    rows = list(itertools.islice(SEA(seed=1, noise=0.1, drift={500: 1}, block_size=300), 1000))
+    assert np.array_equal(np.array([list(x.values()) for x, _ in rows]), X_a)
+    assert [y for _, y in rows] == y_a.tolist()